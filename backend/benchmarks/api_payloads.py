@@ -0,0 +1,99 @@
+"""
+API payload benchmark
+Compares serialization CPU time of the pydantic from_attributes path with the
+orjson path used by the list endpoints, and reports bytes on the wire for
+identity, gzip and brotli encodings.
+
+Usage: python -m backend.benchmarks.api_payloads [--rows N] [--words N]
+"""
+import argparse
+import gzip
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import List
+
+import orjson
+
+from backend.routes.api import BlogResponse
+from backend.routes.http_cache import rows_to_dicts
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+WORDS = (
+    "agent model latency search image blog markdown section research trend "
+    "python data cloud edge cache stream token prompt design system review"
+).split()
+
+
+def make_blogs(rows: int, words: int):
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    blogs = []
+    for i in range(rows):
+        body = "\n\n".join(
+            "## " + " ".join(rng.choices(WORDS, k=4)) + "\n" + " ".join(rng.choices(WORDS, k=words // 8))
+            for _ in range(8)
+        )
+        blogs.append(
+            SimpleNamespace(id=i + 1, topic=" ".join(rng.choices(WORDS, k=5)), content=body, timestamp=now - timedelta(minutes=i))
+        )
+    return blogs
+
+
+def bench(label: str, fn, repeat: int = 5) -> bytes:
+    best = float("inf")
+    payload = b""
+    for _ in range(repeat):
+        start = time.process_time()
+        payload = fn()
+        best = min(best, time.process_time() - start)
+    print(f"{label:<32} {best * 1000:9.1f} ms CPU")
+    return payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--words", type=int, default=900)
+    args = parser.parse_args()
+
+    blogs = make_blogs(args.rows, args.words)
+    print(f"{args.rows} blogs of ~{args.words} words")
+
+    def pydantic_path() -> bytes:
+        models: List[BlogResponse] = [BlogResponse.model_validate(b) for b in blogs]
+        return json.dumps([m.model_dump(mode="json") for m in models]).encode()
+
+    def orjson_path() -> bytes:
+        return orjson.dumps(rows_to_dicts(blogs, ("id", "topic", "content", "timestamp")))
+
+    bench("pydantic from_attributes + json", pydantic_path)
+    payload = bench("column rows + orjson", orjson_path)
+
+    print(f"\n{'encoding':<10} {'bytes':>12} {'ratio':>7} {'cpu ms':>8}")
+    print(f"{'identity':<10} {len(payload):>12} {1.0:>7.2f} {0.0:>8.1f}")
+
+    start = time.process_time()
+    gz = gzip.compress(payload, compresslevel=6)
+    gz_ms = (time.process_time() - start) * 1000
+    print(f"{'gzip-6':<10} {len(gz):>12} {len(gz) / len(payload):>7.2f} {gz_ms:>8.1f}")
+
+    if brotli is not None:
+        start = time.process_time()
+        br = brotli.compress(payload, quality=4)
+        br_ms = (time.process_time() - start) * 1000
+        print(f"{'br-4':<10} {len(br):>12} {len(br) / len(payload):>7.2f} {br_ms:>8.1f}")
+    else:
+        print("brotli not installed, skipping br")
+
+    print(f"{'304':<10} {0:>12} {0.0:>7.2f} {0.0:>8.1f}  (conditional GET with matching ETag)")
+
+
+if __name__ == "__main__":
+    main()
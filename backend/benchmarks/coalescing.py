@@ -0,0 +1,92 @@
+"""
+Single-flight coalescing check
+Fires N identical concurrent /api/generate-blog requests against the app with
+a stubbed LLM pipeline and verifies that only one pipeline run happened while
+every caller still got its own chat and message rows.
+
+Usage: python -m backend.benchmarks.coalescing [--requests N] [--latency SECONDS]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# Point the app at a throwaway database (and similarity index) before it is imported
+workdir = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir}/coalescing_bench.db")
+os.environ.setdefault("SIMILARITY_INDEX_DIR", f"{workdir}/similarity_index")
+
+import httpx
+
+from backend.database.database import init_db
+from backend.main import app
+from backend.services.ai_agent import GeminiAgent
+from backend.services.container import ServiceContainer
+from backend.services.intent_router import IntentRouter
+from backend.services.metrics import metrics
+from backend.services.singleflight import SingleFlight
+
+
+class StubAgent(GeminiAgent):
+    """GeminiAgent with the LLM pipeline replaced by a counted sleep"""
+
+    def __init__(self, latency: float):
+        self._generations = SingleFlight("generation")
+        self.shared_store = None
+        self.intent_router = IntentRouter()
+        self.latency = latency
+        self.runs = 0
+
+    async def _run_pipeline(self, topic: str, **options):
+        self.runs += 1
+        await asyncio.sleep(self.latency)
+        return {"blog_content": f"# {topic}\n\n" + "Generated content. " * 60, "image_url": None}
+
+
+async def run(num_requests: int, latency: float) -> int:
+    init_db()
+    agent = StubAgent(latency)
+    app.state.services = ServiceContainer()
+    app.state.services._ai_agent = agent
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        topics = ["Edge AI in 2026", "edge ai IN 2026 ", "  Edge   AI in 2026"]
+        start = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post("/api/generate-blog", json={"topic": topics[i % len(topics)]})
+            for i in range(num_requests)
+        ])
+        elapsed = time.perf_counter() - start
+
+    bodies = [r.json() for r in responses]
+    chat_ids = {b["chat_id"] for b in bodies}
+    message_ids = {b["assistant_message_id"] for b in bodies}
+
+    print(f"{num_requests} concurrent requests in {elapsed:.2f}s (pipeline latency {latency}s)")
+    print(f"pipeline runs: {agent.runs}")
+    print(f"distinct chats: {len(chat_ids)}, distinct assistant messages: {len(message_ids)}")
+    print(f"metrics: {metrics.snapshot()['counters']}")
+
+    ok = (
+        all(r.status_code == 200 for r in responses)
+        and agent.runs == 1
+        and len(chat_ids) == num_requests
+        and len(message_ids) == num_requests
+    )
+    print("OK" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.requests, args.latency)))
+
+
+if __name__ == "__main__":
+    main()
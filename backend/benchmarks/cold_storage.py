@@ -0,0 +1,106 @@
+"""
+Cold storage benchmark
+Seeds old blogs with their duplicate assistant messages, runs the archive
+job and reports storage saved plus the read-path latency cost of loading
+archived bodies (cold and warm body cache) versus inline content.
+
+Usage: python -m backend.benchmarks.cold_storage [--blogs N]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/cold_storage_bench.db")
+
+from sqlalchemy import func, text
+
+from backend.database import bodies
+from backend.database.bodies import hydrate
+from backend.database.database import SessionLocal, get_engine, init_db
+from backend.models.models import Blog, ContentBody, Message
+from backend.routes.http_cache import rows_to_dicts
+from backend.services.content_archive import archive_old_content
+
+WORDS = (
+    "agent model latency search image blog markdown section research trend python data "
+    "cloud edge cache stream token prompt design system review quantum robotics climate"
+).split()
+
+
+def seed(blogs: int):
+    rng = random.Random(3)
+    old = datetime.utcnow() - timedelta(days=90)
+    with get_engine().begin() as conn:
+        conn.execute(text("INSERT INTO users (id, username, email) VALUES (1, 'bench', 'b@example.com')"))
+        for i in range(blogs):
+            body = "\n\n".join(
+                "## " + " ".join(rng.choices(WORDS, k=4)) + "\n" + " ".join(rng.choices(WORDS, k=120))
+                for _ in range(7)
+            )
+            conn.execute(text("INSERT INTO chats (id, user_id, title) VALUES (:id, 1, 'bench')"), {"id": i + 1})
+            params = {"chat": i + 1, "body": body, "ts": old}
+            conn.execute(text("INSERT INTO blogs (user_id, chat_id, topic, content, timestamp) VALUES (1, :chat, 'bench', :body, :ts)"), params)
+            conn.execute(text("INSERT INTO messages (chat_id, role, content, created_at, updated_at) VALUES (:chat, 'assistant', :body, :ts, :ts)"), params)
+
+
+def stored_bytes():
+    with SessionLocal() as db:
+        inline = (db.query(func.coalesce(func.sum(func.length(Blog._content)), 0)).scalar()
+                  + db.query(func.coalesce(func.sum(func.length(Message._content)), 0)).scalar())
+        archived = db.query(func.coalesce(func.sum(func.length(ContentBody.data)), 0)).scalar()
+    return int(inline), int(archived)
+
+
+def read_chat_latency(chat_ids, repeat: int = 3):
+    samples = []
+    with SessionLocal() as db:
+        for _ in range(repeat):
+            for chat_id in chat_ids:
+                start = time.perf_counter()
+                rows = (
+                    db.query(Message.id, Message.content.label("content"), Message.body_hash)
+                    .filter(Message.chat_id == chat_id)
+                    .all()
+                )
+                hydrate(db, rows_to_dicts(rows, ("id", "content", "body_hash")))
+                samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--blogs", type=int, default=5000)
+    args = parser.parse_args()
+
+    init_db()
+    seed(args.blogs)
+    sample_chats = random.Random(5).sample(range(1, args.blogs + 1), min(200, args.blogs))
+
+    inline_before, _ = stored_bytes()
+    hot_ms = read_chat_latency(sample_chats)
+
+    stats = archive_old_content(older_than_days=30)
+    inline_after, archived_after = stored_bytes()
+
+    bodies._cache = bodies._BodyCache(0)  # every read misses
+    cold_ms = read_chat_latency(sample_chats, repeat=1)
+    bodies._cache = bodies._BodyCache(bodies.CACHE_SIZE)
+    read_chat_latency(sample_chats, repeat=1)  # fill cache
+    warm_ms = read_chat_latency(sample_chats)
+
+    total_after = inline_after + archived_after
+    print(f"codec: {'zstd' if bodies.zstandard else 'zlib'}")
+    print(f"rows archived: {stats.rows_archived} ({stats.dedup_hits} deduplicated)")
+    print(f"content bytes before: {inline_before:>12}")
+    print(f"content bytes after:  {total_after:>12}  ({total_after / inline_before:.1%} of before)")
+    print(f"read chat, inline:          {hot_ms:.3f} ms")
+    print(f"read chat, archived (cold): {cold_ms:.3f} ms  (+{cold_ms - hot_ms:.3f} ms)")
+    print(f"read chat, archived (warm): {warm_ms:.3f} ms  (+{warm_ms - hot_ms:.3f} ms)")
+
+
+if __name__ == "__main__":
+    main()
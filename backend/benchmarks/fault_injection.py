@@ -0,0 +1,170 @@
+"""
+Fault-injection check for the search and image backends
+Runs the real WebSearchService and ImageService against local stubs that
+fail, hang or answer with a slow tail, and reports breaker transitions,
+fast-fail latency and the tail-latency effect of hedged requests.
+
+Usage: python -m backend.benchmarks.fault_injection
+"""
+import asyncio
+import os
+import random
+import socket
+import statistics
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+# The image service reads these at import time
+_port_socket = socket.socket()
+_port_socket.bind(("127.0.0.1", 0))
+STUB_PORT = _port_socket.getsockname()[1]
+_port_socket.close()
+os.environ["POLLINATIONS_BASE_URL"] = f"http://127.0.0.1:{STUB_PORT}"
+os.environ.setdefault("HEDGE_MIN_SAMPLES", "20")
+
+from aiohttp import web
+
+from backend.services import resilience
+from backend.services.image_service import ImageService
+from backend.services.search_service import WebSearchService
+
+
+def tiny_png() -> bytes:
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    header = struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(b"\x00\xff\x00\x00")) + chunk(b"IEND", b"")
+
+
+class ImageStub:
+    """Pollinations stand-in; `mode` is switched by the scenarios"""
+
+    def __init__(self):
+        self.mode = "ok"
+        self.slow_fraction = 0.0
+        self.requests = 0
+        self.rng = random.Random(9)
+
+    async def handle(self, request):
+        self.requests += 1
+        if self.mode == "error":
+            return web.Response(status=503)
+        if self.mode == "hang":
+            await asyncio.sleep(3600)
+        delay = 1.0 if self.rng.random() < self.slow_fraction else 0.02
+        await asyncio.sleep(delay)
+        return web.Response(body=tiny_png(), content_type="image/png")
+
+
+class SearchStub:
+    """Blocking search backend with injectable failures and latency"""
+
+    def __init__(self):
+        self.fail = False
+        self.slow_fraction = 0.0
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.rng = random.Random(4)
+
+    def __call__(self, query, max_results):
+        with self.lock:
+            self.calls += 1
+            slow = self.rng.random() < self.slow_fraction
+        if self.fail:
+            time.sleep(0.2)
+            raise ConnectionError("injected search failure")
+        time.sleep(1.0 if slow else 0.02)
+        return [{"title": f"{query} result", "snippet": "stub", "link": "http://example.invalid"}]
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    result = await coro
+    return result, (time.perf_counter() - start) * 1000
+
+
+async def breaker_scenario(name, service_call, make_failing, make_healthy, breaker):
+    print(f"\n[{name}] dependency failing")
+    make_failing()
+    for i in range(5):
+        result, ms = await timed(service_call())
+        print(f"  call {i + 1}: {'empty' if not result else 'ok'} in {ms:7.1f} ms, breaker {breaker.state}")
+
+    print(f"[{name}] dependency recovers, waiting for half-open probe")
+    make_healthy()
+    await asyncio.sleep(breaker.reset_timeout + 0.05)
+    print(f"  breaker before probe: {breaker.state}")
+    result, ms = await timed(service_call())
+    print(f"  probe: {'empty' if not result else 'ok'} in {ms:.1f} ms, breaker {breaker.state}")
+
+
+async def hedging_scenario(name, service_call, set_slow_fraction, tracker_reset, calls=120):
+    async def run(hedging: bool):
+        tracker_reset()
+        original = resilience.HEDGE_MIN_SAMPLES
+        if not hedging:
+            resilience.HEDGE_MIN_SAMPLES = 10 ** 9
+        set_slow_fraction(0.0)
+        for _ in range(25):  # warm the latency window with fast calls
+            await service_call()
+        set_slow_fraction(0.1)
+        samples = [(await timed(service_call()))[1] for _ in range(calls)]
+        resilience.HEDGE_MIN_SAMPLES = original
+        samples.sort()
+        return statistics.median(samples), samples[int(0.95 * len(samples))], samples[int(0.99 * len(samples))]
+
+    print(f"\n[{name}] 10% of requests take 1s")
+    for hedging in (False, True):
+        p50, p95, p99 = await run(hedging)
+        label = "hedged" if hedging else "plain "
+        print(f"  {label}: p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  p99 {p99:7.1f} ms")
+
+
+async def main():
+    image_stub = ImageStub()
+    app = web.Application()
+    app.router.add_get("/prompt/{prompt:.*}", image_stub.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", STUB_PORT).start()
+
+    search_stub = SearchStub()
+    search = WebSearchService(search_backend=search_stub)
+    search.breaker.reset_timeout = 0.5
+    images = ImageService()
+    images.output_dir = tempfile.mkdtemp()
+    images.breaker.reset_timeout = 0.5
+
+    try:
+        await breaker_scenario(
+            "search", lambda: search.search_topic("edge ai"),
+            lambda: setattr(search_stub, "fail", True), lambda: setattr(search_stub, "fail", False),
+            search.breaker,
+        )
+        await breaker_scenario(
+            "image", lambda: images.generate_image("a cat"),
+            lambda: setattr(image_stub, "mode", "error"), lambda: setattr(image_stub, "mode", "ok"),
+            images.breaker,
+        )
+        await hedging_scenario(
+            "search", lambda: search.search_topic("edge ai"),
+            lambda f: setattr(search_stub, "slow_fraction", f),
+            lambda: setattr(search, "latency", resilience.LatencyTracker()),
+        )
+        await hedging_scenario(
+            "image", lambda: images.generate_image("a cat"),
+            lambda f: setattr(image_stub, "slow_fraction", f),
+            lambda: setattr(images, "latency", resilience.LatencyTracker()),
+        )
+        print(f"\nbreakers: {resilience.breaker_states()}")
+    finally:
+        await runner.cleanup()
+        from backend.services.image_service import shutdown_variant_pool
+        shutdown_variant_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""
+Long-form generation benchmark
+Compares wall-clock time of the single-run path (one call writes the whole
+post) against the outline-then-parallel-sections engine, using a fake model
+whose latency grows with the number of output words.
+
+Usage: python -m backend.benchmarks.longform [--words-per-sec N] [--parallel N]
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+from types import SimpleNamespace
+
+from backend.services.longform import LongFormWriter
+
+
+class FakeLatencyClient:
+    """OpenAI-shaped client: latency = time to first token + words / throughput"""
+
+    def __init__(self, words_per_sec: float, first_token: float):
+        self.words_per_sec = words_per_sec
+        self.first_token = first_token
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, **kwargs):
+        self.calls += 1
+        prompt = messages[-1]["content"]
+        if match := re.search(r"exactly (\d+) sections", prompt):
+            count = int(match.group(1))
+            text = json.dumps({
+                "title": "Benchmark",
+                "sections": [{"heading": f"Section {i + 1}", "points": ["a", "b"]} for i in range(count)],
+            })
+        elif match := re.search(r"exactly (\d+) strings", prompt):
+            text = json.dumps(["Next, we turn to the following point."] * int(match.group(1)))
+        else:
+            words = int(re.search(r"approximately (\d+) words", prompt).group(1))
+            text = " ".join(["word"] * words)
+
+        await asyncio.sleep(self.first_token + len(text.split()) / self.words_per_sec)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+async def single_run(client: FakeLatencyClient, target_words: int) -> float:
+    start = time.perf_counter()
+    await client.chat.completions.create(
+        model="fake",
+        messages=[{"role": "user", "content": f"Write a blog post of approximately {target_words} words"}],
+    )
+    return time.perf_counter() - start
+
+
+async def long_form(client: FakeLatencyClient, target_words: int, parallel: int) -> float:
+    writer = LongFormWriter(client, "fake", max_parallel=parallel)
+    start = time.perf_counter()
+    await writer.write("Benchmark topic", target_words, research="shared notes")
+    return time.perf_counter() - start
+
+
+async def run(words_per_sec: float, first_token: float, parallel: int):
+    print(f"fake model: {words_per_sec:.0f} words/s, {first_token:.2f}s to first token, parallelism {parallel}")
+    print(f"{'target':>8} {'single-run s':>13} {'long-form s':>12} {'speedup':>8} {'calls':>6}")
+    for target in (1000, 3000, 5000):
+        single = await single_run(FakeLatencyClient(words_per_sec, first_token), target)
+        client = FakeLatencyClient(words_per_sec, first_token)
+        parallel_time = await long_form(client, target, parallel)
+        print(f"{target:>8} {single:>13.2f} {parallel_time:>12.2f} {single / parallel_time:>7.2f}x {client.calls:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    # Defaults are ~10x faster than a real model so the benchmark finishes quickly;
+    # the ratio between the two paths is what matters
+    parser.add_argument("--words-per-sec", type=float, default=1200)
+    parser.add_argument("--first-token", type=float, default=0.05)
+    parser.add_argument("--parallel", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(run(args.words_per_sec, args.first_token, args.parallel))
+
+
+if __name__ == "__main__":
+    main()
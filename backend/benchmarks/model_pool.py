@@ -0,0 +1,118 @@
+"""
+Model pool against a local fake OpenAI-compatible server
+The fake server lists a few models with different latencies, rate limits one
+key and fails one model with 503s. Reports how calls are spread over the
+key/model pairs and what failover costs compared to the old fixed backoff.
+
+Usage: python -m backend.benchmarks.model_pool
+"""
+import asyncio
+import statistics
+import time
+from collections import Counter
+
+from aiohttp import web
+
+from backend.services import model_pool as pool_module
+from backend.services.metrics import metrics
+from backend.services.model_pool import ModelPool
+
+MODEL_LATENCY = {"fast": 0.03, "slow": 0.25, "flaky": 0.03}
+LIMITED_KEY = "key-limited-0000000000"
+LIMITED_AFTER = 3
+
+
+class FakeOpenAI:
+    def __init__(self):
+        self.served = Counter()
+        self.requests_per_key = Counter()
+        self.flaky_down = True
+
+    async def models(self, request):
+        data = [{"id": f"models/{name}", "object": "model", "created": 0, "owned_by": "fake"} for name in MODEL_LATENCY]
+        return web.json_response({"object": "list", "data": data})
+
+    async def completions(self, request):
+        key = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        body = await request.json()
+        model = body["model"]
+        self.requests_per_key[key] += 1
+        if key == LIMITED_KEY and self.requests_per_key[key] > LIMITED_AFTER:
+            return web.json_response(
+                {"error": {"message": "quota exceeded", "code": 429}}, status=429, headers={"Retry-After": "60"}
+            )
+        if model not in MODEL_LATENCY:
+            return web.json_response({"error": {"message": "model not found", "code": 404}}, status=404)
+        if model == "flaky" and self.flaky_down:
+            return web.json_response({"error": {"message": "overloaded", "code": 503}}, status=503)
+        await asyncio.sleep(MODEL_LATENCY[model])
+        self.served[(key[:10], model)] += 1
+        return web.json_response({
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        })
+
+
+async def timed_calls(pool: ModelPool, count: int, model: str):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        await pool.create(model=model, messages=[{"role": "user", "content": "hi"}])
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+async def main():
+    fake = FakeOpenAI()
+    app = web.Application()
+    app.router.add_get("/v1/models", fake.models)
+    app.router.add_post("/v1/chat/completions", fake.completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    base_url = f"http://127.0.0.1:{port}/v1/"
+    pool_module.MODEL_COOLDOWN_SECONDS = 1.0
+
+    try:
+        print("[probe] configured: slow, fast, flaky, missing")
+        pool = ModelPool(["key-a-0000000000000", "key-b-0000000000000"], ["slow", "fast", "flaky", "missing"], base_url)
+        listings = await pool.probe()
+        print(f"  listed: {next(iter(listings.values()))}")
+        print(f"  in rotation: {[m['model'] for m in pool.snapshot()['models'] if m['listed']]}")
+
+        print("\n[routing] 40 calls requesting 'slow', 'flaky' returns 503")
+        fake.served.clear()
+        samples = await timed_calls(pool, 40, "slow")
+        by_model = Counter()
+        for (_, model), n in fake.served.items():
+            by_model[model] += n
+        print(f"  served by model: {dict(by_model)}")
+        print(f"  p50 {statistics.median(samples):.1f} ms, failovers {metrics.counter('model_pool.failovers'):.0f}")
+        print(f"  ewma: {[(m['model'], m['ewma_ms']) for m in pool.snapshot()['models']]}")
+        await pool.aclose()
+
+        print(f"\n[rate limit] key {LIMITED_KEY[:11]}… returns 429 after {LIMITED_AFTER} requests")
+        fake.served.clear()
+        fake.flaky_down = False
+        pool = ModelPool([LIMITED_KEY, "key-c-0000000000000"], ["fast"], base_url)
+        samples = await timed_calls(pool, 20, "fast")
+        by_key = Counter()
+        for (key, _), n in fake.served.items():
+            by_key[key] += n
+        print(f"  served by key: {dict(by_key)}")
+        print(f"  all 20 calls succeeded, max {max(samples):.1f} ms (the fixed backoff slept 5 s on the first 429)")
+        snapshot = pool.snapshot()["keys"]
+        print(f"  key states: {[(k['key'], k['available'], k['cooldown_seconds']) for k in snapshot]}")
+        await pool.aclose()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,134 @@
+"""
+Page fetcher against a local fixture web server
+The fixture server serves N article pages (a few hundred KB of markup with
+nav/script boilerplate around the prose), trickles the body out in chunks
+with a small delay per host, and includes some slow, huge and non-HTML
+pages. Reports throughput, bytes actually read vs. served, peak memory of the
+extraction, the effect of the URL cache, and checks the extract.
+
+Usage: python -m backend.benchmarks.page_fetch [--pages N] [--hosts N]
+"""
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+
+from aiohttp import web
+
+from backend.services.metrics import metrics
+from backend.services.page_fetcher import PageFetcher
+
+WORDS = (
+    "battery chemistry solid state lithium research energy density grid storage cost "
+    "manufacturing supply chain cathode anode electrolyte safety charging cycles"
+).split()
+CHUNK_DELAY = 0.002
+
+
+def article(rng: random.Random, index: int, paragraphs: int) -> bytes:
+    boilerplate = "".join(f"<li><a href='/{i}'>Menu item {i}</a></li>" for i in range(200))
+    script = "var tracking = '" + "x" * 20000 + "';"
+    body = "".join(
+        f"<p>{' '.join(rng.choices(WORDS, k=80))}.</p>" + ("<h2>Section heading</h2>" if i % 5 == 0 else "")
+        for i in range(paragraphs)
+    )
+    return (
+        f"<!doctype html><html><head><title>Article {index}</title><script>{script}</script>"
+        f"<style>body {{ color: black; }}</style></head><body><nav><ul>{boilerplate}</ul></nav>"
+        f"<article><h1>Article {index} headline</h1>{body}</article>"
+        f"<footer>{boilerplate}</footer></body></html>"
+    ).encode()
+
+
+class FixtureServer:
+    def __init__(self, pages: int):
+        rng = random.Random(3)
+        self.pages = {i: article(rng, i, paragraphs=rng.randint(40, 400)) for i in range(pages)}
+        self.bytes_served = 0
+        self.requests = 0
+
+    async def page(self, request):
+        self.requests += 1
+        name = request.match_info["name"]
+        if name == "slow":
+            await asyncio.sleep(30)
+            return web.Response(text="too late")
+        if name == "pdf":
+            return web.Response(body=b"%PDF-1.7", content_type="application/pdf")
+        if name == "huge":
+            data = b"<html><body>" + b"<div>" * 2_000_000
+        else:
+            data = self.pages[int(name)]
+
+        response = web.StreamResponse(headers={"Content-Type": "text/html; charset=utf-8"})
+        await response.prepare(request)
+        try:
+            for start in range(0, len(data), 8192):
+                await response.write(data[start:start + 8192])
+                self.bytes_served += len(data[start:start + 8192])
+                await asyncio.sleep(CHUNK_DELAY)
+        except (ConnectionResetError, RuntimeError):
+            # The fetcher hung up once it had enough text
+            pass
+        return response
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--hosts", type=int, default=4)
+    args = parser.parse_args()
+
+    server = FixtureServer(args.pages)
+    app = web.Application()
+    app.router.add_get("/pages/{name}", server.page)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    # One port per "host" so the per-host limit applies
+    ports = list(range(18600, 18600 + args.hosts))
+    for port in ports:
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+
+    urls = [f"http://127.0.0.1:{ports[i % len(ports)]}/pages/{i}" for i in range(args.pages)]
+    urls += [f"http://127.0.0.1:{ports[0]}/pages/{name}" for name in ("slow", "pdf", "huge")]
+    total_page_bytes = sum(len(p) for p in server.pages.values())
+
+    fetcher = PageFetcher(timeout=3, allow_private=True)
+    try:
+        start = time.perf_counter()
+        extracts = await fetcher.fetch_many(urls)
+        cold = time.perf_counter() - start
+        served = server.bytes_served
+
+        start = time.perf_counter()
+        await fetcher.fetch_many(urls)
+        warm = time.perf_counter() - start
+
+        # Memory is traced on a separate, uncached pass (tracing slows everything down)
+        memory_fetcher = PageFetcher(timeout=10, allow_private=True)
+        tracemalloc.start()
+        await memory_fetcher.fetch_many(urls[:50])
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        await memory_fetcher.aclose()
+
+        truncated = sum(e.truncated for e in extracts.values())
+        print(f"Fetched {len(extracts)}/{len(urls)} pages in {cold:.2f}s ({len(extracts) / cold:.0f} pages/s), {truncated} stopped early")
+        print(f"Read {served / 1e6:.1f} MB of {total_page_bytes / 1e6:.1f} MB of article markup")
+        print(f"Peak traced memory fetching 50 pages: {peak / 1e6:.1f} MB")
+        print(f"Second pass from the URL cache: {warm * 1000:.1f} ms, {metrics.counter('page_fetch.cache_hits'):.0f} cache hits")
+        print(f"Errors: {metrics.counter('page_fetch.errors'):.0f} (slow and pdf fixtures; huge is cut off at the byte cap)")
+
+        sample = extracts[urls[0]]
+        assert sample.title == "Article 0"
+        assert "Menu item" not in sample.text and "tracking" not in sample.text
+        assert sample.text.startswith("## Article 0 headline")
+        print("Extract check OK")
+    finally:
+        await fetcher.aclose()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
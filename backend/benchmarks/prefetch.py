@@ -0,0 +1,142 @@
+"""
+Idle-time prefetch benchmark
+Seeds a throwaway database with a day of chats whose topics follow a Zipf
+distribution, runs one prefetch pass (search warming plus drafts) against
+a search backend and pipeline that only sleep, then replays the next day's
+traffic drawn from the same distribution. Reports research/draft latency
+for the replay with and without the pass, the prefetch hit rates, and how
+long a pass takes to yield once an interactive request arrives.
+
+Usage: python -m backend.benchmarks.prefetch [--chats N] [--requests N] [--search-latency S]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+workdir = tempfile.mkdtemp(prefix="prefetch_bench_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir}/prefetch_bench.db")
+
+from backend.database.database import SessionLocal, init_db
+from backend.models.models import Chat, User
+from backend.services.model_pool import ModelPool
+from backend.services.prefetch import PrefetchScheduler, trending_topics
+from backend.services.prefetch_state import claim_draft, prefetch_stats, record_interactive
+from backend.services.search_service import WebSearchService
+from backend.services.shared_store import SharedStore
+
+SUBJECTS = (
+    "edge computing", "quantum sensors", "battery recycling", "remote work", "rust for web backends",
+    "llm evaluation", "urban farming", "solid state batteries", "carbon capture", "open source funding",
+    "privacy engineering", "robotic surgery", "vector databases", "green hydrogen", "space debris",
+    "microfrontends", "gene therapy", "wasm at the edge", "heat pumps", "digital twins",
+    "ai in education", "satellite internet", "sleep science", "ocean plastics", "passkeys",
+    "small modular reactors", "synthetic data", "e-bike commuting", "lab grown meat", "chip design",
+)
+DRAFT_LATENCY_SECONDS = 1.0
+
+
+def zipf_topics(rng: random.Random, n: int):
+    weights = [1 / (rank + 1) for rank in range(len(SUBJECTS))]
+    return [f"The future of {topic}" for topic in rng.choices(SUBJECTS, weights=weights, k=n)]
+
+
+def seed(chats: int):
+    init_db()
+    rng = random.Random(3)
+    now = datetime.utcnow()
+    with SessionLocal() as db:
+        db.add(User(id=1, username="bench", email="bench@example.com"))
+        for topic in zipf_topics(rng, chats):
+            db.add(Chat(user_id=1, title=topic, created_at=now - timedelta(seconds=rng.randint(0, 86000))))
+        db.commit()
+
+
+class FakeAgent:
+    """Just enough of GeminiAgent for pre-generation"""
+
+    def __init__(self):
+        self.model_pool = ModelPool(api_keys=["bench"], models=["bench-model"])
+
+    async def pregenerate(self, topic: str):
+        await asyncio.sleep(DRAFT_LATENCY_SECONDS)
+        return {"blog_content": f"# {topic}\n\n" + "Prefetched content. " * 50, "image_url": None, "research": ""}
+
+
+def build(store_path: str, search_latency: float):
+    def backend(query: str, max_results: int):
+        time.sleep(search_latency)
+        return [{"title": f"{query} {i}", "snippet": "...", "link": f"https://example.com/{i}"} for i in range(max_results)]
+
+    store = SharedStore(store_path)
+    search = WebSearchService(search_backend=backend, cache=store)
+    agent = FakeAgent()
+    scheduler = PrefetchScheduler(
+        store, search, agent_factory=lambda: agent, generate=True,
+        search_budget_per_hour=1000, generation_budget_per_day=1000, generate_top_n=5,
+    )
+    return store, search, scheduler
+
+
+async def replay(store, search, topics):
+    """Research latency of each request; a claimed draft skips the pipeline"""
+    latencies = []
+    drafts = 0
+    for topic in topics:
+        start = time.perf_counter()
+        if claim_draft(store, topic) is not None:
+            drafts += 1
+        else:
+            await search.multi_search(topic)
+            await asyncio.sleep(DRAFT_LATENCY_SECONDS)
+        latencies.append(time.perf_counter() - start)
+    return latencies, drafts
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--search-latency", type=float, default=0.4)
+    args = parser.parse_args()
+
+    seed(args.chats)
+    start = time.perf_counter()
+    top = trending_topics(limit=10)
+    print(f"Mined {args.chats} chats in {(time.perf_counter() - start) * 1000:.1f} ms; top: "
+          + ", ".join(f"{topic} ({n})" for topic, n in top[:3]))
+
+    next_day = zipf_topics(random.Random(11), args.requests)
+
+    _, cold_search, _ = build(os.path.join(workdir, "cold.db"), args.search_latency)
+    cold_store = cold_search.cache
+    cold, _ = await replay(cold_store, cold_search, next_day)
+
+    store, search, scheduler = build(os.path.join(workdir, "warm.db"), args.search_latency)
+    start = time.perf_counter()
+    stats = await scheduler.run_once(force=True)
+    print(f"Prefetch pass: {stats['searches']} searches, {stats['drafts']} drafts in {time.perf_counter() - start:.1f} s")
+    warm, drafts = await replay(store, search, next_day)
+
+    for label, samples in (("cold", cold), ("after prefetch", warm)):
+        ordered = sorted(samples)
+        print(f"  {label:<15} mean {statistics.mean(samples) * 1000:7.0f} ms   p50 {ordered[len(ordered) // 2] * 1000:7.0f} ms")
+    print(f"  {drafts}/{len(next_day)} requests served from a prefetched draft")
+    print(f"  hit rates: {prefetch_stats(store)}")
+
+    # Yield latency: interactive traffic arrives 0.5 s into a cold pass
+    store, _, scheduler = build(os.path.join(workdir, "yield.db"), args.search_latency)
+    task = asyncio.ensure_future(scheduler.run_once(force=True))
+    await asyncio.sleep(0.5)
+    arrived = time.perf_counter()
+    record_interactive(store)
+    stats = await task
+    print(f"Pass stopped ({stats['stopped']}) {(time.perf_counter() - arrived) * 1000:.0f} ms after an interactive request")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
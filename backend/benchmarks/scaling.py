@@ -0,0 +1,180 @@
+"""
+Multi-worker scaling benchmark
+Launches backend/serve.py with 1, 2, 4 ... workers (up to --max-workers,
+default the number of cores) against a throwaway SQLite database and shared
+store, with the LLM pipeline replaced by a fake that burns a fixed amount of
+CPU and then waits like a model call would. Drives /api/generate-blog with
+distinct topics and reports throughput per worker count, plus one round of
+identical topics to show cross-process coalescing (pipeline runs are
+counted in the shared store, so every worker's runs are included).
+
+The load generator runs on the same machine and takes a core of its own, so
+scaling flattens out one worker short of the core count.
+
+Usage: python -m backend.benchmarks.scaling [--max-workers N] [--seconds S] [--concurrency N]
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from backend.services.shared_store import SharedStore
+
+# CPU per generation (markdown handling, serialization, ...) and model wait
+FAKE_CPU_ITERATIONS = int(os.getenv("SCALING_FAKE_CPU_ITERATIONS", "20000"))
+FAKE_LATENCY_SECONDS = float(os.getenv("SCALING_FAKE_LATENCY_SECONDS", "0.05"))
+
+if os.getenv("SCALING_BENCH_WORKER") == "1":
+    # Imported by every worker process through the --app import string
+    from backend import main
+    from backend.services.ai_agent import GeminiAgent
+    from backend.services.container import ServiceContainer
+    from backend.services.intent_router import IntentRouter
+    from backend.services.singleflight import SharedFlight
+
+    class FakeAgent(GeminiAgent):
+        """GeminiAgent with the pipeline replaced by CPU work plus a sleep"""
+
+        def __init__(self, store):
+            self._generations = SharedFlight("generation", store)
+            self.intent_router = IntentRouter()
+            self.shared_store = self.store = store
+
+        async def _run_pipeline(self, topic: str, **options):
+            await asyncio.to_thread(self.store.incr, "bench:pipeline_runs")
+            hashlib.pbkdf2_hmac("sha256", topic.encode(), b"bench", FAKE_CPU_ITERATIONS)
+            await asyncio.sleep(FAKE_LATENCY_SECONDS)
+            return {"blog_content": f"# {topic}\n\n" + "Generated content. " * 60, "image_url": None, "research": ""}
+
+        async def summarize_conversation(self, previous, messages):
+            return previous
+
+    class BenchContainer(ServiceContainer):
+        @property
+        def ai_agent(self):
+            if self._ai_agent is None:
+                self._ai_agent = FakeAgent(self.shared_store)
+            return self._ai_agent
+
+    main.ServiceContainer = BenchContainer
+    app = main.app
+
+
+async def wait_until_up(client: httpx.AsyncClient, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/api/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("server did not come up")
+
+
+async def drive(client: httpx.AsyncClient, seconds: float, concurrency: int, tag: str) -> float:
+    done = 0
+    errors = 0
+    deadline = time.monotonic() + seconds
+
+    async def worker(worker_id: int):
+        nonlocal done, errors
+        i = 0
+        while time.monotonic() < deadline:
+            i += 1
+            response = await client.post("/api/generate-blog", json={"topic": f"{tag} topic {worker_id}-{i}"})
+            if response.status_code == 200:
+                done += 1
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    if errors:
+        print(f"  {errors} failed requests")
+    return done / elapsed
+
+
+async def coalescing_round(client: httpx.AsyncClient, store: SharedStore, requests: int) -> int:
+    """Pipeline runs (counted by every worker in the shared store) for identical requests"""
+    before = store.incr("bench:pipeline_runs", 0)
+    await asyncio.gather(*(
+        client.post("/api/generate-blog", json={"topic": "Identical topic for every worker"})
+        for _ in range(requests)
+    ))
+    return store.incr("bench:pipeline_runs", 0) - before
+
+
+def launch(workers: int, port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "backend.serve", "--workers", str(workers), "--port", str(port),
+         "--host", "127.0.0.1", "--app", "backend.benchmarks.scaling:app"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="scaling_bench_")
+    env = {
+        **os.environ,
+        "SCALING_BENCH_WORKER": "1",
+        "DATABASE_URL": f"sqlite:///{workdir}/bench.db",
+        "SHARED_STORE_PATH": f"{workdir}/shared.db",
+        "SIMILARITY_INDEX_DIR": f"{workdir}/similarity",
+        "WARM_SERVICES": "0",
+        "MODEL_PROBE_INTERVAL_SECONDS": "0",
+        "SIMILARITY_REBUILD_INTERVAL_SECONDS": "0",
+        "CONTENT_ARCHIVE_INTERVAL_SECONDS": "0",
+        "IMAGE_GC_INTERVAL_SECONDS": "0",
+        "PREFETCH_INTERVAL_SECONDS": "0",
+        "LOOP_MONITOR": "0",
+        "LOG_LEVEL": "warning",
+    }
+    counts = []
+    workers = 1
+    while workers <= args.max_workers:
+        counts.append(workers)
+        workers *= 2
+
+    store = SharedStore(env["SHARED_STORE_PATH"])
+    baseline = None
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    for index, workers in enumerate(counts):
+        port = 18700 + index
+        server = launch(workers, port, env)
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60, limits=limits) as client:
+                await wait_until_up(client)
+                await drive(client, 1, args.concurrency, f"warmup{workers}")
+                rate = await drive(client, args.seconds, args.concurrency, f"w{workers}")
+                baseline = baseline or rate
+                print(f"{workers} worker(s): {rate:7.1f} req/s  ({rate / baseline:.2f}x, {rate / baseline / workers:.0%} of linear)")
+                if workers == counts[-1]:
+                    runs = await coalescing_round(client, store, workers * 8)
+                    print(f"{workers * 8} identical concurrent requests -> {runs} pipeline run(s)")
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server.kill()
+                server.wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+"""
+Full-text search benchmark
+Seeds a throwaway SQLite database with N chat messages (default 1M), builds
+the FTS5 index and compares /api/search query latency with the LIKE scan a
+client-side style filter amounts to.
+
+Usage: python -m backend.benchmarks.search [--rows N] [--queries N]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from backend.database.search_index import install_search_index, search
+from backend.models.models import Base
+
+VOCABULARY = (
+    "agent model latency search image blog markdown section research trend python data "
+    "cloud edge cache stream token prompt design system review quantum robotics climate "
+    "energy battery finance health travel security privacy startup marketing education"
+).split()
+
+
+def seed(engine, rows: int, chats: int = 10000, batch: int = 20000):
+    rng = random.Random(7)
+    now = datetime.utcnow().isoformat(sep=" ")
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, username, email, created_at) VALUES (1, 'bench', 'bench@example.com', :now)"), {"now": now})
+        conn.execute(
+            text("INSERT INTO chats (id, user_id, title, created_at, updated_at) VALUES (:id, 1, :title, :now, :now)"),
+            [{"id": i + 1, "title": " ".join(rng.choices(VOCABULARY, k=4)), "now": now} for i in range(chats)],
+        )
+    for start in range(0, rows, batch):
+        params = [
+            {
+                "chat_id": rng.randint(1, chats),
+                "role": "assistant" if i % 2 else "user",
+                "content": " ".join(rng.choices(VOCABULARY, k=60)),
+                "now": now,
+            }
+            for i in range(start, min(rows, start + batch))
+        ]
+        with engine.begin() as conn:
+            conn.execute(
+                text("INSERT INTO messages (chat_id, role, content, created_at, updated_at) VALUES (:chat_id, :role, :content, :now, :now)"),
+                params,
+            )
+
+
+def timed(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "search_bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+
+    start = time.perf_counter()
+    seed(engine, args.rows)
+    print(f"Seeded {args.rows} messages in {time.perf_counter() - start:.1f}s")
+
+    # Building on a populated table exercises the one-off 'rebuild' backfill
+    start = time.perf_counter()
+    install_search_index(engine)
+    print(f"Built FTS5 index in {time.perf_counter() - start:.1f}s")
+
+    db = sessionmaker(bind=engine)()
+    rng = random.Random(11)
+    queries = [" ".join(rng.sample(VOCABULARY, 2)) for _ in range(args.queries)]
+
+    def fts():
+        for q in queries:
+            search(db, q, 1, kind="message", limit=20)
+
+    def like_scan():
+        for q in queries:
+            words = q.split()
+            db.execute(
+                text(
+                    "SELECT id, content FROM messages WHERE content LIKE :a AND content LIKE :b "
+                    "ORDER BY created_at DESC LIMIT 20"
+                ),
+                {"a": f"%{words[0]}%", "b": f"%{words[1]}%"},
+            ).fetchall()
+
+    fts_median, fts_max = timed(fts, 3)
+    like_median, like_max = timed(like_scan, 3)
+    per = len(queries)
+    print(f"FTS5 search:  {fts_median / per:8.2f} ms/query median ({fts_max / per:.2f} worst batch)")
+    print(f"LIKE scan:    {like_median / per:8.2f} ms/query median ({like_max / per:.2f} worst batch)")
+
+    # Incremental maintenance cost: single insert and update through the triggers
+    with engine.begin() as conn:
+        start = time.perf_counter()
+        conn.execute(text("INSERT INTO messages (chat_id, role, content) VALUES (1, 'user', 'fresh edge cache entry')"))
+        conn.execute(text("UPDATE messages SET content = 'edited quantum text' WHERE id = 1"))
+        print(f"Insert + update with index maintenance: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
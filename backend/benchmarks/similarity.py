@@ -0,0 +1,90 @@
+"""
+Related-blogs index benchmark
+Indexes N synthetic blogs (default 20k) into a throwaway directory and reports
+add throughput, the cost of mapping the index in a fresh process, single
+related-blog query latency and the near-duplicate topic check.
+
+Usage: python -m backend.benchmarks.similarity [--blogs N] [--queries N]
+"""
+import argparse
+import random
+import statistics
+import tempfile
+import time
+
+from backend.services.similarity_index import SimilarityIndex
+
+VOCABULARY = (
+    "agent model latency search image blog markdown section research trend python data "
+    "cloud edge cache stream token prompt design system review quantum robotics climate "
+    "energy battery finance health travel security privacy startup marketing education "
+    "solar policy market vaccine genome rust compiler kernel network protocol retail"
+).split()
+
+
+def synthetic_blog(rng: random.Random):
+    topic_words = rng.sample(VOCABULARY, 3)
+    topic = " ".join(topic_words)
+    # Topic words dominate the body so neighbours are meaningful
+    body = " ".join(rng.choices(topic_words, k=150) + rng.choices(VOCABULARY, k=350))
+    return topic, body
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {
+        "p50": round(statistics.median(samples), 3),
+        "p95": round(samples[int(len(samples) * 0.95) - 1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--blogs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    with tempfile.TemporaryDirectory() as directory:
+        index = SimilarityIndex(directory)
+        blogs = [synthetic_blog(rng) for _ in range(args.blogs)]
+
+        start = time.perf_counter()
+        for blog_id, (topic, body) in enumerate(blogs, start=1):
+            index.add(blog_id, blog_id % 10, topic, body)
+        add_seconds = time.perf_counter() - start
+        print(f"Indexed {args.blogs} blogs in {add_seconds:.1f}s ({args.blogs / add_seconds:.0f} blogs/s)")
+
+        start = time.perf_counter()
+        reopened = SimilarityIndex(directory)
+        size = len(reopened)
+        print(f"Opened index with {size} rows in {(time.perf_counter() - start) * 1000:.1f} ms (memory-mapped)")
+
+        related_ms, owner_ms, duplicate_ms = [], [], []
+        hits = 0
+        for _ in range(args.queries):
+            blog_id = rng.randint(1, args.blogs)
+            start = time.perf_counter()
+            matches = reopened.related(blog_id, k=5)
+            related_ms.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            reopened.related(blog_id, k=5, owner=blog_id % 10)
+            owner_ms.append((time.perf_counter() - start) * 1000)
+
+            topic = blogs[blog_id - 1][0]
+            start = time.perf_counter()
+            duplicate = reopened.find_near_duplicate(topic)
+            duplicate_ms.append((time.perf_counter() - start) * 1000)
+            hits += duplicate is not None
+            # Sanity check: the best match should share the topic words
+            if matches and not set(blogs[matches[0].blog_id - 1][0].split()) & set(topic.split()):
+                print(f"Unrelated top match for blog {blog_id}")
+
+        print(f"related()            {percentiles(related_ms)} ms")
+        print(f"related(owner=...)   {percentiles(owner_ms)} ms")
+        print(f"find_near_duplicate  {percentiles(duplicate_ms)} ms, {hits}/{args.queries} exact topics found")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Startup benchmark
+Measures the import cost of the app module (python -X importtime) and the
+time from process spawn to the first successful HTTP request, and fails when
+either exceeds its regression budget.
+
+Usage: python -m backend.benchmarks.startup [--import-budget-ms N] [--ttfr-budget-ms N]
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Default regression budgets, tune these when the baseline legitimately moves
+IMPORT_BUDGET_MS = 1500
+TTFR_BUDGET_MS = 4000
+
+
+def measure_import_time(module: str = "backend.main"):
+    """Return (total_ms, top_imports) for importing the given module"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT_DIR,
+        env=_bench_env(),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    entries = []
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:       123 |       4567 | package.module"
+        fields = line[len("import time:"):].split("|")
+        cumulative_us, name = fields[1].strip(), fields[2].strip()
+        entries.append((int(cumulative_us), name))
+        if name == module:
+            total_us = int(cumulative_us)
+
+    entries.sort(reverse=True)
+    return total_us / 1000, [(us / 1000, name) for us, name in entries[:15]]
+
+
+def measure_time_to_first_request(timeout: float = 60.0) -> float:
+    """Spawn uvicorn and return milliseconds until /api/health answers 200"""
+    port = _free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port)],
+        cwd=ROOT_DIR,
+        env=_bench_env(),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        url = f"http://127.0.0.1:{port}/api/health"
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError("uvicorn exited before serving a request")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as resp:
+                    if resp.status == 200:
+                        return (time.perf_counter() - start) * 1000
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError(f"No successful request within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def _bench_env():
+    env = dict(os.environ)
+    # Use a throwaway SQLite database unless a real one is configured, so the
+    # numbers don't depend on whether Postgres happens to be reachable
+    env.setdefault("DATABASE_URL", f"sqlite:///{tempfile.gettempdir()}/startup_bench.db")
+    env.setdefault("SIMILARITY_INDEX_DIR", f"{tempfile.gettempdir()}/startup_bench_similarity")
+    return env
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--ttfr-budget-ms", type=float, default=TTFR_BUDGET_MS)
+    args = parser.parse_args()
+
+    import_ms, top_imports = measure_import_time()
+    print(f"Import backend.main: {import_ms:.1f} ms (budget {args.import_budget_ms:.0f} ms)")
+    print("Slowest imports (cumulative):")
+    for ms, name in top_imports:
+        print(f"  {ms:8.1f} ms  {name}")
+
+    ttfr_ms = measure_time_to_first_request()
+    print(f"Time to first successful request: {ttfr_ms:.1f} ms (budget {args.ttfr_budget_ms:.0f} ms)")
+
+    failed = False
+    if import_ms > args.import_budget_ms:
+        print("REGRESSION: import time over budget")
+        failed = True
+    if ttfr_ms > args.ttfr_budget_ms:
+        print("REGRESSION: time to first request over budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
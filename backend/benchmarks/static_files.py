@@ -0,0 +1,114 @@
+"""
+Static serving benchmark
+Drives the landing page and a JS asset through the ASGI interface directly
+(no network, so only the server-side cost is measured) and compares the old
+FileResponse/StaticFiles setup with the cached, precompressed one. Reports
+requests per second and bytes per response for a first visit, a
+revalidation (If-None-Match) and a compressed asset fetch.
+
+Usage: python -m backend.benchmarks.static_files [--requests N] [--concurrency N]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import FileResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+
+from backend.routes.static_files import CachedStaticFiles, StaticFileCache
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+LANDING_DIR = os.path.join(BASE_DIR, "frontend_backup")
+STATIC_DIR = os.path.join(BASE_DIR, "frontend", "public", "static")
+
+
+def old_app() -> Starlette:
+    async def root(request):
+        return FileResponse(os.path.join(LANDING_DIR, "index.html"))
+
+    return Starlette(routes=[Route("/", root), Mount("/static", StaticFiles(directory=STATIC_DIR))])
+
+
+def new_app() -> Starlette:
+    landing = StaticFileCache(LANDING_DIR)
+
+    async def root(request: Request):
+        return await landing.response(request, "index.html")
+
+    return Starlette(routes=[Route("/", root), Mount("/static", CachedStaticFiles(STATIC_DIR))])
+
+
+async def call(app, path: str, headers: dict):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+    status, size, response_headers = 0, 0, {}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status, size, response_headers
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers = {k.decode(): v.decode() for k, v in message["headers"]}
+        elif message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, size, response_headers
+
+
+async def rps(app, path: str, headers: dict, requests: int, concurrency: int):
+    queue = iter(range(requests))
+    sizes = []
+
+    async def worker():
+        for _ in queue:
+            status, size, _ = await call(app, path, headers)
+            sizes.append((status, size))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return requests / elapsed, sizes[-1]
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    apps = {"FileResponse/StaticFiles": old_app(), "cached": new_app()}
+    for label, app in apps.items():
+        _, _, landing_headers = await call(app, "/", {})
+        etag = landing_headers.get("etag", "")
+        cases = [
+            ("landing page", "/", {"accept-encoding": "gzip, br"}),
+            ("landing revalidation", "/", {"accept-encoding": "gzip, br", "if-none-match": etag}),
+            ("app.js", "/static/js/app.js", {"accept-encoding": "gzip, br"}),
+        ]
+        print(label)
+        for name, path, headers in cases:
+            rate, (status, size) = await rps(app, path, headers, args.requests, args.concurrency)
+            print(f"  {name:<22} {rate:>8.0f} req/s   HTTP {status}, {size} bytes")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+"""
+Content-addressed body storage
+Archived blog and message bodies live once in content_bodies, keyed by their
+SHA-256 and compressed with zstd (zlib when zstandard isn't installed).
+Bodies are immutable, so decompressed text is cached by hash.
+"""
+import hashlib
+import time
+import zlib
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from backend.models.models import ContentBody
+from backend.services.metrics import metrics
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, zlib is always available
+    zstandard = None
+
+ZSTD_LEVEL = 9
+CACHE_SIZE = 512
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def compress(content: str) -> Tuple[str, bytes]:
+    """Returns (codec, data)"""
+    raw = content.encode("utf-8")
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return "zlib", zlib.compress(raw, 9)
+
+
+def decompress(codec: str, data: bytes) -> str:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Body is zstd-compressed but the zstandard package is not installed")
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    elif codec == "zlib":
+        raw = zlib.decompress(data)
+    else:
+        raw = data
+    return raw.decode("utf-8")
+
+
+class _BodyCache:
+    """Small LRU of decompressed bodies (safe because bodies never change)"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._items: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: str):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+_cache = _BodyCache(CACHE_SIZE)
+
+
+def load_bodies(db: Session, hashes: Iterable[str]) -> Dict[str, str]:
+    """Batch-load and decompress bodies by hash"""
+    result: Dict[str, str] = {}
+    missing: List[str] = []
+    for h in set(hashes):
+        cached = _cache.get(h)
+        if cached is not None:
+            metrics.incr("bodies.cache_hits")
+            result[h] = cached
+        else:
+            missing.append(h)
+
+    if missing:
+        start = time.perf_counter()
+        rows = (
+            db.query(ContentBody.hash, ContentBody.codec, ContentBody.data)
+            .filter(ContentBody.hash.in_(missing))
+            .all()
+        )
+        for row in rows:
+            text = decompress(row.codec, row.data)
+            _cache.put(row.hash, text)
+            result[row.hash] = text
+        metrics.observe("bodies.load_ms", (time.perf_counter() - start) * 1000)
+    return result
+
+
+def load_body(db: Session, body_hash: str) -> str:
+    return load_bodies(db, [body_hash]).get(body_hash, "")
+
+
+def load_body_raw(dbapi_connection, body_hash: str) -> str:
+    """load_body on a raw DB-API connection, for SQL functions registered on it"""
+    cached = _cache.get(body_hash)
+    if cached is not None:
+        return cached
+    row = dbapi_connection.execute(
+        "SELECT codec, data FROM content_bodies WHERE hash = ?", (body_hash,)
+    ).fetchone()
+    if row is None:
+        return ""
+    text = decompress(row[0], row[1])
+    _cache.put(body_hash, text)
+    return text
+
+
+def hydrate(db: Session, items: List[dict], content_key: str = "content", hash_key: str = "body_hash"):
+    """
+    Fill in archived content for dicts built from column queries, in one
+    round trip. The hash key is removed from every item.
+    """
+    hashes = [item[hash_key] for item in items if item.get(hash_key) and not item.get(content_key)]
+    bodies = load_bodies(db, hashes) if hashes else {}
+    for item in items:
+        body_hash = item.pop(hash_key, None)
+        if body_hash and not item.get(content_key):
+            item[content_key] = bodies.get(body_hash, "")
+    return items
@@ -1,63 +1,210 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 from backend.models.models import Base
 import os
+import threading
 from dotenv import load_dotenv
 
 load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"))
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-if not DATABASE_URL:
+# The engine is created on first use instead of at import time, so importing
+# this module (and every route that depends on it) never waits on a Postgres
+# connection probe.
+engine = None
+_engine_lock = threading.Lock()
+
+# How long a SQLite writer waits for another connection's write to finish
+SQLITE_BUSY_TIMEOUT_SECONDS = 15
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+
+def _resolve_database_url() -> str:
+    """Pick Postgres when it is reachable, otherwise fall back to SQLite"""
+    if DATABASE_URL:
+        return DATABASE_URL
+
     user = os.getenv("POSTGRES_USER", "postgres")
     pw = os.getenv("POSTGRES_PASSWORD", "Aqsa1052.")
     host = os.getenv("POSTGRES_HOST", "localhost")
     port = os.getenv("POSTGRES_PORT", "5432")
     db = os.getenv("POSTGRES_DB", "ai_blog_db")
-    
+
     pg_url = f"postgresql://{user}:{pw}@{host}:{port}/{db}"
-    
+
     try:
         # Quick test connection
         print(f"Attempting to connect to Postgres at {host}...")
         temp_engine = create_engine(pg_url, connect_args={'connect_timeout': 3})
-        with temp_engine.connect() as conn:
-            DATABASE_URL = pg_url
+        with temp_engine.connect():
             print("Postgres connection successful!")
+        temp_engine.dispose()
+        return pg_url
     except Exception as e:
         print(f"Postgres failed: {e}. Switching to SQLite fallback.")
-        DATABASE_URL = "sqlite:///./blog_agent.db"
+        return "sqlite:///./blog_agent.db"
+
+
+def get_engine():
+    """Create the engine on first use and bind the session factory to it"""
+    global engine, DATABASE_URL
+    if engine is not None:
+        return engine
 
-# Engine configuration
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        DATABASE_URL, 
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool
-    )
-else:
-    engine = create_engine(DATABASE_URL)
+    with _engine_lock:
+        if engine is None:
+            DATABASE_URL = _resolve_database_url()
+
+            # Engine configuration
+            if DATABASE_URL.startswith("sqlite"):
+                if _is_sqlite_memory(DATABASE_URL):
+                    # An in-memory database only exists on its one connection
+                    new_engine = create_engine(
+                        DATABASE_URL,
+                        connect_args={"check_same_thread": False},
+                        poolclass=StaticPool
+                    )
+                else:
+                    # A file gets a connection per session: sharing one across the
+                    # threadpool interleaves transactions. Async handlers keep their
+                    # session across awaits, so the pool never makes a checkout wait
+                    # (that would block the event loop); SQLite connections are cheap.
+                    new_engine = create_engine(
+                        DATABASE_URL,
+                        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_SECONDS},
+                        pool_size=10,
+                        max_overflow=-1,
+                    )
+                    event.listen(new_engine, "connect", _enable_sqlite_wal)
+                # SQLite only enforces foreign keys (and ON DELETE CASCADE) when asked to
+                event.listen(new_engine, "connect", _enable_sqlite_foreign_keys)
+                # The full-text triggers look archived bodies up through fts_body()
+                from backend.database.search_index import register_sqlite_functions
+                event.listen(new_engine, "connect", register_sqlite_functions)
+            else:
+                new_engine = create_engine(DATABASE_URL)
+
+            SessionLocal.configure(bind=new_engine)
+            engine = new_engine
+    return engine
+
+
+def _is_sqlite_memory(url: str) -> bool:
+    return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+
+def _enable_sqlite_wal(dbapi_connection, connection_record):
+    # Readers no longer block the writer, which matters once several workers share the file
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
+
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def init_db():
     """Initialize database tables and handle migrations"""
+    engine = get_engine()
     Base.metadata.create_all(bind=engine)
-    
-    # Force add image_url column if it's missing (Postgres specific)
+
+    # create_all never alters existing tables, so add any model columns that
+    # older databases are missing (e.g. messages.image_url)
     try:
-        from sqlalchemy import text
-        with engine.connect() as conn:
-            conn.execute(text("ALTER TABLE messages ADD COLUMN IF NOT EXISTS image_url TEXT"))
-            conn.commit()
-            # If sources column still exists, we can try to migrate data if needed in future
+        _add_missing_columns(engine)
     except Exception as e:
         print(f"Schema update note: {e}")
 
+    try:
+        _ensure_cascading_foreign_keys(engine)
+    except Exception as e:
+        print(f"Foreign key update note: {e}")
+
+    try:
+        from backend.database.search_index import install_search_index
+        install_search_index(engine)
+    except Exception as e:
+        print(f"Full-text index setup note: {e}")
+
     print(f"Database tables initialized on {DATABASE_URL}")
 
+
+def _add_missing_columns(engine):
+    from sqlalchemy import inspect, text
+
+    inspector = inspect(engine)
+    with engine.connect() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+                print(f"Added missing column {table.name}.{column.name}")
+        conn.commit()
+
+def _ensure_cascading_foreign_keys(engine):
+    """
+    Recreate foreign keys that the models declare with ON DELETE but older
+    databases created without it. Postgres only: SQLite can't alter
+    constraints, so legacy SQLite files keep their original behaviour.
+    """
+    if engine.dialect.name != "postgresql":
+        return
+    from sqlalchemy import inspect, text
+
+    inspector = inspect(engine)
+    with engine.connect() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = inspector.get_foreign_keys(table.name)
+            for fk in table.foreign_keys:
+                wanted = fk.ondelete
+                if not wanted:
+                    continue
+                column = fk.parent.name
+                for current in existing:
+                    if current["constrained_columns"] != [column]:
+                        continue
+                    if (current.get("options", {}).get("ondelete") or "").upper() == wanted.upper():
+                        continue
+                    target = fk.column
+                    conn.execute(text(f'ALTER TABLE {table.name} DROP CONSTRAINT "{current["name"]}"'))
+                    conn.execute(text(
+                        f'ALTER TABLE {table.name} ADD CONSTRAINT "{current["name"]}" '
+                        f"FOREIGN KEY ({column}) REFERENCES {target.table.name} ({target.name}) "
+                        f"ON DELETE {wanted}"
+                    ))
+                    print(f"Foreign key {table.name}.{column} now ON DELETE {wanted}")
+        conn.commit()
+
+
+def cascade_deletes_enabled() -> bool:
+    """True when deleting a chat removes its messages and blogs in the database"""
+    global _cascade_deletes
+    if _cascade_deletes is None:
+        from sqlalchemy import inspect
+
+        foreign_keys = inspect(get_engine()).get_foreign_keys("messages")
+        _cascade_deletes = any(
+            fk["referred_table"] == "chats"
+            and (fk.get("options", {}).get("ondelete") or "").upper() == "CASCADE"
+            for fk in foreign_keys
+        )
+    return _cascade_deletes
+
+
+_cascade_deletes = None
+
+
 def get_db():
+    get_engine()
     db = SessionLocal()
     try:
         yield db
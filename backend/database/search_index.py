@@ -0,0 +1,377 @@
+"""
+Full-text search index
+Postgres: trigger-maintained tsvector columns with GIN indexes.
+SQLite: external-content FTS5 tables kept in sync by triggers.
+Either way the index is updated in the same transaction as the row insert
+or update, so nothing in the request path has to maintain it.
+Archived bodies stay searchable: Postgres keeps the vector when the inline
+content is emptied, SQLite skips re-indexing the emptied row and removes
+archived rows from FTS5 with their stored body (the fts_body() SQL function).
+Snippets for archived rows are built from the hydrated body, since the
+inline column the database would highlight is empty.
+"""
+import re
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Markers around matched terms in snippets (markdown bold, safe to render)
+HIGHLIGHT_START = "**"
+HIGHLIGHT_STOP = "**"
+SNIPPET_WORDS = 24
+# Deepest row a page may start at; each source fetches offset + limit + 1 rows
+MAX_SEARCH_OFFSET = 500
+
+_POSTGRES_DDL = [
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    "ALTER TABLE blogs ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    """
+    CREATE OR REPLACE FUNCTION messages_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        -- Archiving empties the inline body; keep the vector it was indexed with
+        IF TG_OP = 'UPDATE' AND NEW.body_hash IS NOT NULL AND NEW.content = '' THEN
+            NEW.search_vector := OLD.search_vector;
+            RETURN NEW;
+        END IF;
+        NEW.search_vector := to_tsvector('english', coalesce(NEW.content, ''));
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION blogs_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND NEW.body_hash IS NOT NULL AND NEW.content = '' THEN
+            NEW.search_vector := OLD.search_vector;
+            RETURN NEW;
+        END IF;
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.topic, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.content, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS messages_search_vector_trg ON messages",
+    """
+    CREATE TRIGGER messages_search_vector_trg BEFORE INSERT OR UPDATE OF content ON messages
+    FOR EACH ROW EXECUTE FUNCTION messages_search_vector_update()
+    """,
+    "DROP TRIGGER IF EXISTS blogs_search_vector_trg ON blogs",
+    """
+    CREATE TRIGGER blogs_search_vector_trg BEFORE INSERT OR UPDATE OF topic, content ON blogs
+    FOR EACH ROW EXECUTE FUNCTION blogs_search_vector_update()
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_messages_search_vector ON messages USING GIN (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_blogs_search_vector ON blogs USING GIN (search_vector)",
+]
+
+# Rows written before the index existed, backfilled in batches
+_POSTGRES_BACKFILL = [
+    """
+    UPDATE messages SET search_vector = to_tsvector('english', coalesce(content, ''))
+    WHERE id IN (SELECT id FROM messages WHERE search_vector IS NULL LIMIT 5000)
+    """,
+    """
+    UPDATE blogs SET search_vector =
+        setweight(to_tsvector('english', coalesce(topic, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'B')
+    WHERE id IN (SELECT id FROM blogs WHERE search_vector IS NULL LIMIT 5000)
+    """,
+]
+
+_SQLITE_TABLES = {
+    "messages_fts": (
+        "CREATE VIRTUAL TABLE messages_fts USING fts5("
+        "content, content='messages', content_rowid='id', tokenize='porter unicode61')"
+    ),
+    "blogs_fts": (
+        "CREATE VIRTUAL TABLE blogs_fts USING fts5("
+        "topic, content, content='blogs', content_rowid='id', tokenize='porter unicode61')"
+    ),
+}
+
+# Archiving empties content and sets body_hash; the index keeps the body it had
+_ARCHIVING = "new.body_hash IS NOT NULL AND new.content = ''"
+
+_SQLITE_TRIGGERS = {
+    "messages_fts_ai": """
+    CREATE TRIGGER messages_fts_ai AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    "messages_fts_ad": """
+    CREATE TRIGGER messages_fts_ad AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content)
+        VALUES ('delete', old.id, fts_body(old.content, old.body_hash));
+    END
+    """,
+    "messages_fts_au": f"""
+    CREATE TRIGGER messages_fts_au AFTER UPDATE OF content ON messages
+    WHEN NOT ({_ARCHIVING}) BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content)
+        VALUES ('delete', old.id, fts_body(old.content, old.body_hash));
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    "blogs_fts_ai": """
+    CREATE TRIGGER blogs_fts_ai AFTER INSERT ON blogs BEGIN
+        INSERT INTO blogs_fts(rowid, topic, content) VALUES (new.id, new.topic, new.content);
+    END
+    """,
+    "blogs_fts_ad": """
+    CREATE TRIGGER blogs_fts_ad AFTER DELETE ON blogs BEGIN
+        INSERT INTO blogs_fts(blogs_fts, rowid, topic, content)
+        VALUES ('delete', old.id, old.topic, fts_body(old.content, old.body_hash));
+    END
+    """,
+    "blogs_fts_au": f"""
+    CREATE TRIGGER blogs_fts_au AFTER UPDATE OF topic, content ON blogs
+    WHEN NOT ({_ARCHIVING} AND new.topic IS old.topic) BEGIN
+        INSERT INTO blogs_fts(blogs_fts, rowid, topic, content)
+        VALUES ('delete', old.id, old.topic, fts_body(old.content, old.body_hash));
+        INSERT INTO blogs_fts(rowid, topic, content)
+        VALUES (new.id, new.topic, fts_body(new.content, new.body_hash));
+    END
+    """,
+}
+
+# Fills an FTS table from its content table, archived bodies included
+_SQLITE_REINDEX = {
+    "messages_fts": "INSERT INTO messages_fts(rowid, content) SELECT id, fts_body(content, body_hash) FROM messages",
+    "blogs_fts": (
+        "INSERT INTO blogs_fts(rowid, topic, content) "
+        "SELECT id, topic, fts_body(content, body_hash) FROM blogs"
+    ),
+}
+
+
+def register_sqlite_functions(dbapi_connection, connection_record=None):
+    """
+    fts_body(content, body_hash): the inline content, or the archived body
+    when the row has been archived. The FTS triggers call it, so every
+    SQLite connection that writes blogs or messages needs it.
+    """
+    from backend.database.bodies import load_body_raw
+
+    def fts_body(content, body_hash):
+        if content or not body_hash:
+            return content
+        return load_body_raw(dbapi_connection, body_hash)
+
+    # Not deterministic: the result depends on content_bodies, not just the arguments
+    dbapi_connection.create_function("fts_body", 2, fts_body)
+
+
+def install_search_index(engine):
+    """Create the index structures (idempotent) and backfill existing rows"""
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            for statement in _POSTGRES_DDL:
+                conn.execute(text(statement))
+            conn.commit()
+            for statement in _POSTGRES_BACKFILL:
+                while conn.execute(text(statement)).rowcount:
+                    conn.commit()
+            conn.commit()
+        elif engine.dialect.name == "sqlite":
+            existing = {
+                row[0]: row[1]
+                for row in conn.execute(text("SELECT name, sql FROM sqlite_master WHERE type IN ('table', 'trigger')"))
+            }
+            # Triggers from before archived rows were kept indexed are replaced
+            # and the index rebuilt from the hydrated bodies
+            outdated = any(
+                name in existing and "fts_body" in ddl and "fts_body" not in existing[name]
+                for name, ddl in _SQLITE_TRIGGERS.items()
+            )
+            for table, ddl in _SQLITE_TABLES.items():
+                if table not in existing:
+                    conn.execute(text(ddl))
+                elif outdated:
+                    conn.execute(text(f"INSERT INTO {table}({table}) VALUES ('delete-all')"))
+                else:
+                    continue
+                # Index whatever is already in the content table
+                conn.execute(text(_SQLITE_REINDEX[table]))
+            for name, ddl in _SQLITE_TRIGGERS.items():
+                if outdated:
+                    conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+                if outdated or name not in existing:
+                    conn.execute(text(ddl))
+            conn.commit()
+
+
+def _fts5_query(query: str) -> str:
+    """Quote each term so user input can't inject FTS5 syntax; prefix-match the last one"""
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return ""
+    quoted = [f'"{t}"' for t in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def search(
+    db: Session,
+    query: str,
+    user_id: int,
+    kind: str = "all",
+    limit: int = 20,
+    offset: int = 0,
+) -> Dict[str, Any]:
+    """
+    Ranked, paginated search over a user's blogs and/or chat messages.
+    Returns {"results": [...], "has_more": bool}; higher score is better.
+    Scores are normalised per source (the best hit of each scores 1.0) so
+    blog and message ranks, which use different weights, merge fairly.
+    """
+    dialect = db.get_bind().dialect.name
+    kinds = ["blog", "message"] if kind == "all" else [kind]
+    offset = min(max(offset, 0), MAX_SEARCH_OFFSET)
+    # Each source returns enough rows to fill this page after merging
+    window = offset + limit + 1
+
+    results: List[Dict[str, Any]] = []
+    for source in kinds:
+        if dialect == "postgresql":
+            hits = _search_postgres(db, source, query, user_id, window)
+        else:
+            fts_query = _fts5_query(query)
+            hits = _search_sqlite(db, source, fts_query, user_id, window) if fts_query else []
+        _normalise_scores(hits)
+        results.extend(hits)
+
+    results.sort(key=lambda r: r["score"], reverse=True)
+    page = results[offset:offset + limit + 1]
+    has_more = len(page) > limit
+    page = page[:limit]
+    _archived_snippets(db, page, query)
+    for result in page:
+        result.pop("body_hash", None)
+    return {"results": page, "has_more": has_more}
+
+
+def _normalise_scores(hits: List[Dict[str, Any]]):
+    """Rescale one source's scores to (0, 1] relative to its best hit"""
+    best = max((h["score"] for h in hits), default=0.0)
+    if best <= 0:
+        return
+    for hit in hits:
+        hit["score"] = hit["score"] / best
+
+
+def _archived_snippets(db: Session, results: List[Dict[str, Any]], query: str):
+    """Snippets for archived rows, whose inline content is empty, from their stored bodies"""
+    hashes = [r["body_hash"] for r in results if r.get("body_hash")]
+    if not hashes:
+        return
+    from backend.database.bodies import load_bodies
+
+    bodies = load_bodies(db, hashes)
+    for result in results:
+        if result.get("body_hash"):
+            result["snippet"] = make_snippet(bodies.get(result["body_hash"], ""), query)
+
+
+def make_snippet(body: str, query: str, words: int = SNIPPET_WORDS) -> str:
+    """
+    A window of about `words` words around the first query term found in
+    `body`, with matching words highlighted like the database snippets.
+    Terms match word prefixes, which also covers most stemmed forms.
+    """
+    terms = [t.lower() for t in re.findall(r"\w+", query)]
+    tokens = body.split()
+    if not tokens:
+        return ""
+
+    def matches(token: str) -> bool:
+        word = re.sub(r"^\W+|\W+$", "", token).lower()
+        return bool(word) and any(word.startswith(t) for t in terms)
+
+    first = next((i for i, token in enumerate(tokens) if matches(token)), 0)
+    start = max(0, min(first - words // 3, len(tokens) - words))
+    window = tokens[start:start + words]
+    snippet = " ".join(f"{HIGHLIGHT_START}{t}{HIGHLIGHT_STOP}" if matches(t) else t for t in window)
+    return ("…" if start > 0 else "") + snippet + ("…" if start + words < len(tokens) else "")
+
+
+def _search_postgres(db: Session, source: str, query: str, user_id: int, window: int):
+    headline_options = (
+        f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxFragments=2, MinWords=8, MaxWords=30"
+    )
+    if source == "blog":
+        sql = """
+            SELECT hit.id, hit.chat_id, hit.topic AS title, hit.timestamp AS created_at, hit.score, b.body_hash,
+                   ts_headline('english', b.content, hit.q, :opts) AS snippet
+            FROM (
+                SELECT b.id, b.chat_id, b.topic, b.timestamp, q,
+                       ts_rank_cd(b.search_vector, q) AS score
+                FROM blogs b, websearch_to_tsquery('english', :q) q
+                WHERE b.user_id = :user_id AND b.search_vector @@ q
+                ORDER BY score DESC
+                LIMIT :window
+            ) hit JOIN blogs b ON b.id = hit.id
+            ORDER BY hit.score DESC
+        """
+    else:
+        sql = """
+            SELECT hit.id, hit.chat_id, hit.title, hit.created_at, hit.score, m.body_hash,
+                   ts_headline('english', m.content, hit.q, :opts) AS snippet
+            FROM (
+                SELECT m.id, m.chat_id, c.title, m.created_at, q,
+                       ts_rank_cd(m.search_vector, q) AS score
+                FROM messages m JOIN chats c ON c.id = m.chat_id,
+                     websearch_to_tsquery('english', :q) q
+                WHERE c.user_id = :user_id AND m.search_vector @@ q
+                ORDER BY score DESC
+                LIMIT :window
+            ) hit JOIN messages m ON m.id = hit.id
+            ORDER BY hit.score DESC
+        """
+    rows = db.execute(
+        text(sql), {"q": query, "user_id": user_id, "window": window, "opts": headline_options}
+    )
+    return [_row_to_result(source, row) for row in rows]
+
+
+def _search_sqlite(db: Session, source: str, fts_query: str, user_id: int, window: int):
+    marks = f"'{HIGHLIGHT_START}', '{HIGHLIGHT_STOP}', '…', 24"
+    if source == "blog":
+        sql = f"""
+            SELECT b.id, b.chat_id, b.topic AS title, b.timestamp AS created_at, b.body_hash,
+                   -bm25(blogs_fts, 4.0, 1.0) AS score,
+                   snippet(blogs_fts, 1, {marks}) AS snippet
+            FROM blogs_fts JOIN blogs b ON b.id = blogs_fts.rowid
+            WHERE blogs_fts MATCH :q AND b.user_id = :user_id
+            ORDER BY bm25(blogs_fts, 4.0, 1.0)
+            LIMIT :window
+        """
+    else:
+        sql = f"""
+            SELECT m.id, m.chat_id, c.title, m.created_at, m.body_hash,
+                   -bm25(messages_fts) AS score,
+                   snippet(messages_fts, 0, {marks}) AS snippet
+            FROM messages_fts
+            JOIN messages m ON m.id = messages_fts.rowid
+            JOIN chats c ON c.id = m.chat_id
+            WHERE messages_fts MATCH :q AND c.user_id = :user_id
+            ORDER BY bm25(messages_fts)
+            LIMIT :window
+        """
+    rows = db.execute(text(sql), {"q": fts_query, "user_id": user_id, "window": window})
+    return [_row_to_result(source, row) for row in rows]
+
+
+def _row_to_result(source: str, row) -> Dict[str, Any]:
+    return {
+        "type": source,
+        "id": row.id,
+        "chat_id": row.chat_id,
+        "title": row.title,
+        "snippet": row.snippet,
+        "score": float(row.score),
+        "created_at": row.created_at,
+        "body_hash": row.body_hash,
+    }
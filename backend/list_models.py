@@ -1,27 +1,41 @@
-import requests
+import asyncio
+import json
 import os
+import sys
+
 from dotenv import load_dotenv
-import json
+
+# Add root directory to sys.path to support 'backend.' imports
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from backend.services.model_pool import ModelPool
 
 load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
-
-base_url = "https://generativelanguage.googleapis.com/v1beta/models"
-
-print(f"Checking models for API Key: {api_key[:10]}...")
-
-try:
-    response = requests.get(f"{base_url}?key={api_key}")
-    data = response.json()
-    
-    if "models" in data:
-        print("Available models:")
-        for model in data["models"]:
-            # Filter for generation models
-            if "generateContent" in model.get("supportedGenerationMethods", []):
-                print(f"- {model['name']}")
-    else:
-        print("Error fetching models:", json.dumps(data, indent=2))
-
-except Exception as e:
-    print(f"Request Error: {e}")
+
+
+async def main():
+    # Same listing endpoint and key/model configuration the app's pool uses
+    pool = ModelPool.from_env()
+    print(f"Checking models at {pool.base_url} with {len(pool.keys)} key(s)...")
+    try:
+        listings = await pool.probe()
+        for key, models in listings.items():
+            if isinstance(models, str):
+                print(f"Key {key}: {models}")
+                continue
+            print(f"Key {key}: {len(models)} available models")
+            for name in models:
+                print(f"- {name}")
+
+        print("Configured pool:")
+        print(json.dumps(pool.snapshot(), indent=2, ensure_ascii=False))
+    except Exception as e:
+        print(f"Request Error: {e}")
+    finally:
+        await pool.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -6,14 +6,102 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if BASE_DIR not in sys.path:
     sys.path.append(BASE_DIR)
 
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi import Request
 from backend.routes.api import router as api_router
+from backend.routes.static_files import CachedStaticFiles, StaticFileCache
 from backend.database.database import init_db
+from backend.middleware.compression import CompressionMiddleware
+from backend.middleware.profiling import ProfilingMiddleware
+from backend.services.container import (
+    MODEL_PROBE_INTERVAL_SECONDS,
+    SIMILARITY_REBUILD_INTERVAL_SECONDS,
+    ServiceContainer,
+)
+from backend.services.content_archive import ARCHIVE_INTERVAL_SECONDS, run_archive_periodically
+from backend.services.image_gc import IMAGE_GC_INTERVAL_SECONDS, run_image_gc_periodically
+from backend.services.loop_monitor import LOOP_MONITOR_ENABLED, EventLoopMonitor
+from backend.services.prefetch import PREFETCH_INTERVAL_SECONDS
+from backend.services.shared_store import hold_lease, run_store_purge_periodically
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    print("Starting AI Blog Generation Agent...")
+    # Services are only registered here; each one is built on first use
+    app.state.services = ServiceContainer()
+
+    # Logs the stack of anything that blocks the loop past the threshold
+    loop_monitor = EventLoopMonitor() if LOOP_MONITOR_ENABLED else None
+    if loop_monitor:
+        loop_monitor.start()
+
+    try:
+        print("Checking database connection...")
+        # Workers started together would race on CREATE/ALTER TABLE, so they take turns
+        # Opening the store creates its schema, which can wait on another worker
+        store = await asyncio.to_thread(lambda: app.state.services.shared_store)
+        while not await asyncio.to_thread(store.acquire, "lock:init-db", 120):
+            await asyncio.sleep(0.1)
+        try:
+            # The Postgres probe can block for seconds, keep it off the event loop
+            await asyncio.to_thread(init_db)
+        finally:
+            await asyncio.to_thread(store.release, "lock:init-db")
+        print("Database initialized successfully!")
+    except Exception as e:
+        print(f"DATABASE ERROR ON STARTUP: {str(e)}")
+        print("Continuing without DB for now (Frontend should still load)...")
+
+    # One shared keep-alive/HTTP/2 pool for every LLM call, connected before
+    # the first request instead of on it
+    app.state.services.llm_http_client
+
+    background_tasks = []
+    if os.getenv("WARM_SERVICES", "1") == "1":
+        background_tasks.append(asyncio.create_task(app.state.services.prewarm_llm_connections()))
+        background_tasks.append(asyncio.create_task(app.state.services.warm_up()))
+
+    if MODEL_PROBE_INTERVAL_SECONDS > 0:
+        # Each worker probes its own pool state
+        background_tasks.append(
+            asyncio.create_task(app.state.services.probe_models_periodically())
+        )
 
-app = FastAPI(title="AI Blog Generation Agent", version="1.0.0")
+    def start_host_jobs():
+        """Jobs that should run once per host, not once per worker"""
+        jobs = [asyncio.create_task(run_store_purge_periodically(app.state.services.shared_store))]
+        if ARCHIVE_INTERVAL_SECONDS > 0:
+            jobs.append(asyncio.create_task(run_archive_periodically()))
+        if IMAGE_GC_INTERVAL_SECONDS > 0:
+            jobs.append(asyncio.create_task(run_image_gc_periodically(app.state.services.image_gc)))
+        if SIMILARITY_REBUILD_INTERVAL_SECONDS > 0:
+            jobs.append(asyncio.create_task(app.state.services.rebuild_similarity_periodically()))
+        if PREFETCH_INTERVAL_SECONDS > 0:
+            # Warms trending topics while the host is quiet
+            jobs.append(asyncio.create_task(app.state.services.prefetch_periodically()))
+        return jobs
+
+    # With several workers (backend/serve.py) only the lease holder runs them
+    background_tasks.append(
+        asyncio.create_task(hold_lease(app.state.services.shared_store, "host-jobs", start_host_jobs))
+    )
+
+    print("Backend is ready and listening on port 8000")
+    yield
+
+    for task in background_tasks:
+        if not task.done():
+            task.cancel()
+    await app.state.services.aclose()
+    if loop_monitor:
+        await loop_monitor.stop()
+
+
+app = FastAPI(title="AI Blog Generation Agent", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -24,36 +112,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress API responses (brotli when available, gzip otherwise)
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
 
-# Initialize database on startup
-@app.on_event("startup")
-async def startup_event():
-    print("Starting AI Blog Generation Agent...")
-    try:
-        print("Checking database connection...")
-        init_db()
-        print("Database initialized successfully!")
-    except Exception as e:
-        print(f"DATABASE ERROR ON STARTUP: {str(e)}")
-        print("Continuing without DB for now (Frontend should still load)...")
-    print("Backend is ready and listening on port 8000")
+# Sampling profiler for requests sent with X-Profile: $PROFILE_TOKEN (outermost)
+app.add_middleware(ProfilingMiddleware)
 
 
 # Include API routes
 app.include_router(api_router, prefix="/api", tags=["API"])
 
-# Serve static files
+# Serve static files (kept in memory, precompressed, long-lived cache headers)
 app.mount(
     "/static",
-    StaticFiles(directory=os.path.join(BASE_DIR, "frontend", "public", "static")),
+    CachedStaticFiles(directory=os.path.join(BASE_DIR, "frontend", "public", "static")),
     name="static",
 )
 
+landing_page = StaticFileCache(os.path.join(BASE_DIR, "frontend_backup"))
+
 
 # Serve frontend
-@app.get("/")
-async def read_root():
-    return FileResponse(os.path.join(BASE_DIR, "frontend_backup", "index.html"))
+@app.api_route("/", methods=["GET", "HEAD"])
+async def read_root(request: Request):
+    return await landing_page.response(request, "index.html")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,169 @@
+"""
+Response compression middleware
+Brotli when the client accepts it (and the brotli package is installed),
+gzip otherwise. Already-compressed media types are passed through untouched.
+"""
+import zlib
+from typing import Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Media types worth compressing
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "text/",
+    "image/svg+xml",
+)
+
+
+class _GzipCompressor:
+    encoding = "gzip"
+
+    def __init__(self, level: int):
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._obj.flush()
+
+
+class _BrotliCompressor:
+    encoding = "br"
+
+    def __init__(self, quality: int):
+        self._obj = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.process(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush()
+
+    def finish(self) -> bytes:
+        return self._obj.finish()
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        path_prefixes: Tuple[str, ...] = ("/api",),
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.path_prefixes = path_prefixes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self._choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+    def _choose_encoding(self, accept_encoding: str) -> Optional[str]:
+        accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def new_compressor(self, encoding: str):
+        if encoding == "br":
+            return _BrotliCompressor(self.brotli_quality)
+        return _GzipCompressor(self.gzip_level)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self.start_message: Optional[Message] = None
+        self.compressor = None
+        self.passthrough = False
+
+    async def send(self, message: Message):
+        if message["type"] == "http.response.start":
+            # Hold the headers until we know whether the body is worth compressing
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None and self.start_message is not None:
+            headers = Headers(raw=self.start_message["headers"])
+            if not self._should_compress(headers, body, more_body):
+                self.passthrough = True
+                await self._send(self.start_message)
+                await self._send(message)
+                return
+
+            self.compressor = self.middleware.new_compressor(self.encoding)
+            mutable = MutableHeaders(raw=self.start_message["headers"])
+            mutable["Content-Encoding"] = self.encoding
+            mutable.add_vary_header("Accept-Encoding")
+            if not more_body:
+                compressed = self.compressor.compress(body) + self.compressor.finish()
+                mutable["Content-Length"] = str(len(compressed))
+                _tag_etag(mutable, self.encoding)
+                await self._send(self.start_message)
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+
+            # Streaming response: compress chunk by chunk
+            del mutable["Content-Length"]
+            _tag_etag(mutable, self.encoding)
+            await self._send(self.start_message)
+
+        if more_body:
+            chunk = self.compressor.compress(body) + self.compressor.flush()
+            await self._send({"type": "http.response.body", "body": chunk, "more_body": True})
+        else:
+            chunk = self.compressor.compress(body) + self.compressor.finish()
+            await self._send({"type": "http.response.body", "body": chunk})
+
+    def _should_compress(self, headers: Headers, body: bytes, more_body: bool) -> bool:
+        if "content-encoding" in headers or self.start_message.get("status") in (204, 206, 304):
+            return False
+        content_type = headers.get("content-type", "")
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return False
+        return more_body or len(body) >= self.middleware.minimum_size
+
+
+def _tag_etag(headers: MutableHeaders, encoding: str):
+    # The encoded bytes differ from the identity representation, so the strong
+    # ETag gets an encoding suffix (stripped again when If-None-Match is checked)
+    etag = headers.get("etag")
+    if etag and etag.endswith('"') and not etag.startswith("W/"):
+        headers["ETag"] = f'{etag[:-1]}-{encoding}"'
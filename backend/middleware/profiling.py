@@ -0,0 +1,153 @@
+"""
+Opt-in request profiling
+A request that carries `X-Profile: <PROFILE_TOKEN>` is profiled by a sampling
+profiler: a background thread snapshots the event-loop thread's stack every
+PROFILE_SAMPLE_INTERVAL_MS while the request runs. Samples are written in
+collapsed-stack format (one "frame;frame;frame count" line per stack), which
+flamegraph.pl, speedscope and inferno render as a flamegraph.
+
+The response carries `X-Profile-Id`; fetch the profile with
+`GET /api/debug/profiles/<id>` and the same header. Without PROFILE_TOKEN
+set, or without the header, the middleware costs one header lookup.
+"""
+import asyncio
+import hmac
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from backend.services.metrics import metrics
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "blog_agent_profiles"))
+PROFILE_PATH_PREFIX = "/api/debug/profiles/"
+
+PROFILE_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapsed_stack(frame) -> str:
+    """Root-first, semicolon separated stack of a frame"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class StackSampler:
+    """Samples one thread's stack from a daemon thread until stopped"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[collapsed_stack(frame)] += 1
+            del frame
+
+
+def write_collapsed(samples: Counter, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+class ProfilingMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        token: str = PROFILE_TOKEN,
+        interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS,
+        profile_dir: str = PROFILE_DIR,
+    ):
+        self.app = app
+        self.token = token
+        self.interval = interval_ms / 1000
+        self.profile_dir = profile_dir
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.token or not self._authorized(scope):
+            await self.app(scope, receive, send)
+            return
+
+        if scope["path"].startswith(PROFILE_PATH_PREFIX):
+            await self._serve_profile(scope["path"][len(PROFILE_PATH_PREFIX):], send)
+            return
+
+        profile_id = uuid.uuid4().hex
+
+        async def send_with_id(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(raw=message["headers"])["X-Profile-Id"] = profile_id
+            await send(message)
+
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            samples = sampler.stop()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            path = os.path.join(self.profile_dir, f"{profile_id}.collapsed")
+            await asyncio.to_thread(write_collapsed, samples, path)
+            metrics.incr("profiler.requests_profiled")
+            print(
+                f"Profiled {scope['method']} {scope['path']} in {elapsed_ms:.0f} ms: "
+                f"{sum(samples.values())} samples -> {path}"
+            )
+
+    def _authorized(self, scope: Scope) -> bool:
+        supplied = Headers(scope=scope).get("x-profile")
+        return supplied is not None and hmac.compare_digest(supplied.encode(), self.token.encode())
+
+    async def _serve_profile(self, profile_id: str, send: Send):
+        body: Optional[bytes] = None
+        if PROFILE_ID_RE.match(profile_id):
+            try:
+                with open(os.path.join(self.profile_dir, f"{profile_id}.collapsed"), "rb") as f:
+                    body = f.read()
+            except FileNotFoundError:
+                pass
+        status = 200 if body is not None else 404
+        body = body if body is not None else b"Profile not found"
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"cache-control", b"no-store"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,11 +1,53 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import relationship, object_session
 from datetime import datetime
 
 Base = declarative_base()
 
 
+class ContentBody(Base):
+    """Compressed, content-addressed body shared by archived blogs and messages"""
+    __tablename__ = "content_bodies"
+
+    hash = Column(String(64), primary_key=True)
+    codec = Column(String(10), nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    raw_size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ArchivableContentMixin:
+    """
+    `content` reads transparently from content_bodies once a row is archived
+    (inline column emptied, body_hash set). Assigning new content stores it
+    inline again.
+    """
+
+    @hybrid_property
+    def content(self):
+        if self.body_hash and not self._content:
+            from backend.database.bodies import load_body
+            session = object_session(self)
+            if session is None:
+                from backend.database.database import SessionLocal
+                with SessionLocal() as session:
+                    return load_body(session, self.body_hash)
+            return load_body(session, self.body_hash)
+        return self._content
+
+    @content.inplace.setter
+    def _content_setter(self, value):
+        self._content = value
+        self.body_hash = None
+
+    @content.inplace.expression
+    @classmethod
+    def _content_expression(cls):
+        return cls._content
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -26,34 +68,55 @@ class Chat(Base):
     title = Column(String(200), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Running summary of the messages up to summary_message_id
+    summary = Column(Text, nullable=True)
+    summary_message_id = Column(Integer, nullable=True)
+    # JSON: research and image of the latest turn, reused by follow-ups
+    context_cache = Column(Text, nullable=True)
 
     user = relationship("User", back_populates="chats")
     messages = relationship(
-        "Message", back_populates="chat", cascade="all, delete-orphan"
+        "Message", back_populates="chat", cascade="all, delete-orphan", passive_deletes=True
     )
 
 
-class Message(Base):
+class Message(ArchivableContentMixin, Base):
     __tablename__ = "messages"
 
     id = Column(Integer, primary_key=True, index=True)
-    chat_id = Column(Integer, ForeignKey("chats.id"), nullable=False)
+    chat_id = Column(Integer, ForeignKey("chats.id", ondelete="CASCADE"), nullable=False)
     role = Column(String(20), nullable=False)  # 'user' or 'assistant'
-    content = Column(Text, nullable=False)
+    _content = Column("content", Text, nullable=False)
+    body_hash = Column(String(64), ForeignKey("content_bodies.hash"), nullable=True, index=True)
     image_url = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     chat = relationship("Chat", back_populates="messages")
 
+    @property
+    def thumbnail_url(self):
+        return thumbnail_url_for(self.image_url)
+
+
+def thumbnail_url_for(image_url):
+    """Preview-sized variant for negotiated images (legacy PNG urls have none)"""
+    if image_url and image_url.startswith("/api/images/"):
+        return f"{image_url}?size=thumb"
+    return image_url
 
-class Blog(Base):
+
+class Blog(ArchivableContentMixin, Base):
     __tablename__ = "blogs"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    chat_id = Column(Integer, ForeignKey("chats.id"), nullable=True)
+    chat_id = Column(Integer, ForeignKey("chats.id", ondelete="CASCADE"), nullable=True)
     topic = Column(String(500), nullable=False)
-    content = Column(Text, nullable=False)
+    _content = Column("content", Text, nullable=False)
+    body_hash = Column(String(64), ForeignKey("content_bodies.hash"), nullable=True, index=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
+    # Edits in a chat revise the blog in place
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     user = relationship("User", back_populates="blogs")
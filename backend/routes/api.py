@@ -1,21 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from pydantic import BaseModel
-from backend.database.database import get_db
-from backend.models.models import User, Chat, Message, Blog
-from backend.services.search_service import WebSearchService
-from backend.services.ai_agent import GeminiAgent
+from typing import TYPE_CHECKING, List, Literal, Optional
+from pydantic import BaseModel, Field
+from backend.database.database import cascade_deletes_enabled, get_db
+from backend.database import search_index
+from backend.database.bodies import hydrate
+from backend.models.models import User, Chat, Message, Blog, thumbnail_url_for
+from backend.routes.http_cache import compute_etag, conditional_json, json_response, rows_to_dicts
+from backend.services.container import ServiceContainer
+from backend.services.metrics import metrics
+from backend.services.resilience import breaker_states
+from backend.services import content_archive, export_service
+from backend.services.prefetch_state import prefetch_stats, record_interactive
+from backend.services.conversation import load_chat_context, refresh_summary, store_turn_cache
 from datetime import datetime
+import asyncio
+import os
+
+if TYPE_CHECKING:
+    from backend.services.ai_agent import GeminiAgent
 
 # from backend.services.openai_agent import OpenAIBlogAgent
 
 # openai_agent = OpenAIBlogAgent()
 router = APIRouter()
 
-# Initialize services
-search_service = WebSearchService()
-ai_agent = GeminiAgent()
+
+# Service dependencies (services are built lazily by the container)
+def get_services(request: Request) -> ServiceContainer:
+    return request.app.state.services
+
+
+def get_ai_agent(services: ServiceContainer = Depends(get_services)) -> "GeminiAgent":
+    return services.ai_agent
 
 
 # Pydantic models for request/response
@@ -23,6 +41,11 @@ class TopicRequest(BaseModel):
     topic: str
     user_id: int = 1
     chat_id: Optional[int] = None
+    # "long_form" writes an outline first and then the sections in parallel
+    mode: Literal["standard", "long_form"] = "standard"
+    target_words: Optional[int] = Field(default=None, ge=300, le=10000)
+    # Return the user's existing blog on a near-identical topic instead of generating
+    reuse_existing: bool = False
 
 
 class ChatResponse(BaseModel):
@@ -39,6 +62,7 @@ class MessageResponse(BaseModel):
     role: str
     content: str
     image_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
     created_at: datetime
 
     class Config:
@@ -56,7 +80,13 @@ class BlogResponse(BaseModel):
 
 
 @router.post("/generate-blog")
-async def generate_blog(request: TopicRequest, db: Session = Depends(get_db)):
+async def generate_blog(
+    request: TopicRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    services: ServiceContainer = Depends(get_services),
+    ai_agent=Depends(get_ai_agent),
+):
     """
     Main endpoint to generate blog:
     1. Perform web searches
@@ -64,6 +94,8 @@ async def generate_blog(request: TopicRequest, db: Session = Depends(get_db)):
     3. Generate blog with AI
     4. Save to database
     """
+    # The idle-time prefetcher backs off while requests like this one arrive
+    await asyncio.to_thread(record_interactive, services.shared_store)
     try:
         # Step 1: Get or create user
         user = db.query(User).filter(User.id == request.user_id).first()
@@ -77,9 +109,32 @@ async def generate_blog(request: TopicRequest, db: Session = Depends(get_db)):
             db.commit()
             db.refresh(user)
 
+        # New conversations can ask to reuse the user's blog on the same topic;
+        # the check loads the index, so it only runs when asked for
+        similar = None
+        if request.reuse_existing and not request.chat_id:
+            similar = await _find_near_duplicate(services, request.topic, user.id)
+        if similar is not None:
+            existing = db.query(Blog).filter(Blog.id == similar.blog_id).first()
+            if existing is not None:
+                metrics.incr("similarity_index.reused")
+                return {
+                    "success": True,
+                    "chat_id": existing.chat_id,
+                    "blog_id": existing.id,
+                    "topic": existing.topic,
+                    "content": existing.content,
+                    "route": "existing",
+                    "similar_blog": similar.to_dict(),
+                }
+
         # Step 2: Get or Create chat
+        context = None
         if request.chat_id:
             chat = db.query(Chat).filter(Chat.id == request.chat_id).first()
+            if chat:
+                # Recent window + running summary + cached research/image
+                context = await asyncio.to_thread(load_chat_context, db, chat)
             if not chat:
                 chat = Chat(user_id=user.id, title=request.topic[:100])
                 db.add(chat)
@@ -91,24 +146,27 @@ async def generate_blog(request: TopicRequest, db: Session = Depends(get_db)):
             db.commit()
             db.refresh(chat)
 
-        # Step 3: Save user message
+        # Step 3: Save user message (follow-ups in a chat are stored as typed)
         user_message = Message(
             chat_id=chat.id,
             role="user",
-            content=f"Generate a blog about: {request.topic}",
+            content=request.topic if context else f"Generate a blog about: {request.topic}",
         )
         db.add(user_message)
         db.commit()
 
         # Step 4: Process with AI Agent (Matched with SDK Pattern)
         print(f"Generating blog with AI Agent SDK...")
-        ai_result = await ai_agent.process_topic(request.topic)
+        ai_result = await ai_agent.process_topic(
+            request.topic, mode=request.mode, target_words=request.target_words, context=context
+        )
 
         blog_content = ai_result["blog_content"]
+        route = ai_result.get("route", "blog")
 
         # Step 6: Save blog to database ONLY if it's valid content
-        # Check for error indicators
-        is_valid_blog = True
+        # Small talk and image-only replies are never stored as blogs
+        is_valid_blog = route in ("blog", "edit")
         # Filter out errors and short content (less than 500 chars)
         if "System Error" in blog_content or "Error code:" in blog_content or len(blog_content) < 500:
              is_valid_blog = False
@@ -116,10 +174,17 @@ async def generate_blog(request: TopicRequest, db: Session = Depends(get_db)):
 
         blog_id = None
         if is_valid_blog:
-            blog = Blog(
-                user_id=user.id, chat_id=chat.id, topic=request.topic, content=blog_content
-            )
-            db.add(blog)
+            # An edit revises the chat's latest blog in place
+            blog = None
+            if route == "edit":
+                blog = db.query(Blog).filter(Blog.chat_id == chat.id).order_by(Blog.id.desc()).first()
+            if blog is not None:
+                blog.content = blog_content
+            else:
+                blog = Blog(
+                    user_id=user.id, chat_id=chat.id, topic=request.topic, content=blog_content
+                )
+                db.add(blog)
             db.flush() # flush to get ID
             blog_id = blog.id
             print(f"Blog saved to DB with ID: {blog.id}")
@@ -133,10 +198,17 @@ async def generate_blog(request: TopicRequest, db: Session = Depends(get_db)):
             image_url=ai_result.get("image_url")
         )
         db.add(assistant_message)
+        if route == "blog":
+            store_turn_cache(chat, request.topic, ai_result)
 
         db.commit()
         if is_valid_blog:
             db.refresh(blog)
+            # Keep the related-blogs index current without waiting for a rebuild
+            background_tasks.add_task(_index_blog, services, blog.id, user.id, blog.topic, blog_content)
+
+        # Fold this turn into the chat summary after the response is sent
+        background_tasks.add_task(refresh_summary, chat.id, ai_agent.summarize_conversation)
         
         return {
             "success": True,
@@ -146,7 +218,10 @@ async def generate_blog(request: TopicRequest, db: Session = Depends(get_db)):
             "assistant_message_id": assistant_message.id,
             "topic": request.topic,
             "content": blog_content,
-            "image_url": ai_result.get("image_url")
+            "image_url": ai_result.get("image_url"),
+            "thumbnail_url": assistant_message.thumbnail_url,
+            "route": ai_result.get("route"),
+            "similar_blog": similar.to_dict() if similar else None,
         }
 
     except Exception as e:
@@ -154,57 +229,182 @@ async def generate_blog(request: TopicRequest, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/health")
+async def health():
+    """
+    Liveness check that never touches the database or the AI services.
+    Reports "degraded" while a dependency's circuit breaker is not closed.
+    """
+    breakers = breaker_states()
+    degraded = any(b["state"] != "closed" for b in breakers.values())
+    return {"status": "degraded" if degraded else "ok", "breakers": breakers}
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """In-process counters and latency summaries"""
+    # Some gauges read the shared store
+    return await asyncio.to_thread(metrics.snapshot)
+
+
+@router.get("/images/{image_id}")
+async def get_image(
+    image_id: str,
+    request: Request,
+    size: str = "full",
+    services: ServiceContainer = Depends(get_services),
+):
+    """Serve the best stored variant of an image for the client's Accept header"""
+    image_service = services.image_service
+    resolved = image_service.resolve_variant(image_id, size, request.headers.get("accept", ""))
+    if not resolved:
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    path, media_type = resolved
+    image_service.record_served(image_id, path)
+    if os.path.basename(path) == f"{image_id}.png":
+        # The original stands in until the variants (built in the background) exist
+        cache_control = "public, max-age=60"
+    else:
+        # Image files are never rewritten once stored
+        cache_control = "public, max-age=31536000, immutable"
+    return FileResponse(path, media_type=media_type, headers={"Vary": "Accept", "Cache-Control": cache_control})
+
+
 @router.get("/chats", response_model=List[ChatResponse])
-async def get_chats(user_id: int = 1, db: Session = Depends(get_db)):
+async def get_chats(request: Request, user_id: int = 1, db: Session = Depends(get_db)):
     """Get all chats for a user"""
     chats = (
-        db.query(Chat)
+        db.query(Chat.id, Chat.title, Chat.created_at, Chat.updated_at)
         .filter(Chat.user_id == user_id)
         .order_by(Chat.updated_at.desc())
         .all()
     )
-    return chats
+    etag = compute_etag(
+        f"chats:{user_id}", ((c.id, c.title, c.updated_at) for c in chats)
+    )
+    return conditional_json(
+        request, etag, lambda: rows_to_dicts(chats, ("id", "title", "created_at"))
+    )
 
 
 @router.get("/chats/{chat_id}/messages", response_model=List[MessageResponse])
-async def get_chat_messages(chat_id: int, db: Session = Depends(get_db)):
+async def get_chat_messages(chat_id: int, request: Request, db: Session = Depends(get_db)):
     """Get all messages for a specific chat"""
-    messages = (
-        db.query(Message)
+    metrics.incr("page_views.chat")
+    # Validate against ids and timestamps first so a 304 never loads the bodies
+    versions = (
+        db.query(Message.id, Message.updated_at)
         .filter(Message.chat_id == chat_id)
         .order_by(Message.created_at)
         .all()
     )
-    return messages
+    etag = compute_etag(f"messages:{chat_id}", versions)
+
+    def build_payload():
+        messages = (
+            db.query(
+                Message.id,
+                Message.role,
+                Message.content.label("content"),
+                Message.body_hash,
+                Message.image_url,
+                Message.created_at,
+            )
+            .filter(Message.chat_id == chat_id)
+            .order_by(Message.created_at)
+            .all()
+        )
+        items = rows_to_dicts(
+            messages,
+            ("id", "role", "content", "body_hash", "image_url", "created_at"),
+            lambda m: {"thumbnail_url": thumbnail_url_for(m.image_url)},
+        )
+        # Archived bodies are fetched in one batch from the body table
+        return hydrate(db, items)
+
+    return conditional_json(request, etag, build_payload)
+
+
+class BulkDeleteRequest(BaseModel):
+    chat_ids: List[int] = Field(min_length=1, max_length=1000)
+    user_id: int = 1
+
+
+def _delete_chats(db: Session, chat_ids: List[int], user_id: Optional[int] = None) -> tuple:
+    """
+    Delete chats with their messages and blogs in one transaction.
+    Returns (deleted chat ids, image urls of the deleted messages).
+    """
+    query = db.query(Chat.id).filter(Chat.id.in_(chat_ids))
+    if user_id is not None:
+        query = query.filter(Chat.user_id == user_id)
+    found = [chat_id for (chat_id,) in query.all()]
+    if not found:
+        return [], []
+
+    image_urls = [
+        url
+        for (url,) in db.query(Message.image_url)
+        .filter(Message.chat_id.in_(found), Message.image_url.isnot(None))
+        .distinct()
+    ]
+
+    if not cascade_deletes_enabled():
+        # Legacy SQLite schema without ON DELETE CASCADE
+        db.query(Blog).filter(Blog.chat_id.in_(found)).delete(synchronize_session=False)
+        db.query(Message).filter(Message.chat_id.in_(found)).delete(synchronize_session=False)
+    db.query(Chat).filter(Chat.id.in_(found)).delete(synchronize_session=False)
+    db.commit()
+    return found, image_urls
 
 
 @router.delete("/chats/{chat_id}")
-async def delete_chat(chat_id: int, db: Session = Depends(get_db)):
+async def delete_chat(
+    chat_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    services: ServiceContainer = Depends(get_services),
+):
     """Delete a chat and all its messages"""
-    chat = db.query(Chat).filter(Chat.id == chat_id).first()
-    if not chat:
+    deleted, image_urls = _delete_chats(db, [chat_id])
+    if not deleted:
         raise HTTPException(status_code=404, detail="Chat not found")
 
-    # Step 1: Delete associated blogs manually to ensure no FK violations
-    db.query(Blog).filter(Blog.chat_id == chat_id).delete()
-    
-    # Step 2: Delete associated messages (cascade might fail if DB state is weird)
-    db.query(Message).filter(Message.chat_id == chat_id).delete()
-
-    # Step 3: Delete the chat
-    db.delete(chat)
-    db.commit()
+    # Image files go once nothing references them any more
+    background_tasks.add_task(services.image_gc.delete_if_unreferenced, image_urls)
     return {"success": True, "message": "Chat deleted successfully"}
 
 
+@router.post("/chats/bulk-delete")
+async def bulk_delete_chats(
+    request: BulkDeleteRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    services: ServiceContainer = Depends(get_services),
+):
+    """Delete many chats of a user in a single transaction"""
+    deleted, image_urls = _delete_chats(db, request.chat_ids, user_id=request.user_id)
+    background_tasks.add_task(services.image_gc.delete_if_unreferenced, image_urls)
+    return {"success": True, "deleted": len(deleted), "chat_ids": deleted}
+
+
 @router.delete("/messages/{message_id}")
-async def delete_message(message_id: int, db: Session = Depends(get_db)):
+async def delete_message(
+    message_id: int,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    services: ServiceContainer = Depends(get_services),
+):
     """Delete a single message"""
     msg = db.query(Message).filter(Message.id == message_id).first()
     if not msg:
         raise HTTPException(status_code=404, detail="Message not found")
+    image_url = msg.image_url
     db.delete(msg)
     db.commit()
+    if image_url:
+        background_tasks.add_task(services.image_gc.delete_if_unreferenced, [image_url])
     return {"success": True}
 
 
@@ -220,22 +420,175 @@ async def edit_message(message_id: int, content: str, db: Session = Depends(get_
 
 
 @router.get("/blogs", response_model=List[BlogResponse])
-async def get_blogs(user_id: int = 1, db: Session = Depends(get_db)):
+async def get_blogs(request: Request, user_id: int = 1, db: Session = Depends(get_db)):
     """Get all blogs for a user, filtering out errors and short content"""
-    all_blogs = (
-        db.query(Blog)
+    versions = (
+        db.query(Blog.id, Blog.timestamp, Blog.updated_at)
         .filter(Blog.user_id == user_id)
         .order_by(Blog.timestamp.desc())
         .all()
     )
-    
-    # Filter out bad blogs in python
-    valid_blogs = []
-    for b in all_blogs:
-        content = b.content
-        # Filter: Must not have errors AND must be at least 500 chars long
-        if "System Error" in content or "Error code:" in content or len(content) < 500:
-            continue
-        valid_blogs.append(b)
-        
-    return valid_blogs
+    etag = compute_etag(f"blogs:{user_id}", versions)
+
+    def build_payload():
+        all_blogs = (
+            db.query(
+                Blog.id,
+                Blog.topic,
+                Blog.content.label("content"),
+                Blog.body_hash,
+                Blog.timestamp,
+            )
+            .filter(Blog.user_id == user_id)
+            .order_by(Blog.timestamp.desc())
+            .all()
+        )
+        all_blogs = hydrate(
+            db, rows_to_dicts(all_blogs, ("id", "topic", "content", "body_hash", "timestamp"))
+        )
+
+        # Filter out bad blogs in python
+        valid_blogs = []
+        for b in all_blogs:
+            content = b["content"]
+            # Filter: Must not have errors AND must be at least 500 chars long
+            if "System Error" in content or "Error code:" in content or len(content) < 500:
+                continue
+            valid_blogs.append(b)
+
+        return valid_blogs
+
+    return conditional_json(request, etag, build_payload)
+
+
+async def _find_near_duplicate(services: ServiceContainer, topic: str, user_id: int):
+    try:
+        index = await asyncio.to_thread(lambda: services.similarity_index)
+        return await asyncio.to_thread(index.find_near_duplicate, topic, user_id)
+    except Exception as e:
+        print(f"Near-duplicate check failed: {e}")
+        return None
+
+
+def _index_blog(services: ServiceContainer, blog_id: int, user_id: int, topic: str, content: str):
+    try:
+        services.similarity_index.add(blog_id, user_id, topic, content)
+    except (OSError, ValueError) as e:
+        # The blog is saved either way; a rebuild picks it up
+        metrics.incr("similarity_index.index_errors")
+        print(f"Similarity index update failed for blog {blog_id}: {e!r}")
+
+
+@router.get("/blogs/{blog_id}/related")
+async def get_related_blogs(
+    blog_id: int,
+    k: int = Query(5, ge=1, le=50),
+    db: Session = Depends(get_db),
+    services: ServiceContainer = Depends(get_services),
+):
+    """The user's blogs most similar to this one (cosine over hashed n-gram vectors)"""
+    blog = (
+        db.query(Blog.id, Blog.user_id, Blog.topic, Blog.content.label("content"), Blog.body_hash)
+        .filter(Blog.id == blog_id)
+        .first()
+    )
+    if not blog:
+        raise HTTPException(status_code=404, detail="Blog not found")
+    blog = hydrate(db, [blog._asdict()])[0]
+
+    index = await asyncio.to_thread(lambda: services.similarity_index)
+    # Ask for a few extra in case some were deleted since the last rebuild
+    matches = await asyncio.to_thread(
+        index.related, blog_id, k + 5, blog["user_id"], (blog["topic"], blog["content"] or "")
+    )
+    rows = (
+        db.query(Blog.id, Blog.topic, Blog.timestamp)
+        .filter(Blog.id.in_([m.blog_id for m in matches]))
+        .all()
+    ) if matches else []
+    found = {row.id: row for row in rows}
+    related = [
+        {"id": m.blog_id, "topic": found[m.blog_id].topic, "timestamp": found[m.blog_id].timestamp, "score": m.score}
+        for m in matches if m.blog_id in found
+    ][:k]
+    return json_response({"blog_id": blog_id, "related": related})
+
+
+@router.get("/search")
+async def search(
+    q: str,
+    user_id: int = 1,
+    kind: Literal["all", "blog", "message"] = "all",
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+):
+    """Ranked full-text search over a user's blogs and chat messages"""
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query must not be empty")
+    if (page - 1) * page_size > search_index.MAX_SEARCH_OFFSET:
+        raise HTTPException(status_code=400, detail="Page is too deep, refine the query instead")
+    result = await asyncio.to_thread(
+        search_index.search, db, q, user_id, kind=kind, limit=page_size, offset=(page - 1) * page_size
+    )
+    return json_response({"query": q, "page": page, "page_size": page_size, **result})
+
+
+@router.post("/admin/archive")
+async def archive_content(older_than_days: int = Query(content_archive.ARCHIVE_AFTER_DAYS, ge=0)):
+    """Run the cold-storage archive job now and report the storage saved"""
+    stats = await asyncio.to_thread(content_archive.archive_old_content, older_than_days)
+    return stats.to_dict()
+
+
+@router.post("/admin/image-gc")
+async def collect_images(services: ServiceContainer = Depends(get_services)):
+    """Run a full orphaned-image reconciliation pass now"""
+    stats = await asyncio.to_thread(services.image_gc.collect)
+    return stats.to_dict()
+
+
+@router.post("/admin/similarity-rebuild")
+async def rebuild_similarity_index(services: ServiceContainer = Depends(get_services)):
+    """Rebuild the related-blogs index from the database now"""
+    index = await asyncio.to_thread(lambda: services.similarity_index)
+    return await asyncio.to_thread(index.rebuild)
+
+
+@router.post("/admin/prefetch")
+async def run_prefetch(services: ServiceContainer = Depends(get_services)):
+    """Run a prefetch pass over the trending topics now, even if the host isn't idle"""
+    prefetcher = await asyncio.to_thread(lambda: services.prefetcher)
+    return await prefetcher.run_once(force=True)
+
+
+@router.get("/admin/prefetch")
+async def get_prefetch_stats(services: ServiceContainer = Depends(get_services)):
+    """Prefetched searches and drafts and how many of them were used"""
+    return await asyncio.to_thread(prefetch_stats, services.shared_store)
+
+
+@router.get("/export")
+async def export_blogs(
+    user_id: int = 1,
+    format: Literal["ndjson", "zip"] = "ndjson",
+    after_id: int = Query(0, ge=0),
+    services: ServiceContainer = Depends(get_services),
+):
+    """
+    Stream every blog of a user. Pass the last id received as after_id to
+    resume an interrupted export.
+    """
+    # The generators open their own session: the request-scoped one is closed
+    # before a streaming body is sent
+    if format == "zip":
+        return StreamingResponse(
+            export_service.export_zip(user_id, services.image_service.output_dir, after_id),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="blogs-user{user_id}.zip"'},
+        )
+    return StreamingResponse(
+        export_service.export_ndjson(user_id, after_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="blogs-user{user_id}.ndjson"'},
+    )
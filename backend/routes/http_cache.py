@@ -0,0 +1,85 @@
+"""
+HTTP caching helpers for the JSON API
+Strong ETags computed from row ids and update timestamps, conditional GET
+handling and orjson-backed responses for large lists.
+"""
+import hashlib
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import orjson
+from fastapi import Request, Response
+
+# Encoding suffixes appended by the compression middleware
+_ENCODING_SUFFIXES = ("-br", "-gzip")
+
+
+def compute_etag(namespace: str, rows: Iterable[tuple]) -> str:
+    """
+    Strong ETag over (id, updated_at, ...) tuples.
+    Only cheap columns should be passed in, never the bodies themselves.
+    """
+    digest = hashlib.blake2b(namespace.encode(), digest_size=16)
+    count = 0
+    for row in rows:
+        digest.update(b"|".join(str(value).encode() for value in row))
+        digest.update(b"\n")
+        count += 1
+    return f'"{digest.hexdigest()}-{count}"'
+
+
+def _normalize(tag: str) -> str:
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    if tag.endswith('"'):
+        for suffix in _ENCODING_SUFFIXES:
+            if tag[:-1].endswith(suffix):
+                return tag[: -len(suffix) - 1] + '"'
+    return tag
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """True when the client's If-None-Match already covers this ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(_normalize(tag) == etag for tag in header.split(","))
+
+
+def json_response(payload: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """orjson-serialized JSON response (numpy scalars and non-str keys allowed)"""
+    body = orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def conditional_json(
+    request: Request,
+    etag: str,
+    build_payload: Callable[[], Any],
+    max_age: int = 0,
+) -> Response:
+    """
+    Answer 304 when the ETag matches, otherwise build and serialize the
+    payload with orjson. Clients revalidate on every navigation (no-cache).
+    """
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={max_age}, must-revalidate" if max_age else "no-cache",
+    }
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return json_response(build_payload(), headers=headers)
+
+
+def rows_to_dicts(rows: Iterable[Any], fields: Iterable[str], extra: Optional[Callable[[Any], dict]] = None):
+    """Turn column-tuple query rows into plain dicts for orjson"""
+    fields = list(fields)
+    result = []
+    for row in rows:
+        item = {name: getattr(row, name) for name in fields}
+        if extra is not None:
+            item.update(extra(row))
+        result.append(item)
+    return result
@@ -0,0 +1,308 @@
+"""
+Cached static file serving for the frontend
+Files are read once and kept in memory (LRU, bounded by STATIC_CACHE_MAX_BYTES)
+together with their compressed forms: a precompressed `.br`/`.gz` sibling is
+used when it exists and is at least as new as the file, otherwise
+compressible files are compressed once when they are loaded. Every response
+carries a strong ETag and Last-Modified, so revalidations are answered with
+304 from memory, and single byte ranges are served from the cached bytes.
+
+Cache lifetimes:
+    hashed assets and images   public, max-age=1 year, immutable
+    HTML                       no-cache (always revalidated)
+    anything else              public, max-age=STATIC_MAX_AGE_SECONDS
+
+Cached files are re-checked against the disk at most every
+STATIC_RECHECK_SECONDS, so edits still show up without a restart.
+"""
+import asyncio
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from email.utils import formatdate
+from functools import lru_cache
+from typing import Dict, Optional
+
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+from starlette.types import Receive, Scope, Send
+
+from backend.middleware.compression import COMPRESSIBLE_TYPES
+from backend.routes.http_cache import is_not_modified
+from backend.services.metrics import metrics
+
+try:
+    import brotli
+except ImportError:  # .br siblings are still served; nothing is brotli-compressed on load
+    brotli = None
+
+STATIC_CACHE_MAX_BYTES = int(os.getenv("STATIC_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Bigger files are streamed from disk instead of cached
+STATIC_CACHE_MAX_FILE_BYTES = int(os.getenv("STATIC_CACHE_MAX_FILE_BYTES", str(2 * 1024 * 1024)))
+STATIC_RECHECK_SECONDS = float(os.getenv("STATIC_RECHECK_SECONDS", "2"))
+STATIC_MAX_AGE_SECONDS = int(os.getenv("STATIC_MAX_AGE_SECONDS", "3600"))
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MIN_COMPRESS_BYTES = 1024
+
+# app.3f9a1c2e.js, style-8d7e6f5a4b.css, image_<uuid hex>.png
+HASHED_NAME_RE = re.compile(r"[._-][0-9a-fA-F]{8,}\.[A-Za-z0-9]+$")
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+# Preference order when the client accepts several encodings
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+@dataclass
+class _CachedFile:
+    path: str
+    media_type: str
+    mtime: float
+    size: int
+    etag: str
+    last_modified: str
+    cache_control: str
+    bodies: Dict[str, bytes] = field(default_factory=dict)
+    checked_at: float = 0.0
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(body) for body in self.bodies.values())
+
+
+def cache_control_for(path: str, media_type: str) -> str:
+    if HASHED_NAME_RE.search(os.path.basename(path)) or media_type.startswith("image/"):
+        return IMMUTABLE_CACHE_CONTROL
+    if media_type == "text/html":
+        return "no-cache"
+    return f"public, max-age={STATIC_MAX_AGE_SECONDS}"
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _load(path: str, stat: os.stat_result) -> _CachedFile:
+    """Blocking: read the file and find or build its compressed forms"""
+    data = _read(path)
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    bodies = {"identity": data}
+    for encoding, suffix in ENCODINGS:
+        try:
+            sibling = os.stat(path + suffix)
+        except FileNotFoundError:
+            continue
+        if sibling.st_mtime >= stat.st_mtime:
+            bodies[encoding] = _read(path + suffix)
+            metrics.incr("static.precompressed_loaded")
+
+    if len(data) >= MIN_COMPRESS_BYTES and media_type.startswith(COMPRESSIBLE_TYPES):
+        if "gzip" not in bodies:
+            bodies["gzip"] = gzip.compress(data, compresslevel=9, mtime=0)
+        if "br" not in bodies and brotli is not None:
+            bodies["br"] = brotli.compress(data, quality=11)
+    # Only keep encodings that actually save bytes
+    bodies = {k: v for k, v in bodies.items() if k == "identity" or len(v) < len(data)}
+
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    return _CachedFile(
+        path=path,
+        media_type=f"{media_type}; charset=utf-8" if media_type.startswith("text/") else media_type,
+        mtime=stat.st_mtime,
+        size=stat.st_size,
+        etag=f'"{digest}"',
+        last_modified=formatdate(stat.st_mtime, usegmt=True),
+        cache_control=cache_control_for(path, media_type),
+        bodies=bodies,
+        checked_at=time.monotonic(),
+    )
+
+
+class StaticFileCache:
+    """In-memory, precompressed view of one directory"""
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = STATIC_CACHE_MAX_BYTES,
+        max_file_bytes: int = STATIC_CACHE_MAX_FILE_BYTES,
+        recheck_seconds: float = STATIC_RECHECK_SECONDS,
+    ):
+        self.directory = os.path.realpath(directory)
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.recheck_seconds = recheck_seconds
+        self._files: "OrderedDict[str, _CachedFile]" = OrderedDict()
+        self._bytes = 0
+        self._loading: Dict[str, asyncio.Future] = {}
+        # realpath costs a few syscalls; request paths repeat
+        self.resolve = lru_cache(maxsize=4096)(self._resolve)
+
+    def _resolve(self, relative_path: str) -> Optional[str]:
+        """Absolute path inside the directory, or None for traversal attempts"""
+        path = os.path.realpath(os.path.join(self.directory, relative_path.lstrip("/")))
+        if path != self.directory and not path.startswith(self.directory + os.sep):
+            return None
+        return path
+
+    async def get(self, path: str) -> Optional[_CachedFile]:
+        entry = self._files.get(path)
+        now = time.monotonic()
+        if entry is not None:
+            if now - entry.checked_at < self.recheck_seconds:
+                self._files.move_to_end(path)
+                metrics.incr("static.cache_hits")
+                return entry
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                self._evict(path)
+                return None
+            if (stat.st_mtime, stat.st_size) == (entry.mtime, entry.size):
+                entry.checked_at = now
+                self._files.move_to_end(path)
+                metrics.incr("static.cache_hits")
+                return entry
+            self._evict(path)
+
+        # Concurrent misses for the same file share one load
+        loading = self._loading.get(path)
+        if loading is None:
+            loading = asyncio.ensure_future(asyncio.to_thread(self._load_uncached, path))
+            self._loading[path] = loading
+            loading.add_done_callback(lambda _: self._loading.pop(path, None))
+        entry = await asyncio.shield(loading)
+        if entry is not None and path not in self._files and entry.size <= self.max_file_bytes:
+            self._store(path, entry)
+        return entry
+
+    def _load_uncached(self, path: str) -> Optional[_CachedFile]:
+        try:
+            stat = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        if not os.path.isfile(path):
+            return None
+        metrics.incr("static.cache_misses")
+        if stat.st_size > self.max_file_bytes:
+            media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            return _CachedFile(
+                path=path,
+                media_type=media_type,
+                mtime=stat.st_mtime,
+                size=stat.st_size,
+                etag=f'"{int(stat.st_mtime * 1000):x}-{stat.st_size:x}"',
+                last_modified=formatdate(stat.st_mtime, usegmt=True),
+                cache_control=cache_control_for(path, media_type),
+            )
+        return _load(path, stat)
+
+    def _store(self, path: str, entry: _CachedFile):
+        self._files[path] = entry
+        self._bytes += entry.nbytes
+        while self._bytes > self.max_bytes and len(self._files) > 1:
+            oldest = next(iter(self._files))
+            self._evict(oldest)
+
+    def _evict(self, path: str):
+        entry = self._files.pop(path, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+
+    async def response(self, request: Request, relative_path: str) -> Response:
+        path = self.resolve(relative_path)
+        entry = await self.get(path) if path else None
+        if entry is None:
+            return Response("Not Found", status_code=404, media_type="text/plain")
+
+        headers = {
+            "ETag": entry.etag,
+            "Last-Modified": entry.last_modified,
+            "Cache-Control": entry.cache_control,
+            "Accept-Ranges": "bytes",
+        }
+        if len(entry.bodies) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if is_not_modified(request, entry.etag):
+            metrics.incr("static.not_modified")
+            return Response(status_code=304, headers=headers)
+
+        if not entry.bodies:
+            # Too big to cache: streamed from disk (Starlette handles Range here)
+            return FileResponse(entry.path, media_type=entry.media_type, headers=headers)
+
+        range_header = request.headers.get("range")
+        if range_header and self._if_range_matches(request, entry):
+            return self._range_response(entry, range_header, headers)
+
+        encoding = self._choose_encoding(request.headers.get("accept-encoding", ""), entry)
+        body = entry.bodies[encoding]
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+            # Same suffix scheme as the compression middleware, so If-None-Match still matches
+            headers["ETag"] = f'{entry.etag[:-1]}-{encoding}"'
+        if request.method == "HEAD":
+            headers["Content-Length"] = str(len(body))
+            return Response(status_code=200, headers=headers, media_type=entry.media_type)
+        return Response(body, headers=headers, media_type=entry.media_type)
+
+    @staticmethod
+    def _choose_encoding(accept_encoding: str, entry: _CachedFile) -> str:
+        accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+        for encoding, _ in ENCODINGS:
+            if encoding in accepted and encoding in entry.bodies:
+                return encoding
+        return "identity"
+
+    @staticmethod
+    def _if_range_matches(request: Request, entry: _CachedFile) -> bool:
+        if_range = request.headers.get("if-range")
+        return if_range is None or if_range.strip() in (entry.etag, entry.last_modified)
+
+    @staticmethod
+    def _range_response(entry: _CachedFile, range_header: str, headers: Dict[str, str]) -> Response:
+        """Single byte ranges only; anything else gets the full identity body"""
+        data = entry.bodies["identity"]
+        match = RANGE_RE.match(range_header.strip())
+        if not match or match.groups() == ("", ""):
+            return Response(data, headers=headers, media_type=entry.media_type)
+        start, end = match.groups()
+        size = len(data)
+        if start == "":
+            start, end = max(0, size - int(end)), size - 1
+        else:
+            start, end = int(start), min(int(end), size - 1) if end else size - 1
+        if start >= size or start > end:
+            return Response(
+                status_code=416,
+                headers={**headers, "Content-Range": f"bytes */{size}"},
+            )
+        metrics.incr("static.range_requests")
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return Response(data[start:end + 1], status_code=206, headers=headers, media_type=entry.media_type)
+
+
+def _route_path(scope: Scope) -> str:
+    """Path below the mount point"""
+    root_path = scope.get("root_path", "")
+    path = scope["path"]
+    return path[len(root_path):] if root_path and path.startswith(root_path) else path
+
+
+class CachedStaticFiles:
+    """Drop-in for StaticFiles mounts, backed by a StaticFileCache"""
+
+    def __init__(self, directory: str, **cache_options):
+        self.cache = StaticFileCache(directory, **cache_options)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        request = Request(scope, receive)
+        if request.method not in ("GET", "HEAD"):
+            response = Response("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})
+        else:
+            response = await self.cache.response(request, _route_path(scope))
+        await response(scope, receive, send)
@@ -0,0 +1,59 @@
+"""
+Production launcher
+Runs the app in N uvicorn worker processes (default: one per core) without
+the reloader. Every worker goes through the normal lifespan. What has to
+agree across workers lives in the shared store (backend/services/shared_store.py):
+in-flight generation locks, the search cache, per-key rate-limit buckets,
+and the lease that lets one worker run the host-wide periodic jobs.
+
+The SQLite fallback works with several workers, but their writes queue
+behind each other; point DATABASE_URL at Postgres for real deployments.
+
+Usage: python -m backend.serve [--workers N] [--host HOST] [--port PORT]
+"""
+import argparse
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+import uvicorn
+
+from backend.services.shared_store import SHARED_STORE_PATH, SharedStore
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the backend with several worker processes")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--app", default="backend.main:app", help="ASGI app import string")
+    args = parser.parse_args()
+
+    # Every worker must open the same store, whatever its working directory
+    os.environ["SHARED_STORE_PATH"] = os.path.abspath(SHARED_STORE_PATH)
+    stale = SharedStore().reset_locks()
+    if stale:
+        print(f"Cleared {stale} lock(s) left by a previous run")
+
+    database_url = os.getenv("DATABASE_URL", "")
+    if args.workers > 1 and database_url.startswith("sqlite"):
+        print("Warning: SQLite with several workers serializes every write; use Postgres in production")
+
+    print(f"Starting {args.workers} worker(s) on {args.host}:{args.port}")
+    uvicorn.run(
+        args.app,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        timeout_keep_alive=int(os.getenv("KEEP_ALIVE_SECONDS", "5")),
+        log_level=os.getenv("LOG_LEVEL", "info"),
+    )
+
+
+if __name__ == "__main__":
+    main()
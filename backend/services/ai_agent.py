@@ -1,19 +1,33 @@
 import os
+from contextvars import ContextVar
+from functools import cached_property
 from dotenv import load_dotenv
 from datetime import datetime
 from agents import Agent, Runner, function_tool, OpenAIChatCompletionsModel, set_tracing_disabled
 from openai import AsyncOpenAI
 from openai.resources.chat import AsyncChat, AsyncCompletions
-from typing import Any, Mapping, List, Dict
+from typing import Any, Mapping, List, Dict, Optional
 from backend.services.search_service import WebSearchService
 from backend.services.image_service import ImageService
+from backend.services.singleflight import SharedFlight, SingleFlight, normalize_topic
+from backend.services.longform import LongFormWriter
+from backend.services.intent_router import Intent, IntentRouter, image_prompt_from
+from backend.services.metrics import metrics
+from backend.services.model_pool import ModelPool
+from backend.services.conversation import ChatContext
+from backend.services.page_fetcher import DEEP_RESEARCH_PAGES, PageFetcher, format_research
+from backend.services.shared_store import SharedStore
+from backend.services.prefetch_state import claim_draft
 import asyncio
+import time
 
 load_dotenv(override=True)
 
 # Configure environment for Gemini's OpenAI Compatibility
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai/"
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/openai/")
+# Fast, cheap model for inputs the intent router classifies as small talk
+SMALL_TALK_MODEL = os.getenv("SMALL_TALK_MODEL", "gemini-2.5-flash-lite")
 
 os.environ["OPENAI_API_KEY"] = GEMINI_API_KEY or ""
 os.environ["OPENAI_BASE_URL"] = GEMINI_BASE_URL
@@ -21,16 +35,21 @@ os.environ["OPENAI_BASE_URL"] = GEMINI_BASE_URL
 # Disable tracing as it requires a real OpenAI key
 set_tracing_disabled(True)
 
-# Global variables for the current request
-current_image_url = None
+# Per-generation state shared with the tools: research gathered and the image
+# drawn this turn, and whatever the chat already cached for the same topic.
+# A context variable rather than a global, so concurrent generations in one
+# worker never see each other's image.
+_turn_state: ContextVar[Optional[Dict[str, Any]]] = ContextVar("turn_state", default=None)
 
 class GeminiSanitizedCompletions(AsyncCompletions):
     """
     Wrapper for chat.completions to filter out params Gemini doesn't support yet.
+    With a model pool, calls are routed to the fastest healthy key/model pair.
     """
-    def __init__(self, client: AsyncOpenAI):
+    def __init__(self, client: AsyncOpenAI, pool: Optional[ModelPool] = None):
         super().__init__(client)
         self._raw_create = super().create
+        self._pool = pool
 
     async def create(self, *args, **kwargs) -> Any:
         # Remove unsupported parameters that cause 404/400 errors in Gemini
@@ -38,18 +57,23 @@ class GeminiSanitizedCompletions(AsyncCompletions):
         kwargs.pop("stream_options", None) 
         kwargs.pop("parallel_tool_calls", None) # Gemini handles tools, but sometimes strict parallel mode fails
         
-        # Ensure model mapping is correct if needed, but SDK usually handles it
+        if self._pool is not None and not args:
+            return await self._pool.create(**kwargs)
         return await self._raw_create(*args, **kwargs)
 
 class GeminiSanitizedClient(AsyncOpenAI):
     """
     Custom OpenAI Client that injects the sanitizer.
     """
-    @property
+    def __init__(self, *args, pool: Optional[ModelPool] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool = pool
+
+    @cached_property
     def chat(self) -> AsyncChat:
-        chat_resource = super().chat
-        # Monkey-patch the completions resource instance
-        chat_resource.completions = GeminiSanitizedCompletions(self)
+        # Built once; the wrapper is reused by every call through this client
+        chat_resource = AsyncChat(self)
+        chat_resource.completions = GeminiSanitizedCompletions(self, pool=self._pool)
         return chat_resource
 
 class GeminiAgent:
@@ -57,49 +81,69 @@ class GeminiAgent:
     Refactored Agent using REAL OpenAI Agents SDK with Gemini Compatibility.
     Now supports both Blog Generation and Image Generation.
     """
-    def __init__(self):
+    def __init__(
+        self,
+        search_service: Optional[WebSearchService] = None,
+        image_service: Optional[ImageService] = None,
+        model_pool: Optional[ModelPool] = None,
+        page_fetcher: Optional[PageFetcher] = None,
+        shared_store: Optional[SharedStore] = None,
+    ):
         current_time = datetime.now().strftime("%A, %B %d, %Y")
         
         # Ensure fresh API Key from environment
         load_dotenv(override=True)
         api_key = os.getenv("GEMINI_API_KEY")
         
+        self.search_service = search_service or WebSearchService()
+        self.image_service = image_service or ImageService()
+        # Set when deep research is on: the top result pages are read, not just their snippets
+        self.page_fetcher = page_fetcher
+        # Keys and models from GEMINI_API_KEYS / GEMINI_MODELS, with failover
+        self.model_pool = model_pool or ModelPool.from_env()
+        self.model_name = self.model_pool.primary_model
+        # Identical topics requested at the same time share one pipeline run,
+        # across worker processes when there is a shared store
+        self._generations = SharedFlight("generation", shared_store) if shared_store else SingleFlight("generation")
+        self.shared_store = shared_store
+        # Decides small talk / image / blog locally, before any model call
+        self.intent_router = IntentRouter()
+
         # 1. Initialize Custom Client
         self.client = GeminiSanitizedClient(
-            api_key=api_key,
-            base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
+            api_key=api_key or "unused",
+            base_url=self.model_pool.base_url,
+            pool=self.model_pool,
+            http_client=self.model_pool.http_client,
         )
 
         # 2. Define the Model using SDK's Class but with our Client
-        print(f"Initializing GeminiAgent with model: gemini-2.5-flash")
+        print(f"Initializing GeminiAgent with model: {self.model_name}")
         self.model = OpenAIChatCompletionsModel(
-            model="gemini-2.5-flash",
+            model=self.model_name,
             openai_client=self.client
         )
         
+        # Outline-then-parallel-sections writer for long posts
+        self.long_form_writer = LongFormWriter(self.client, self.model_name)
+
         # 3. Define the Agent (Real SDK Class)
         self.blog_agent = Agent(
             name="AI-Agent",
-            instructions=f"""You are a professional AI Assistant specializing in Blogs and Image Generation.
+            instructions=f"""You are a professional AI Assistant specializing in Blogs.
 Today's Date: {current_time}.
 
 Workflow:
-1. Determine if the user wants an image or a blog post.
-2. If requesting an IMAGE:
-   - Use 'image_tool' with a detailed prompt.
-   - Reply with a brief confirmation (e.g., "Generated your image of [description]").
-3. If requesting a BLOG:
-   - ALWAYS try to use 'search_tool' for research first.
+1. ALWAYS try to use 'search_tool' for research first.
    - IMPORTANT: If search returns "No search results found", DO NOT apologize or ask for clarification.
    - Instead, use your own extensive knowledge to write a comprehensive, detailed blog post on the topic.
-   - Write a high-quality, in-depth blog post (minimum 800 words) with proper structure:
-     * Engaging introduction
-     * Multiple detailed sections with subheadings
-     * Real-world examples and insights
-     * Thoughtful conclusion
-   - ALWAYS call 'image_tool' at the end to generate one featured image.
-   - Return ONLY the blog content in markdown format.
-4. For general talk, be polite and helpful in the user's language.
+2. Write a high-quality, in-depth blog post (minimum 800 words) with proper structure:
+   * Engaging introduction
+   * Multiple detailed sections with subheadings
+   * Real-world examples and insights
+   * Thoughtful conclusion
+3. ALWAYS call 'image_tool' at the end to generate one featured image.
+4. Return ONLY the blog content in markdown format.
 
 CRITICAL: Never refuse to write a blog due to lack of search results. Use your knowledge base.
 """,
@@ -111,35 +155,191 @@ CRITICAL: Never refuse to write a blog due to lack of search results. Use your k
         """
         Perform deep web research on a blog topic. 
         """
-        search_service = WebSearchService()
-        results = await search_service.multi_search(topic)
-        if not results:
+        state = _turn_state.get()
+        if state and state.get("cached_research"):
+            metrics.incr("chat_context.research_reused")
+            return state["cached_research"]
+        research = await self._research(topic)
+        if not research:
             return "No search results found."
-        return "\n\n".join([f"Source: {r['title']}\n{r['snippet']}" for r in results])
+        if state is not None:
+            state["research"].append(research)
+        return research
+
+    async def _research(self, topic: str) -> str:
+        """Search results as research notes, with page extracts for the top results under deep research"""
+        results = await self.search_service.multi_search(topic)
+        if not results:
+            return ""
+        extracts = {}
+        if self.page_fetcher is not None:
+            extracts = await self.page_fetcher.fetch_many([r["link"] for r in results[:DEEP_RESEARCH_PAGES]])
+            metrics.incr("deep_research.pages_used", len(extracts))
+        return format_research(results, extracts)
 
     async def image_tool(self, prompt: str) -> str:
         """
         Generate a high-quality AI image.
         """
-        global current_image_url
-        img_service = ImageService()
-        url = await img_service.generate_image(prompt)
-        current_image_url = url
+        state = _turn_state.get() or {}
+        if state.get("cached_image"):
+            metrics.incr("chat_context.image_reused")
+            state["image_url"] = state["cached_image"]
+            return f"[Image Generated: {prompt}]"
+        state["image_url"] = await self.image_service.generate_image(prompt)
         return f"[Image Generated: {prompt}]"
 
-    async def process_topic(self, topic: str) -> Dict[str, Any]:
-        global current_image_url
-        current_image_url = None # Clear for new request
+    async def process_topic(
+        self,
+        topic: str,
+        mode: str = "standard",
+        target_words: Optional[int] = None,
+        context: Optional[ChatContext] = None,
+    ) -> Dict[str, Any]:
+        """
+        Generate content for a topic. Standard-mode inputs are routed locally
+        first: small talk and image-only requests skip the tool-calling agent,
+        and in a chat with a draft, edit requests take one revision turn.
+        Concurrent requests for the same normalized topic, options and chat
+        state are coalesced into a single run; every caller gets its own copy
+        of the result.
+        """
+        start = time.perf_counter()
+        if mode == "long_form":
+            intent = Intent.BLOG
+        else:
+            intent = self.intent_router.classify(topic, has_draft=bool(context and context.last_draft)).intent
+        try:
+            if intent == Intent.SMALL_TALK:
+                result = await self._small_talk(topic, context)
+            elif intent == Intent.IMAGE:
+                result = await self._image_only(topic)
+            else:
+                key = (intent.value, normalize_topic(topic), mode, target_words, context.fingerprint if context else None)
+                if intent == Intent.EDIT:
+                    run = lambda: self._edit(topic, context)
+                else:
+                    run = lambda: self._run_pipeline(topic, mode=mode, target_words=target_words, context=context)
+                result = None
+                if intent == Intent.BLOG and mode == "standard" and context is None and self.shared_store is not None:
+                    # A new chat on a trending topic may find a draft generated off-peak
+                    result = await asyncio.to_thread(claim_draft, self.shared_store, topic)
+                if result is None:
+                    result = await self._generations.do(key, run)
+        finally:
+            metrics.incr(f"route.{intent.value}.requests")
+            metrics.observe(f"route.{intent.value}.latency_ms", (time.perf_counter() - start) * 1000)
+        return {**result, "route": intent.value}
+
+    async def pregenerate(self, topic: str) -> Dict[str, Any]:
+        """
+        Standard pipeline run for a topic outside any request, used by the
+        idle-time prefetcher to prepare drafts of trending topics.
+        """
+        return await self._run_pipeline(topic)
+
+    async def _small_talk(self, message: str, context: Optional[ChatContext] = None) -> Dict[str, Any]:
+        """One short turn on the cheap model, no tools"""
+        system = (
+            "You are a friendly assistant for a blog and image generator. "
+            "Reply briefly and politely in the user's language. If it fits, mention "
+            "that you can write blog posts or generate images on any topic."
+        )
+        if context and (context.summary or context.recent):
+            system += f"\n\nConversation so far:\n{context.transcript(300)}"
+        try:
+            response = await self.client.chat.completions.create(
+                model=SMALL_TALK_MODEL,
+                messages=[
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": message},
+                ],
+                max_tokens=300,
+            )
+            return {"blog_content": response.choices[0].message.content.strip(), "image_url": None}
+        except Exception as e:
+            print(f"Small talk error: {e}")
+            return {"blog_content": "Hello! Give me a topic and I'll write a blog post or generate an image for you.", "image_url": None}
+
+    async def _image_only(self, request: str) -> Dict[str, Any]:
+        """Straight to the image service, no model turn"""
+        prompt = image_prompt_from(request)
+        url = await self.image_service.generate_image(prompt)
+        if not url:
+            return {"blog_content": f"Sorry, I couldn't generate an image of {prompt} right now. Please try again.", "image_url": None}
+        return {"blog_content": f"Generated your image of {prompt}", "image_url": url}
+
+    async def _edit(self, instruction: str, context: ChatContext) -> Dict[str, Any]:
+        """Revise the chat's latest draft in one model turn, reusing its research and image"""
+        prompt = (
+            "You are a professional blog editor. Apply the requested change to the current draft. "
+            "Keep everything the request doesn't ask to change. "
+            "Return ONLY the full revised post in markdown, without any meta-talk.\n\n"
+            f"Conversation so far:\n{context.transcript(300)}\n\n"
+        )
+        if context.research:
+            prompt += f"Research notes from the original draft:\n{context.research[:3000]}\n\n"
+        prompt += f"Current draft:\n{context.last_draft}\n\nRequested change: {instruction}"
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model_name,
+                messages=[{"role": "user", "content": prompt}],
+            )
+            return {"blog_content": response.choices[0].message.content.strip(), "image_url": context.image_url}
+        except Exception as e:
+            print(f"Edit Execution Error: {e}")
+            return {"blog_content": f"System Error: {e}", "image_url": None}
+
+    async def summarize_conversation(self, previous: str, messages: List[Dict[str, str]]) -> str:
+        """Fold new messages into a running chat summary with the cheap model"""
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        response = await self.client.chat.completions.create(
+            model=SMALL_TALK_MODEL,
+            messages=[{
+                "role": "user",
+                "content": "Update the running summary of this conversation with the new messages. "
+                "Keep topics, decisions and the user's preferences; at most 120 words. "
+                "Return only the summary.\n\n"
+                f"Current summary: {previous or '(none)'}\n\nNew messages:\n{transcript}",
+            }],
+            max_tokens=250,
+        )
+        return response.choices[0].message.content.strip()
+
+    async def _run_pipeline(
+        self,
+        topic: str,
+        mode: str = "standard",
+        target_words: Optional[int] = None,
+        context: Optional[ChatContext] = None,
+    ) -> Dict[str, Any]:
+        # Regenerating the topic this chat already researched reuses that
+        # research and image instead of searching and drawing again
+        same_topic = bool(context) and normalize_topic(context.cache.get("topic") or "") == normalize_topic(topic)
+        state = {
+            "research": [],
+            "cached_research": context.research if same_topic else None,
+            "cached_image": context.image_url if same_topic else None,
+            "image_url": None,
+        }
+        _turn_state.set(state)
+
+        if mode == "long_form":
+            return await self._run_long_form(topic, target_words or 3000)
+
+        agent_input = topic
+        if context and (context.summary or context.recent):
+            agent_input = f"Conversation so far:\n{context.transcript(300)}\n\nNew request: {topic}"
         
-        # Simple backoff retry loop for the main agent run
+        # Rate limits and server errors are handled by the model pool's
+        # failover; this loop only retries empty answers
         max_retries = 3
-        retry_delays = [5, 10, 20] # Aggressive backoff
-        
+
         for attempt in range(max_retries):
             try:
                 # 4. Use the REAL Runner (Guaranteed SDK usage)
                 print(f"Running agent for topic: {topic}")
-                result = await Runner.run(self.blog_agent, topic)
+                result = await Runner.run(self.blog_agent, agent_input)
                 
                 raw_content = result.final_output
                 print(f"Agent returned content length: {len(raw_content) if raw_content else 0}")
@@ -164,25 +364,44 @@ CRITICAL: Never refuse to write a blog due to lack of search results. Use your k
 
                 return {
                     "blog_content": polished_content,
-                    "image_url": current_image_url
+                    "image_url": state["image_url"],
+                    "research": "\n\n".join(state["research"]) or state["cached_research"],
                 }
             except Exception as e:
                 error_str = str(e)
                 import traceback
                 traceback.print_exc() # detailed logging
-                
-                if "429" in error_str and attempt < max_retries - 1:
-                    delay = retry_delays[attempt]
-                    print(f"Rate limit hit (429). Retrying in {delay} seconds...")
-                    await asyncio.sleep(delay)
-                    continue
-                
+
                 print(f"Agent Execution Error: {error_str}")
                 return {
                     "blog_content": f"System Error: {error_str}", 
                     "image_url": None
                 }
 
+    async def _run_long_form(self, topic: str, target_words: int) -> Dict[str, Any]:
+        """
+        Long-form mode: research and the featured image run alongside each
+        other, then the writer drafts the sections in parallel.
+        """
+        state = _turn_state.get() or {}
+
+        async def gather_research() -> str:
+            if state.get("cached_research"):
+                return state["cached_research"]
+            return await self._research(topic)
+
+        async def featured_image() -> str:
+            return state.get("cached_image") or await self.image_service.generate_image(topic)
+
+        try:
+            print(f"Running long-form generation for topic: {topic} (~{target_words} words)")
+            research, image_url = await asyncio.gather(gather_research(), featured_image())
+            content = await self.long_form_writer.write(topic, target_words, research)
+            return {"blog_content": content, "image_url": image_url or None, "research": research}
+        except Exception as e:
+            print(f"Long-form Execution Error: {e}")
+            return {"blog_content": f"System Error: {e}", "image_url": None}
+
     async def polish_with_gemini(self, content: str) -> str:
         """
         Uses Gemini to polish and refine the blog post generated by the SDK.
@@ -200,27 +419,16 @@ CRITICAL: Never refuse to write a blog due to lack of search results. Use your k
             f"{content}"
         )
         
-        # Retry loop for polishing
-        max_retries = 3
-        retry_delays = [5, 10, 20]
-        
-        for attempt in range(max_retries):
-            try:
-                # Use the same client for polishing
-                response = await self.client.chat.completions.create(
-                    model="gemini-2.5-flash", 
-                    messages=[{"role": "user", "content": polish_prompt}]
-                )
-                return response.choices[0].message.content.strip()
-            except Exception as e:
-                error_str = str(e)
-                if "429" in error_str and attempt < max_retries - 1:
-                    delay = retry_delays[attempt]
-                    print(f"Polishing rate limit (429). Retrying in {delay} seconds...")
-                    await asyncio.sleep(delay)
-                    continue
-                print(f"Polishing Error: {e}")
-                return content # Fallback to raw content if polishing fails
+        try:
+            # Same client, so polishing also fails over across keys and models
+            response = await self.client.chat.completions.create(
+                model=self.model_name,
+                messages=[{"role": "user", "content": polish_prompt}]
+            )
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            print(f"Polishing Error: {e}")
+            return content # Fallback to raw content if polishing fails
     
     async def _generate_with_fallback(self, prompt: str) -> str:
         result = await Runner.run(self.blog_agent, prompt)
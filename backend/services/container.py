@@ -0,0 +1,230 @@
+"""
+Service container
+Holds the process-wide service instances and builds them on first use, so
+the heavy SDK imports (agents, openai) stay off the import and reload path.
+"""
+import asyncio
+import os
+import threading
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import httpx
+    from backend.services.ai_agent import GeminiAgent
+    from backend.services.image_gc import ImageGarbageCollector
+    from backend.services.image_service import ImageService
+    from backend.services.model_pool import ModelPool
+    from backend.services.page_fetcher import PageFetcher
+    from backend.services.prefetch import PrefetchScheduler
+    from backend.services.search_service import WebSearchService
+    from backend.services.shared_store import SharedStore
+    from backend.services.similarity_index import SimilarityIndex
+
+MODEL_PROBE_INTERVAL_SECONDS = int(os.getenv("MODEL_PROBE_INTERVAL_SECONDS", "300"))
+SIMILARITY_REBUILD_INTERVAL_SECONDS = int(os.getenv("SIMILARITY_REBUILD_INTERVAL_SECONDS", str(24 * 3600)))
+
+
+class ServiceContainer:
+    """
+    Lazily constructed services shared by every request.
+    Created in the app lifespan and handed to routes through dependencies.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._search_service: Optional["WebSearchService"] = None
+        self._image_service: Optional["ImageService"] = None
+        self._ai_agent: Optional["GeminiAgent"] = None
+        self._image_gc: Optional["ImageGarbageCollector"] = None
+        self._model_pool: Optional["ModelPool"] = None
+        self._llm_http_client: Optional["httpx.AsyncClient"] = None
+        self._similarity_index: Optional["SimilarityIndex"] = None
+        self._page_fetcher: Optional["PageFetcher"] = None
+        self._shared_store: Optional["SharedStore"] = None
+        self._prefetcher: Optional["PrefetchScheduler"] = None
+
+    @property
+    def shared_store(self) -> "SharedStore":
+        """State every worker process on the host agrees on"""
+        if self._shared_store is None:
+            with self._lock:
+                if self._shared_store is None:
+                    from backend.services.shared_store import SharedStore
+                    self._shared_store = SharedStore()
+        return self._shared_store
+
+    @property
+    def search_service(self) -> "WebSearchService":
+        if self._search_service is None:
+            store = self.shared_store
+            with self._lock:
+                if self._search_service is None:
+                    from backend.services.search_service import WebSearchService
+                    self._search_service = WebSearchService(cache=store)
+        return self._search_service
+
+    @property
+    def image_service(self) -> "ImageService":
+        if self._image_service is None:
+            with self._lock:
+                if self._image_service is None:
+                    from backend.services.image_service import ImageService
+                    self._image_service = ImageService()
+        return self._image_service
+
+    @property
+    def image_gc(self) -> "ImageGarbageCollector":
+        if self._image_gc is None:
+            image_dir = self.image_service.output_dir
+            with self._lock:
+                if self._image_gc is None:
+                    from backend.services.image_gc import ImageGarbageCollector
+                    self._image_gc = ImageGarbageCollector(image_dir)
+        return self._image_gc
+
+    @property
+    def page_fetcher(self) -> "PageFetcher":
+        if self._page_fetcher is None:
+            with self._lock:
+                if self._page_fetcher is None:
+                    from backend.services.page_fetcher import PageFetcher
+                    self._page_fetcher = PageFetcher()
+        return self._page_fetcher
+
+    @property
+    def similarity_index(self) -> "SimilarityIndex":
+        if self._similarity_index is None:
+            with self._lock:
+                if self._similarity_index is None:
+                    from backend.services.similarity_index import SimilarityIndex
+                    self._similarity_index = SimilarityIndex()
+        return self._similarity_index
+
+    @property
+    def llm_http_client(self) -> "httpx.AsyncClient":
+        if self._llm_http_client is None:
+            with self._lock:
+                if self._llm_http_client is None:
+                    from backend.services.http_client import create_llm_http_client
+                    self._llm_http_client = create_llm_http_client()
+        return self._llm_http_client
+
+    @property
+    def model_pool(self) -> "ModelPool":
+        if self._model_pool is None:
+            http_client = self.llm_http_client
+            store = self.shared_store
+            with self._lock:
+                if self._model_pool is None:
+                    from backend.services.model_pool import ModelPool
+                    self._model_pool = ModelPool.from_env(http_client=http_client, store=store)
+        return self._model_pool
+
+    @property
+    def ai_agent(self) -> "GeminiAgent":
+        if self._ai_agent is None:
+            search_service = self.search_service
+            image_service = self.image_service
+            model_pool = self.model_pool
+            from backend.services.page_fetcher import DEEP_RESEARCH_ENABLED
+            page_fetcher = self.page_fetcher if DEEP_RESEARCH_ENABLED else None
+            store = self.shared_store
+            with self._lock:
+                if self._ai_agent is None:
+                    from backend.services.ai_agent import GeminiAgent
+                    self._ai_agent = GeminiAgent(
+                        search_service=search_service,
+                        image_service=image_service,
+                        model_pool=model_pool,
+                        page_fetcher=page_fetcher,
+                        shared_store=store,
+                    )
+        return self._ai_agent
+
+    @property
+    def prefetcher(self) -> "PrefetchScheduler":
+        if self._prefetcher is None:
+            search_service = self.search_service
+            store = self.shared_store
+            with self._lock:
+                if self._prefetcher is None:
+                    from backend.services.prefetch import PrefetchScheduler
+                    # The agent is only built if drafts are pre-generated
+                    self._prefetcher = PrefetchScheduler(store, search_service, agent_factory=lambda: self.ai_agent)
+        return self._prefetcher
+
+    async def warm_up(self):
+        """
+        Build the agent in a worker thread after the server is already
+        accepting requests, so neither startup nor the first generation
+        request pays for the SDK imports.
+        """
+        try:
+            await asyncio.to_thread(lambda: self.ai_agent)
+            print("AI agent warmed up")
+        except Exception as e:
+            print(f"AI agent warm-up failed (will retry on first request): {e}")
+            return
+        await self.probe_models()
+
+    async def prewarm_llm_connections(self):
+        """Open the LLM connections before the first generation request needs them"""
+        from backend.services.http_client import prewarm
+        try:
+            pool = await asyncio.to_thread(lambda: self.model_pool)
+            await prewarm(self.llm_http_client, pool.base_url)
+        except Exception as e:
+            print(f"LLM connection pre-warm error: {e}")
+
+    async def probe_models(self):
+        """Health-check every key/model pair through the models listing"""
+        try:
+            listings = await self.model_pool.probe()
+            print(f"Model pool probed: {len(listings)} key(s)")
+        except Exception as e:
+            print(f"Model probe error: {e}")
+
+    async def probe_models_periodically(self, interval: int = MODEL_PROBE_INTERVAL_SECONDS):
+        """Background loop started from the app lifespan"""
+        while True:
+            await asyncio.sleep(interval)
+            await self.probe_models()
+
+    async def rebuild_similarity_periodically(self, interval: int = SIMILARITY_REBUILD_INTERVAL_SECONDS):
+        """Background loop started from the app lifespan; numpy is imported in a worker thread"""
+        try:
+            index = await asyncio.to_thread(lambda: self.similarity_index)
+        except Exception as e:
+            print(f"Similarity index unavailable: {e}")
+            return
+        from backend.services.similarity_index import run_similarity_rebuild_periodically
+        await run_similarity_rebuild_periodically(index, interval)
+
+    async def prefetch_periodically(self):
+        """Background loop started from the app lifespan (lease holder only)"""
+        from backend.services.prefetch import PREFETCH_INTERVAL_SECONDS, run_prefetch_periodically
+        prefetcher = await asyncio.to_thread(lambda: self.prefetcher)
+        await run_prefetch_periodically(prefetcher, PREFETCH_INTERVAL_SECONDS)
+
+    async def aclose(self):
+        """Release resources held by the services"""
+        from backend.services.image_service import shutdown_variant_pool
+        if self._image_service is not None:
+            self._image_service.cancel_post_processing()
+        shutdown_variant_pool()
+        if self._search_service is not None:
+            from backend.services.search_service import shutdown_search_pool
+            shutdown_search_pool()
+        if self._model_pool is not None:
+            await self._model_pool.aclose()
+            self._model_pool = None
+        if self._llm_http_client is not None:
+            await self._llm_http_client.aclose()
+            self._llm_http_client = None
+        if self._page_fetcher is not None:
+            await self._page_fetcher.aclose()
+            self._page_fetcher = None
+        self._prefetcher = None
+        self._ai_agent = None
+        self._search_service = None
+        self._image_service = None
@@ -0,0 +1,175 @@
+"""
+Cold storage archive job
+Moves blog and message bodies older than a configurable age into the shared,
+compressed content_bodies table. Works in small batches with one short
+transaction each (rows being written are skipped on Postgres), so it never
+holds locks long enough to block generation requests.
+Identical bodies are stored once, but only from the time they are archived:
+recent rows keep their content inline until they pass the cutoff.
+"""
+import asyncio
+import os
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import bindparam, func, update
+from sqlalchemy.exc import IntegrityError
+
+from backend.database.bodies import compress, content_hash
+from backend.database.database import SessionLocal, get_engine
+from backend.models.models import Blog, ContentBody, Message
+from backend.services.metrics import metrics
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("CONTENT_ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("CONTENT_ARCHIVE_INTERVAL_SECONDS", "3600"))
+BATCH_SIZE = 200
+# Pause between batches to leave room for interactive writes
+BATCH_PAUSE_SECONDS = 0.05
+# Compressing tiny bodies (e.g. user prompts) costs more than it saves
+MIN_ARCHIVE_CHARS = 512
+
+
+@dataclass
+class ArchiveStats:
+    rows_archived: int = 0
+    bodies_written: int = 0
+    dedup_hits: int = 0
+    raw_bytes: int = 0
+    stored_bytes: int = 0
+    bodies_pruned: int = 0
+    seconds: float = 0.0
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.raw_bytes - self.stored_bytes
+
+    def to_dict(self):
+        return {**asdict(self), "saved_bytes": self.saved_bytes}
+
+
+def archive_old_content(
+    older_than_days: int = ARCHIVE_AFTER_DAYS,
+    batch_size: int = BATCH_SIZE,
+    max_batches: Optional[int] = None,
+) -> ArchiveStats:
+    """Archive eligible rows (blogs first, so the assistant messages dedupe against them)"""
+    engine = get_engine()
+    skip_locked = engine.dialect.name == "postgresql"
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    stats = ArchiveStats()
+    start = time.perf_counter()
+    batches = 0
+
+    for model, age_column in ((Blog, Blog.timestamp), (Message, Message.created_at)):
+        last_id = 0
+        while max_batches is None or batches < max_batches:
+            archived, last_id = _archive_batch(model, age_column, cutoff, last_id, batch_size, skip_locked, stats)
+            batches += 1
+            if not archived:
+                break
+            time.sleep(BATCH_PAUSE_SECONDS)
+
+    stats.bodies_pruned = prune_orphan_bodies()
+    stats.seconds = time.perf_counter() - start
+
+    metrics.incr("archive.rows_archived", stats.rows_archived)
+    metrics.incr("archive.bytes_saved", stats.saved_bytes)
+    print(
+        f"Archived {stats.rows_archived} bodies ({stats.dedup_hits} deduplicated), "
+        f"{stats.raw_bytes} -> {stats.stored_bytes} bytes in {stats.seconds:.1f}s"
+    )
+    return stats
+
+
+def _archive_batch(model, age_column, cutoff, last_id, batch_size, skip_locked, stats: ArchiveStats):
+    columns = [model.id, model._content, model.updated_at]
+
+    with SessionLocal() as db:
+        query = (
+            db.query(*columns)
+            .filter(
+                model.body_hash.is_(None),
+                age_column < cutoff,
+                model.id > last_id,
+                func.length(model._content) >= MIN_ARCHIVE_CHARS,
+            )
+            .order_by(model.id)
+            .limit(batch_size)
+        )
+        if skip_locked:
+            query = query.with_for_update(skip_locked=True)
+        rows = query.all()
+        if not rows:
+            return 0, last_id
+
+        by_hash = {}
+        updates = []
+        for row in rows:
+            body_hash = content_hash(row._content)
+            by_hash[body_hash] = row._content
+            updates.append({"b_id": row.id, "b_old": row._content, "b_hash": body_hash, "b_updated": row.updated_at})
+            stats.raw_bytes += len(row._content.encode("utf-8"))
+
+        existing = {
+            h for (h,) in db.query(ContentBody.hash).filter(ContentBody.hash.in_(list(by_hash)))
+        }
+        stats.dedup_hits += len(rows) - (len(by_hash) - len(existing))
+        for body_hash, content in by_hash.items():
+            if body_hash in existing:
+                continue
+            codec, data = compress(content)
+            db.add(ContentBody(hash=body_hash, codec=codec, data=data, raw_size=len(content.encode("utf-8"))))
+            stats.bodies_written += 1
+            stats.stored_bytes += len(data)
+
+        table = model.__table__
+        # Only rows whose content didn't change since they were read are archived.
+        # Archiving is not an edit, so updated_at (and the ETags built on it) is kept.
+        statement = (
+            update(table)
+            .where(table.c.id == bindparam("b_id"), table.c.content == bindparam("b_old"))
+            .values(content="", body_hash=bindparam("b_hash"), updated_at=bindparam("b_updated"))
+        )
+
+        try:
+            db.flush()
+            db.execute(statement, updates)
+            db.commit()
+        except IntegrityError:
+            # Another archiver inserted the same body concurrently; retry next run
+            db.rollback()
+            return len(rows), rows[-1].id
+
+        stats.rows_archived += len(rows)
+        return len(rows), rows[-1].id
+
+
+def prune_orphan_bodies(batch_size: int = 500) -> int:
+    """Delete bodies no longer referenced by any blog or message"""
+    removed = 0
+    while True:
+        with SessionLocal() as db:
+            referenced_by_message = db.query(Message.id).filter(Message.body_hash == ContentBody.hash).exists()
+            referenced_by_blog = db.query(Blog.id).filter(Blog.body_hash == ContentBody.hash).exists()
+            orphans = [
+                h for (h,) in db.query(ContentBody.hash)
+                .filter(~referenced_by_message, ~referenced_by_blog)
+                .limit(batch_size)
+            ]
+            if not orphans:
+                return removed
+            db.query(ContentBody).filter(ContentBody.hash.in_(orphans)).delete(synchronize_session=False)
+            db.commit()
+            removed += len(orphans)
+
+
+async def run_archive_periodically(interval: int = ARCHIVE_INTERVAL_SECONDS):
+    """Background loop started from the app lifespan"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(archive_old_content)
+        except Exception as e:
+            print(f"Content archive error: {e}")
@@ -0,0 +1,176 @@
+"""
+Chat context for multi-turn generation
+Only the last CONTEXT_WINDOW_MESSAGES messages are loaded per turn; older
+turns are represented by a summary kept on the chat row. Messages are folded
+into it incrementally once they slide out of the window (cheap model,
+extractive fallback), so short chats never pay for a summary call. The
+previous turn's research and image are cached on the chat too, so edits and
+follow-ups don't search or draw again.
+"""
+import asyncio
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import orjson
+from sqlalchemy.orm import Session
+
+from backend.database.bodies import hydrate
+from backend.database.database import SessionLocal
+from backend.models.models import Chat, Message
+from backend.services.metrics import metrics
+
+CONTEXT_WINDOW_MESSAGES = int(os.getenv("CONTEXT_WINDOW_MESSAGES", "6"))
+SUMMARY_MAX_CHARS = int(os.getenv("CHAT_SUMMARY_MAX_CHARS", "1500"))
+RESEARCH_CACHE_MAX_CHARS = 8000
+# Assistant replies at least this long are treated as drafts that can be edited
+DRAFT_MIN_CHARS = 500
+
+
+@dataclass
+class ChatContext:
+    chat_id: int
+    summary: str = ""
+    recent: List[Dict[str, str]] = field(default_factory=list)
+    last_draft: Optional[str] = None
+    last_message_id: int = 0
+    cache: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def fingerprint(self):
+        """Identifies the chat state a generation is based on (part of the single-flight key)"""
+        return (self.chat_id, self.last_message_id)
+
+    @property
+    def research(self) -> str:
+        return self.cache.get("research") or ""
+
+    @property
+    def image_url(self) -> Optional[str]:
+        return self.cache.get("image_url")
+
+    def transcript(self, max_chars_per_message: int = 500) -> str:
+        lines = [f"Summary of earlier conversation: {self.summary}"] if self.summary else []
+        for message in self.recent:
+            content = message["content"]
+            if len(content) > max_chars_per_message:
+                content = content[:max_chars_per_message] + "…"
+            lines.append(f"{message['role']}: {content}")
+        return "\n".join(lines)
+
+
+def load_chat_context(db: Session, chat: Chat) -> ChatContext:
+    """One windowed query for the recent messages; bodies are hydrated in a batch"""
+    rows = (
+        db.query(Message.id, Message.role, Message.content.label("content"), Message.body_hash, Message.image_url)
+        .filter(Message.chat_id == chat.id)
+        .order_by(Message.id.desc())
+        .limit(CONTEXT_WINDOW_MESSAGES)
+        .all()
+    )
+    recent = hydrate(db, [row._asdict() for row in reversed(rows)])
+    context = ChatContext(
+        chat_id=chat.id,
+        summary=chat.summary or "",
+        recent=[{"role": m["role"], "content": m["content"] or ""} for m in recent],
+        last_message_id=rows[0].id if rows else 0,
+        cache=_load_cache(chat.context_cache),
+    )
+    for message in reversed(recent):
+        if message["role"] == "assistant" and len(message["content"] or "") >= DRAFT_MIN_CHARS:
+            context.last_draft = message["content"]
+            context.cache.setdefault("image_url", message["image_url"])
+            break
+    return context
+
+
+def _load_cache(raw: Optional[str]) -> Dict[str, Any]:
+    if not raw:
+        return {}
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return {}
+
+
+def store_turn_cache(chat: Chat, topic: str, result: Dict[str, Any]):
+    """Remember this turn's research and image on the chat (caller commits)"""
+    cache = _load_cache(chat.context_cache)
+    if result.get("research"):
+        cache["research"] = result["research"][:RESEARCH_CACHE_MAX_CHARS]
+        cache["topic"] = topic
+    if result.get("image_url"):
+        cache["image_url"] = result["image_url"]
+    chat.context_cache = orjson.dumps(cache).decode()
+
+
+def extractive_summary(previous: str, messages: List[Dict[str, str]]) -> str:
+    """Fallback: first sentence of every new message appended to the old summary"""
+    parts = [previous] if previous else []
+    for message in messages:
+        text = re.sub(r"[#*_>`]+", "", message["content"]).strip()
+        first = re.split(r"(?<=[.!?])\s+", text, maxsplit=1)[0][:200]
+        if first:
+            parts.append(f"{message['role']}: {first}")
+    summary = " ".join(parts)
+    # Keep the most recent part when it grows past the budget
+    return summary[-SUMMARY_MAX_CHARS:]
+
+
+Summarizer = Callable[[str, List[Dict[str, str]]], Awaitable[str]]
+
+
+async def refresh_summary(chat_id: int, summarize: Optional[Summarizer] = None):
+    """
+    Fold messages that have left the context window into the chat summary.
+    Runs after the response has been sent; the two queries run in worker
+    threads, each with its own pooled connection.
+    """
+
+    def load():
+        with SessionLocal() as db:
+            chat = db.query(Chat.summary, Chat.summary_message_id).filter(Chat.id == chat_id).first()
+            if chat is None:
+                return None, []
+            rows = (
+                db.query(Message.id, Message.role, Message.content.label("content"), Message.body_hash)
+                .filter(Message.chat_id == chat_id, Message.id > (chat.summary_message_id or 0))
+                .order_by(Message.id)
+                .all()
+            )
+            # The newest messages are still in the window and stay verbatim
+            to_fold = rows[:-CONTEXT_WINDOW_MESSAGES] if CONTEXT_WINDOW_MESSAGES else rows
+            return chat.summary, hydrate(db, [row._asdict() for row in to_fold])
+
+    previous, new_messages = await asyncio.to_thread(load)
+    if not new_messages:
+        return
+
+    # A long chat summarized for the first time only contributes its latest turns
+    messages = [{"role": m["role"], "content": (m["content"] or "")[:2000]} for m in new_messages[-20:]]
+    summary = None
+    if summarize is not None:
+        try:
+            summary = (await summarize(previous or "", messages))[:SUMMARY_MAX_CHARS]
+            metrics.incr("chat_summary.model")
+        except Exception as e:
+            print(f"Chat summary model error, using extractive summary: {e}")
+    if not summary:
+        summary = extractive_summary(previous or "", messages)
+        metrics.incr("chat_summary.extractive")
+
+    def save():
+        with SessionLocal() as db:
+            db.query(Chat).filter(Chat.id == chat_id).update(
+                {
+                    Chat.summary: summary,
+                    Chat.summary_message_id: new_messages[-1]["id"],
+                    # Bookkeeping only, the chat list shouldn't reorder
+                    Chat.updated_at: Chat.updated_at,
+                },
+                synchronize_session=False,
+            )
+            db.commit()
+
+    await asyncio.to_thread(save)
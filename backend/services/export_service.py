@@ -0,0 +1,162 @@
+"""
+Streaming blog export
+Blogs are read with a server-side cursor (yield_per) in id order and written
+out batch by batch, either as NDJSON or as a zip of markdown files with their
+images. Memory stays flat no matter how many blogs a user has; an export can
+be resumed by passing the last id that was received as after_id.
+"""
+import io
+import os
+import re
+import zipfile
+from typing import Dict, Iterator, List
+
+import orjson
+
+from backend.database.bodies import hydrate
+from backend.database.database import SessionLocal, get_engine
+from backend.models.models import Blog, Message
+from backend.services.image_gc import image_id_from_url
+
+EXPORT_BATCH_SIZE = 500
+IMAGE_CHUNK_SIZE = 64 * 1024
+
+
+def _iter_blog_batches(user_id: int, after_id: int = 0, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[Dict]]:
+    """Yield lists of blog dicts (archived bodies hydrated) in ascending id order"""
+    get_engine()
+    with SessionLocal() as db:
+        rows = (
+            db.query(
+                Blog.id,
+                Blog.chat_id,
+                Blog.topic,
+                Blog.content.label("content"),
+                Blog.body_hash,
+                Blog.timestamp,
+            )
+            .filter(Blog.user_id == user_id, Blog.id > after_id)
+            .order_by(Blog.id)
+            .yield_per(batch_size)
+        )
+        batch: List[Dict] = []
+        for row in rows:
+            batch.append(row._asdict())
+            if len(batch) >= batch_size:
+                yield hydrate(db, batch)
+                batch = []
+        if batch:
+            yield hydrate(db, batch)
+
+
+def export_ndjson(user_id: int, after_id: int = 0) -> Iterator[bytes]:
+    """One JSON object per line; each yielded chunk is one batch"""
+    for batch in _iter_blog_batches(user_id, after_id):
+        yield b"".join(
+            orjson.dumps(
+                {
+                    "id": blog["id"],
+                    "chat_id": blog["chat_id"],
+                    "topic": blog["topic"],
+                    "content": blog["content"],
+                    "timestamp": blog["timestamp"],
+                }
+            ) + b"\n"
+            for blog in batch
+        )
+
+
+class _StreamBuffer(io.RawIOBase):
+    """Write-only, unseekable sink; zipfile then streams entries with data descriptors"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def export_zip(user_id: int, image_dir: str, after_id: int = 0) -> Iterator[bytes]:
+    """
+    Zip of markdown files (with front matter) plus the referenced images.
+    Bodies and images are streamed; only the per-entry zip directory records
+    are kept until the archive is closed.
+    """
+    buffer = _StreamBuffer()
+    written_images = set()
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for batch in _iter_blog_batches(user_id, after_id):
+            images = _images_for_chats((blog["chat_id"] for blog in batch), image_dir)
+            for blog in batch:
+                image_path = images.get(blog["chat_id"])
+                image_name = f"images/{os.path.basename(image_path)}" if image_path else None
+                archive.writestr(
+                    f"blogs/{blog['id']:08d}-{_slugify(blog['topic'])}.md",
+                    _to_markdown(blog, image_name),
+                )
+                yield buffer.drain()
+
+                if image_path and image_name not in written_images:
+                    written_images.add(image_name)
+                    with open(image_path, "rb") as src, archive.open(image_name, "w") as dest:
+                        while chunk := src.read(IMAGE_CHUNK_SIZE):
+                            dest.write(chunk)
+                            yield buffer.drain()
+        # Leaving the with-block writes the central directory
+    yield buffer.drain()
+
+
+def _images_for_chats(chat_ids, image_dir: str) -> Dict[int, str]:
+    """Map chat id -> original image file of its assistant message"""
+    chat_ids = [chat_id for chat_id in set(chat_ids) if chat_id]
+    if not chat_ids:
+        return {}
+    with SessionLocal() as db:
+        rows = (
+            db.query(Message.chat_id, Message.image_url)
+            .filter(Message.chat_id.in_(chat_ids), Message.image_url.isnot(None))
+            .order_by(Message.id)
+            .all()
+        )
+    images = {}
+    for chat_id, url in rows:
+        image_id = image_id_from_url(url)
+        path = os.path.join(image_dir, f"{image_id}.png") if image_id else None
+        if path and os.path.exists(path):
+            images[chat_id] = path
+    return images
+
+
+def _to_markdown(blog: Dict, image_name: str = None) -> str:
+    front_matter = [
+        "---",
+        f"id: {blog['id']}",
+        f"topic: {orjson.dumps(blog['topic']).decode()}",
+        f"date: {blog['timestamp']}",
+    ]
+    if image_name:
+        front_matter.append(f"image: {image_name.split('/', 1)[1]}")
+    front_matter.append("---")
+    body = blog["content"]
+    if image_name:
+        body = f"![{blog['topic']}](../{image_name})\n\n{body}"
+    return "\n".join(front_matter) + "\n\n" + body + "\n"
+
+
+def _slugify(text: str) -> str:
+    slug = re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+    return slug[:60] or "blog"
@@ -2,9 +2,9 @@
 Gemini API Adapter for OpenAI Agents SDK
 This adapter allows using Gemini API with OpenAI Agent architecture
 """
+import asyncio
 import os
 from typing import List, Dict, Any, Optional
-import google.generativeai as genai
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -20,6 +20,10 @@ class GeminiModelAdapter:
         if not self.api_key:
             raise ValueError("❌ GEMINI_API_KEY not found in environment variables")
         
+        # Imported here so the SDK is only loaded when an adapter is actually built
+        import google.generativeai as genai
+
+        self._genai = genai
         genai.configure(api_key=self.api_key)
         self.model = genai.GenerativeModel(model_name)
         self.model_name = model_name
@@ -42,7 +46,7 @@ class GeminiModelAdapter:
             # Generate content
             response = self.model.generate_content(
                 prompt,
-                generation_config=genai.types.GenerationConfig(
+                generation_config=self._genai.types.GenerationConfig(
                     temperature=temperature,
                     max_output_tokens=max_tokens or 2048,
                 )
@@ -75,9 +79,9 @@ class GeminiModelAdapter:
         max_tokens: Optional[int] = None
     ) -> Dict[str, Any]:
         """Async version of create_completion"""
-        # Note: google-generativeai doesn't have native async, 
-        # but we wrap it for compatibility
-        return self.create_completion(messages, temperature, max_tokens)
+        # google-generativeai has no native async; run the blocking call in a
+        # worker thread so it doesn't stall the event loop
+        return await asyncio.to_thread(self.create_completion, messages, temperature, max_tokens)
     
     def _convert_messages_to_prompt(self, messages: List[Dict[str, str]]) -> str:
         """
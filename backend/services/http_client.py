@@ -0,0 +1,114 @@
+"""
+Shared HTTP client for the LLM endpoint
+One long-lived httpx.AsyncClient (HTTP/2 when h2 is installed) is shared by
+every OpenAI-compatible client, so the agent runner, polishing and the
+long-form writer reuse the same warm connections. Limits come from:
+
+    LLM_HTTP2                     1 to negotiate HTTP/2 (default 1)
+    LLM_HTTP_MAX_CONNECTIONS      default 20
+    LLM_HTTP_MAX_KEEPALIVE        default 10
+    LLM_HTTP_KEEPALIVE_EXPIRY     idle seconds before a connection is closed (default 120)
+    LLM_HTTP_CONNECT_TIMEOUT      default 10
+    LLM_HTTP_READ_TIMEOUT         default 120
+    LLM_HTTP_PREWARM_CONNECTIONS  connections opened at startup (default 1)
+
+Connection opens, TLS handshakes and reuse are counted through httpcore's
+trace extension and show up under llm_http.* in /api/metrics.
+"""
+import asyncio
+import os
+import time
+from typing import Optional
+
+import httpx
+
+from backend.services.metrics import metrics
+
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "1") == "1"
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "10"))
+LLM_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "120"))
+LLM_HTTP_CONNECT_TIMEOUT = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "10"))
+LLM_HTTP_READ_TIMEOUT = float(os.getenv("LLM_HTTP_READ_TIMEOUT", "120"))
+LLM_HTTP_PREWARM_CONNECTIONS = int(os.getenv("LLM_HTTP_PREWARM_CONNECTIONS", "1"))
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class _ConnectionTrace:
+    """httpcore trace callback for one request; remembers whether it had to connect"""
+
+    def __init__(self):
+        self.opened_connection = False
+        self._tls_started = 0.0
+
+    async def __call__(self, event_name: str, info: dict):
+        if event_name == "connection.connect_tcp.complete":
+            self.opened_connection = True
+            metrics.incr("llm_http.connections_opened")
+        elif event_name == "connection.start_tls.started":
+            self._tls_started = time.perf_counter()
+        elif event_name == "connection.start_tls.complete":
+            metrics.incr("llm_http.tls_handshakes")
+            metrics.observe("llm_http.tls_handshake_ms", (time.perf_counter() - self._tls_started) * 1000)
+
+
+async def _attach_trace(request: httpx.Request):
+    request.extensions["trace"] = _ConnectionTrace()
+
+
+async def _record_response(response: httpx.Response):
+    metrics.incr("llm_http.requests")
+    metrics.incr(f"llm_http.protocol.{response.http_version}")
+    trace = response.request.extensions.get("trace")
+    if isinstance(trace, _ConnectionTrace) and not trace.opened_connection:
+        metrics.incr("llm_http.reused_connections")
+
+
+def connection_reuse_ratio() -> float:
+    requests = metrics.counter("llm_http.requests")
+    return round(metrics.counter("llm_http.reused_connections") / requests, 3) if requests else 0.0
+
+
+def create_llm_http_client() -> httpx.AsyncClient:
+    http2 = LLM_HTTP2 and _http2_available()
+    if LLM_HTTP2 and not http2:
+        print("h2 is not installed, LLM client falls back to HTTP/1.1 keep-alive")
+    client = httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(LLM_HTTP_READ_TIMEOUT, connect=LLM_HTTP_CONNECT_TIMEOUT),
+        event_hooks={"request": [_attach_trace], "response": [_record_response]},
+    )
+    metrics.register_gauge("llm_http.connection_reuse_ratio", connection_reuse_ratio)
+    return client
+
+
+async def prewarm(client: httpx.AsyncClient, base_url: str, connections: Optional[int] = None):
+    """
+    Open connections to the LLM endpoint ahead of the first request so DNS,
+    TCP and TLS (and the HTTP/2 preface) are paid during startup. Any status
+    code will do; the request only exists to establish the connection.
+    """
+    connections = LLM_HTTP_PREWARM_CONNECTIONS if connections is None else connections
+    start = time.perf_counter()
+
+    async def touch():
+        try:
+            response = await client.get(base_url.rstrip("/") + "/models")
+            await response.aclose()
+        except httpx.HTTPError as e:
+            print(f"LLM connection pre-warm failed: {e}")
+
+    await asyncio.gather(*(touch() for _ in range(max(connections, 0))))
+    print(f"LLM connections pre-warmed in {(time.perf_counter() - start) * 1000:.0f} ms")
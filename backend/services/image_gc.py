@@ -0,0 +1,192 @@
+"""
+Image garbage collector
+Reconciles the generated-images directory against the image URLs still
+referenced by messages or kept in a chat's context cache. The directory is streamed with os.scandir and checked
+in batches, so memory stays flat with millions of files, and deletions are
+rate limited to keep disk and database load low.
+"""
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Iterable, Iterator, List, Optional, Set
+
+from sqlalchemy import or_
+
+from backend.database.database import SessionLocal
+from backend.models.models import Chat, Message
+from backend.services.metrics import metrics
+
+IMAGE_GC_INTERVAL_SECONDS = int(os.getenv("IMAGE_GC_INTERVAL_SECONDS", str(6 * 3600)))
+# Files younger than this may belong to a generation whose message isn't saved yet
+IMAGE_GC_MIN_AGE_SECONDS = int(os.getenv("IMAGE_GC_MIN_AGE_SECONDS", "3600"))
+IMAGE_GC_MAX_DELETES_PER_SECOND = float(os.getenv("IMAGE_GC_MAX_DELETES_PER_SECOND", "50"))
+
+IMAGE_FILE_RE = re.compile(r"^(image_[0-9a-f]{32})\.")
+IMAGE_ID_IN_URL_RE = re.compile(r"(image_[0-9a-f]{32})")
+
+# Every file a stored image may have (original plus derived variants)
+VARIANT_SUFFIXES = ("png", "webp", "avif", "thumb.webp", "thumb.avif", "thumb.png")
+
+
+@dataclass
+class GCStats:
+    files_scanned: int = 0
+    images_checked: int = 0
+    images_deleted: int = 0
+    files_deleted: int = 0
+    bytes_freed: int = 0
+    seconds: float = 0.0
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def image_id_from_url(url: str):
+    match = IMAGE_ID_IN_URL_RE.search(url or "")
+    return match.group(1) if match else None
+
+
+def urls_for_image(image_id: str) -> List[str]:
+    """Every image_url form a message may use to point at this image"""
+    return [f"/api/images/{image_id}", f"/static/images/{image_id}.png"]
+
+
+class ImageGarbageCollector:
+    def __init__(
+        self,
+        image_dir: str,
+        batch_size: int = 500,
+        max_deletes_per_second: float = IMAGE_GC_MAX_DELETES_PER_SECOND,
+        min_age_seconds: int = IMAGE_GC_MIN_AGE_SECONDS,
+    ):
+        self.image_dir = image_dir
+        self.batch_size = batch_size
+        self.max_deletes_per_second = max_deletes_per_second
+        self.min_age_seconds = min_age_seconds
+        # Sibling variants of one image show up as separate directory entries;
+        # remember recent ids so each image is checked once per pass
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+
+    def collect(self) -> GCStats:
+        """One full reconciliation pass (blocking, run it in a thread)"""
+        stats = GCStats()
+        start = time.perf_counter()
+        self._recent.clear()
+        cached = self._cached_references()
+
+        for batch in self._scan_batches(stats):
+            referenced = self._referenced(batch, cached)
+            unreferenced = [image_id for image_id in batch if image_id not in referenced]
+            self._delete(unreferenced, stats, check_age=True)
+
+        stats.seconds = time.perf_counter() - start
+        metrics.incr("image_gc.images_deleted", stats.images_deleted)
+        metrics.incr("image_gc.bytes_freed", stats.bytes_freed)
+        print(
+            f"Image GC: scanned {stats.files_scanned} files, deleted {stats.images_deleted} images "
+            f"({stats.bytes_freed} bytes) in {stats.seconds:.1f}s"
+        )
+        return stats
+
+    def delete_if_unreferenced(self, image_urls: Iterable[str]) -> GCStats:
+        """Remove the files of images whose messages were just deleted"""
+        stats = GCStats()
+        ids = {image_id for image_id in map(image_id_from_url, image_urls) if image_id}
+        if ids:
+            referenced = self._referenced(list(ids))
+            self._delete([i for i in ids if i not in referenced], stats, check_age=False)
+        return stats
+
+    def _scan_batches(self, stats: GCStats) -> Iterator[List[str]]:
+        batch: List[str] = []
+        with os.scandir(self.image_dir) as entries:
+            for entry in entries:
+                stats.files_scanned += 1
+                match = IMAGE_FILE_RE.match(entry.name)
+                if not match or not entry.is_file(follow_symlinks=False):
+                    continue
+                image_id = match.group(1)
+                if image_id in self._recent:
+                    continue
+                self._remember(image_id)
+                batch.append(image_id)
+                if len(batch) >= self.batch_size:
+                    stats.images_checked += len(batch)
+                    yield batch
+                    batch = []
+        if batch:
+            stats.images_checked += len(batch)
+            yield batch
+
+    def _remember(self, image_id: str):
+        self._recent[image_id] = None
+        if len(self._recent) > 4 * self.batch_size:
+            self._recent.popitem(last=False)
+
+    def _referenced(self, image_ids: List[str], cached: Optional[Set[str]] = None) -> Set[str]:
+        """Ids still used by a message or (cached=None: looked up) a chat's context cache"""
+        urls = [url for image_id in image_ids for url in urls_for_image(image_id)]
+        with SessionLocal() as db:
+            rows = db.query(Message.image_url).filter(Message.image_url.in_(urls)).distinct().all()
+            if cached is None:
+                cached = self._cached_references(db, image_ids)
+        return {image_id_from_url(url) for (url,) in rows} | (cached & set(image_ids))
+
+    def _cached_references(self, db=None, image_ids: Optional[List[str]] = None) -> Set[str]:
+        """
+        Image ids kept in chats' context caches, where follow-up edits pick up
+        the last image. A full pass reads every cache once; image_ids narrows
+        the lookup to the chats that mention them.
+        """
+        if db is None:
+            with SessionLocal() as session:
+                return self._cached_references(session, image_ids)
+        query = db.query(Chat.context_cache)
+        if image_ids is None:
+            query = query.filter(Chat.context_cache.like("%image_%"))
+        else:
+            query = query.filter(or_(*[Chat.context_cache.like(f"%{image_id}%") for image_id in image_ids]))
+        cached: Set[str] = set()
+        for (raw,) in query.yield_per(self.batch_size):
+            cached.update(IMAGE_ID_IN_URL_RE.findall(raw))
+        return cached
+
+    def _delete(self, image_ids: List[str], stats: GCStats, check_age: bool):
+        min_interval = 1.0 / self.max_deletes_per_second if self.max_deletes_per_second > 0 else 0
+        now = time.time()
+        for image_id in image_ids:
+            paths = [os.path.join(self.image_dir, f"{image_id}.{suffix}") for suffix in VARIANT_SUFFIXES]
+            existing = []
+            for path in paths:
+                try:
+                    existing.append((path, os.stat(path)))
+                except FileNotFoundError:
+                    continue
+            if not existing:
+                continue
+            if check_age and any(now - st.st_mtime < self.min_age_seconds for _, st in existing):
+                continue
+
+            for path, st in existing:
+                try:
+                    os.remove(path)
+                    stats.files_deleted += 1
+                    stats.bytes_freed += st.st_size
+                except FileNotFoundError:
+                    pass
+            stats.images_deleted += 1
+            if min_interval:
+                time.sleep(min_interval)
+
+
+async def run_image_gc_periodically(collector: ImageGarbageCollector, interval: int = IMAGE_GC_INTERVAL_SECONDS):
+    """Background loop started from the app lifespan"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(collector.collect)
+        except Exception as e:
+            print(f"Image GC error: {e}")
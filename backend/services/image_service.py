@@ -1,9 +1,93 @@
 import os
+import re
+import asyncio
 import aiohttp
 import aiofiles
+from concurrent.futures import ProcessPoolExecutor
+import time
 from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
 import uuid
 
+from backend.services.metrics import metrics
+from backend.services.resilience import CircuitOpenError, LatencyTracker, get_breaker, hedged
+
+# Base URL of the image backend (point it at a local stub for fault injection)
+POLLINATIONS_BASE_URL = os.getenv("POLLINATIONS_BASE_URL", "https://image.pollinations.ai")
+IMAGE_TIMEOUT = float(os.getenv("IMAGE_TIMEOUT_SECONDS", "60"))
+
+# Longest edge of the thumbnail used by chat list previews
+THUMBNAIL_SIZE = int(os.getenv("IMAGE_THUMBNAIL_SIZE", "320"))
+VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", "2"))
+
+IMAGE_ID_RE = re.compile(r"^image_[0-9a-f]{32}$")
+
+# Served formats per size, in order of preference (best compression first)
+VARIANT_FORMATS = {
+    "full": [("avif", "image/avif"), ("webp", "image/webp"), ("png", "image/png")],
+    "thumb": [("thumb.avif", "image/avif"), ("thumb.webp", "image/webp"), ("thumb.png", "image/png")],
+}
+
+_variant_pool: Optional[ProcessPoolExecutor] = None
+
+metrics.register_gauge(
+    "images.bytes_saved_per_page_view",
+    lambda: metrics.counter("images.bytes_saved") / max(1, metrics.counter("page_views.chat")),
+)
+
+
+def build_variants(filepath: str, thumbnail_size: int = THUMBNAIL_SIZE) -> Dict[str, int]:
+    """
+    Create the thumbnail and compressed variants next to the original PNG.
+    Runs in a worker process; returns {suffix: size_in_bytes} of what was written.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return {}
+
+    stem = filepath[: -len(".png")]
+    written = {}
+
+    def save(img, suffix, fmt, **options):
+        target = f"{stem}.{suffix}"
+        try:
+            img.save(target, fmt, **options)
+            written[suffix] = os.path.getsize(target)
+        except (KeyError, OSError, ValueError):
+            # Format not supported by this Pillow build (AVIF in particular)
+            if os.path.exists(target):
+                os.remove(target)
+
+    with Image.open(filepath) as original:
+        img = original.convert("RGB")
+        save(img, "webp", "WEBP", quality=80, method=4)
+        save(img, "avif", "AVIF", quality=60)
+
+        thumb = img.copy()
+        thumb.thumbnail((thumbnail_size, thumbnail_size))
+        save(thumb, "thumb.webp", "WEBP", quality=75, method=4)
+        save(thumb, "thumb.avif", "AVIF", quality=55)
+        save(thumb, "thumb.png", "PNG", optimize=True)
+
+    return written
+
+
+def _get_variant_pool() -> ProcessPoolExecutor:
+    global _variant_pool
+    if _variant_pool is None:
+        _variant_pool = ProcessPoolExecutor(max_workers=VARIANT_WORKERS)
+    return _variant_pool
+
+
+def shutdown_variant_pool():
+    """Stop the post-processing workers (called on app shutdown)"""
+    global _variant_pool
+    if _variant_pool is not None:
+        _variant_pool.shutdown(wait=False, cancel_futures=True)
+        _variant_pool = None
+
+
 class ImageService:
     def __init__(self):
         # Find project root (one level up from 'backend' or two from 'backend/services')
@@ -11,32 +95,115 @@ class ImageService:
         self.output_dir = os.path.join(base_dir, "frontend", "public", "static", "images")
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir, exist_ok=True)
+        self.breaker = get_breaker("image", failure_threshold=3, reset_timeout=60)
+        self.latency = LatencyTracker()
+        # Variant builds still running; held so they aren't garbage-collected mid-flight
+        self._post_processing: Set[asyncio.Task] = set()
 
     async def generate_image(self, prompt: str) -> str:
         """
         Generate an image based on the prompt.
         Uses Pollinations.ai for high-quality AI images without extra keys.
-        Saves locally to make it downloadable.
+        Saves locally to make it downloadable and returns its URL right away;
+        the compressed variants are derived in a worker process in the
+        background (the original PNG is served until they exist). Returns ""
+        (image skipped) on failure or while the image breaker is open.
         """
+        # High-quality image generation via Pollinations.ai
+        # We encode the prompt for URL
+        safe_prompt = prompt.replace(" ", "%20").replace("\n", "%20")
+        image_url = f"{POLLINATIONS_BASE_URL}/prompt/{safe_prompt}?width=1024&height=1024&nologo=true&enhance=true"
+
+        async def call():
+            start = time.perf_counter()
+            data = await hedged(lambda: self._download(image_url), self.latency.percentile(95), "image")
+            self.latency.observe(time.perf_counter() - start)
+            return data
+
         try:
-            # High-quality image generation via Pollinations.ai
-            # We encode the prompt for URL
-            safe_prompt = prompt.replace(" ", "%20").replace("\n", "%20")
-            image_url = f"https://image.pollinations.ai/prompt/{safe_prompt}?width=1024&height=1024&nologo=true&enhance=true"
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(image_url) as resp:
-                    if resp.status == 200:
-                        filename = f"image_{uuid.uuid4().hex}.png"
-                        filepath = os.path.join(self.output_dir, filename)
-                        
-                        f = await aiofiles.open(filepath, mode='wb')
-                        await f.write(await resp.read())
-                        await f.close()
-                        
-                        # Return relative URL for frontend
-                        return f"/static/images/{filename}"
+            data = await self.breaker.call(call)
+        except CircuitOpenError:
+            metrics.incr("images.fast_fail")
             return ""
         except Exception as e:
-            print(f"Image generation error: {e}")
+            print(f"Image generation error: {e!r}")
             return ""
+
+        try:
+            image_id = f"image_{uuid.uuid4().hex}"
+            filepath = os.path.join(self.output_dir, f"{image_id}.png")
+
+            f = await aiofiles.open(filepath, mode='wb')
+            await f.write(data)
+            await f.close()
+
+            task = asyncio.create_task(self._post_process(filepath))
+            self._post_processing.add(task)
+            task.add_done_callback(self._post_processing.discard)
+
+            # Return the negotiated URL; the API picks the best variant per client
+            return f"/api/images/{image_id}"
+        except Exception as e:
+            print(f"Image save error: {e}")
+            return ""
+
+    async def _download(self, url: str) -> bytes:
+        timeout = aiohttp.ClientTimeout(total=IMAGE_TIMEOUT)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.get(url) as resp:
+                if resp.status != 200:
+                    raise RuntimeError(f"Image backend returned HTTP {resp.status}")
+                return await resp.read()
+
+    async def _post_process(self, filepath: str):
+        """Build variants off the event loop; the original stays usable if this fails"""
+        try:
+            loop = asyncio.get_running_loop()
+            written = await loop.run_in_executor(_get_variant_pool(), build_variants, filepath)
+            if written:
+                metrics.incr("images.variants_built")
+                metrics.observe("images.original_bytes", os.path.getsize(filepath))
+        except Exception as e:
+            print(f"Image post-processing error: {e}")
+
+    async def wait_post_processing(self):
+        """Wait for the variant builds started so far"""
+        if self._post_processing:
+            await asyncio.gather(*list(self._post_processing), return_exceptions=True)
+
+    def cancel_post_processing(self):
+        for task in list(self._post_processing):
+            task.cancel()
+
+    def resolve_variant(self, image_id: str, size: str, accept: str) -> Optional[Tuple[str, str]]:
+        """
+        Pick the smallest stored variant the client accepts.
+        Returns (filepath, media_type) or None when the image doesn't exist.
+        """
+        if not IMAGE_ID_RE.match(image_id) or size not in VARIANT_FORMATS:
+            return None
+
+        accept = (accept or "").lower()
+        for suffix, media_type in VARIANT_FORMATS[size]:
+            if media_type != "image/png" and media_type not in accept:
+                continue
+            path = os.path.join(self.output_dir, f"{image_id}.{suffix}")
+            if os.path.exists(path):
+                return path, media_type
+
+        # Fall back to the original download (also covers images without variants)
+        original = os.path.join(self.output_dir, f"{image_id}.png")
+        if os.path.exists(original):
+            return original, "image/png"
+        return None
+
+    def record_served(self, image_id: str, served_path: str):
+        """Track bytes saved compared to always sending the original PNG"""
+        try:
+            original = os.path.getsize(os.path.join(self.output_dir, f"{image_id}.png"))
+            served = os.path.getsize(served_path)
+        except OSError:
+            return
+        metrics.incr("images.bytes_served", served)
+        metrics.incr("images.bytes_saved", max(0, original - served))
+        metrics.observe("images.bytes_saved_per_response", max(0, original - served))
@@ -0,0 +1,107 @@
+"""
+Local intent router
+Classifies each input before any model call with explicit rules: greetings
+and questions about the assistant are small talk, "draw/generate an image
+of ..." is an image request. Nothing else leaves the full blog pipeline,
+which can handle every kind of input, so a topic is never answered with a
+chat reply or an image by mistake. In a chat that already has a draft, edit
+requests ("make it shorter") are routed to a single revision turn.
+"""
+import re
+from dataclasses import dataclass
+from enum import Enum
+
+
+class Intent(str, Enum):
+    SMALL_TALK = "small_talk"
+    IMAGE = "image"
+    BLOG = "blog"
+    EDIT = "edit"
+
+
+@dataclass
+class RouteDecision:
+    intent: Intent
+    confidence: float
+    reason: str
+
+
+_GREETING_RE = re.compile(
+    r"^\s*(hi+|hello+|hey+|hiya|yo|salam|assalam[uo] ?alaikum|good (morning|afternoon|evening|night)|"
+    r"thanks?( you)?|thank u|thx|ty|ok(ay)?|cool|great|nice|bye|goodbye|see you|how are you|"
+    r"what'?s up|who are you|what can you do)\b[\s!.?,]*(there|again|so much|a lot|buddy|friend)?[\s!.?]*$",
+    re.IGNORECASE,
+)
+_IMAGE_RE = re.compile(
+    r"\b(generate|create|make|draw|paint|design|render|show me|give me)\b.{0,30}?"
+    r"\b(image|picture|pic|photo|illustration|drawing|painting|logo|wallpaper|artwork|poster)s?\b",
+    re.IGNORECASE,
+)
+_IMAGE_PREFIX_RE = re.compile(r"^\s*(image|picture|photo|illustration|drawing)\s+(of|showing)\b", re.IGNORECASE)
+# "draw a dragon ...": art verbs at the start of the message, followed by what to depict
+_IMAGE_VERB_RE = re.compile(
+    r"^\s*(please\s+)?(can you\s+|could you\s+)?(draw|paint|sketch|illustrate|render)\s+(me\s+)?(a|an|the|some|my)\b",
+    re.IGNORECASE,
+)
+# Follow-ups that revise the previous draft instead of asking for a new post.
+# Verbs like "update" or "add" also start new topics ("update on the Mars
+# mission"), so they only count as edits when they point at the draft or a
+# part of it; anything else goes on to the other rules and the model.
+_DRAFT_REF = (
+    r"(it|this|that|the (post|blog|article|draft|text|piece|content|wording)|"
+    r"((the|a|an|some|more|any) )?(intro|introduction|conclusion|title|headings?|subheadings?|summary|tl;?dr|"
+    r"sections?|paragraphs?|ending|examples?|typos?|grammar|tone|bullet points?|sources|references|citations|"
+    r"call to action|faq|keywords))\b"
+)
+_EDIT_RE = re.compile(
+    r"^\s*(please\s+)?(can you\s+|could you\s+)?("
+    r"make " + _DRAFT_REF + r"|"
+    r"(shorten|lengthen|expand|simplify|summari[sz]e|rewrite|rephrase|reword|translate|proofread|polish|fix|"
+    r"change|update|edit|revise|remove|delete|drop|add|include|replace|turn|tweak|improve)\b.{0,40}?\b" + _DRAFT_REF + r"|"
+    r"translate\s+(in)?to\b|"
+    # A bare editing verb or comparative is the whole message ("shorter please")
+    r"(shorten|lengthen|expand|simplify|summari[sz]e|rewrite|rephrase|reword|proofread|shorter|longer|simpler|"
+    r"(more|less) \w+)(\s+please)?[\s!.?]*$)",
+    re.IGNORECASE,
+)
+# Whole messages about the assistant itself; anything with a topic after it
+# ("can you help me understand kubernetes") is not small talk
+_ABOUT_ASSISTANT_RE = re.compile(
+    r"^\s*(what'?s your name|what is your name|who (made|built|created|trained) you|"
+    r"are (you|u) (a (bot|robot|human|person|real person)|an ai|human|real|there|still there)|"
+    r"tell me about yourself|what can you do( for me)?|can you help( me)?|how'?s your day( going)?|"
+    r"how is your day( going)?|how are you doing( today)?|lol|haha+|i'?m bored|i am bored|"
+    r"you'?re (awesome|great|amazing|the best)|you are (awesome|great|amazing|the best))[\s!.?,]*$",
+    re.IGNORECASE,
+)
+_BLOG_RE = re.compile(r"\b(blog|article|post|essay|write[- ]?up|write about|write a)\b", re.IGNORECASE)
+
+class IntentRouter:
+    """Cheap, deterministic classifier that runs in microseconds"""
+
+    def classify(self, text: str, has_draft: bool = False) -> RouteDecision:
+        stripped = text.strip()
+        if not stripped:
+            return RouteDecision(Intent.SMALL_TALK, 1.0, "empty input")
+        if _GREETING_RE.match(stripped) or _ABOUT_ASSISTANT_RE.match(stripped):
+            return RouteDecision(Intent.SMALL_TALK, 1.0, "small talk rule")
+        if has_draft and _EDIT_RE.match(stripped) and not _IMAGE_RE.search(stripped):
+            return RouteDecision(Intent.EDIT, 1.0, "edit rule")
+        if _BLOG_RE.search(stripped):
+            return RouteDecision(Intent.BLOG, 1.0, "blog keyword rule")
+        if _IMAGE_RE.search(stripped) or _IMAGE_PREFIX_RE.match(stripped) or _IMAGE_VERB_RE.match(stripped):
+            return RouteDecision(Intent.IMAGE, 1.0, "image request rule")
+        # No rule claims it: the full pipeline is always a correct (if slower) answer
+        return RouteDecision(Intent.BLOG, 0.5, "default")
+
+
+def image_prompt_from(text: str) -> str:
+    """Strip the request phrasing so only the image description is sent"""
+    prompt = re.sub(
+        r"^\s*(please\s+)?(can you\s+|could you\s+)?(generate|create|make|draw|paint|design|render|show me|give me)"
+        r"\s+(me\s+)?(an?\s+|the\s+)?(\w+\s+)?(image|picture|pic|photo|illustration|drawing|painting|artwork)s?\s+(of|showing)?\s*",
+        "",
+        text,
+        flags=re.IGNORECASE,
+    ).strip()
+    return prompt or text.strip()
@@ -0,0 +1,179 @@
+"""
+Long-form generation engine
+Outline first, then write the sections concurrently with shared research
+context, stitch them together and run a light coherence pass that only
+generates the transitions between sections.
+"""
+import asyncio
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+WORDS_PER_SECTION = 400
+MAX_PARALLEL_SECTIONS = int(os.getenv("LONGFORM_MAX_PARALLEL", "4"))
+# Upper bound on section calls per post, whatever the outline comes back with
+MAX_SECTIONS = int(os.getenv("LONGFORM_MAX_SECTIONS", "12"))
+
+
+@dataclass
+class OutlineSection:
+    heading: str
+    points: List[str] = field(default_factory=list)
+    words: int = WORDS_PER_SECTION
+
+
+@dataclass
+class Outline:
+    title: str
+    sections: List[OutlineSection]
+
+
+class LongFormWriter:
+    """
+    Writes long posts with bounded parallelism. Output tokens dominate latency,
+    so splitting the body across concurrent calls cuts wall-clock time roughly
+    by the parallelism factor.
+    """
+
+    def __init__(self, client: Any, model: str, max_parallel: int = MAX_PARALLEL_SECTIONS):
+        self.client = client
+        self.model = model
+        self.max_parallel = max(1, max_parallel)
+
+    async def write(self, topic: str, target_words: int, research: str = "") -> str:
+        outline = await self.build_outline(topic, target_words, research)
+        print(f"Long-form outline: {len(outline.sections)} sections for ~{target_words} words")
+
+        semaphore = asyncio.Semaphore(self.max_parallel)
+
+        async def bounded(index: int, section: OutlineSection) -> str:
+            async with semaphore:
+                return await self.write_section(topic, outline, index, section, research)
+
+        bodies = await asyncio.gather(*[bounded(i, s) for i, s in enumerate(outline.sections)])
+        transitions = await self.coherence_pass(outline, bodies)
+        return self.stitch(outline, bodies, transitions)
+
+    async def build_outline(self, topic: str, target_words: int, research: str) -> Outline:
+        num_sections = max(3, min(MAX_SECTIONS, round(target_words / WORDS_PER_SECTION)))
+        words_each = max(150, target_words // num_sections)
+        prompt = (
+            "You are planning a long-form blog post.\n"
+            f"Topic: {topic}\n"
+            f"Create an outline with a title and exactly {num_sections} sections. The first section is the "
+            "introduction and the last is the conclusion.\n"
+            "Return ONLY JSON of the form "
+            '{"title": "...", "sections": [{"heading": "...", "points": ["...", "..."]}]}\n'
+        )
+        if research:
+            prompt += f"\nResearch notes:\n{research[:6000]}\n"
+
+        raw = await self._complete(prompt)
+        outline = _parse_outline(raw, topic)
+        if not outline.sections:
+            outline = Outline(
+                title=topic,
+                sections=[OutlineSection(heading=f"Part {i + 1}") for i in range(num_sections)],
+            )
+        elif len(outline.sections) > num_sections:
+            # The model ignored the section count; keep the conclusion
+            outline.sections = outline.sections[:num_sections - 1] + outline.sections[-1:]
+        for section in outline.sections:
+            section.words = words_each
+        return outline
+
+    async def write_section(
+        self, topic: str, outline: Outline, index: int, section: OutlineSection, research: str
+    ) -> str:
+        headings = "\n".join(f"{i + 1}. {s.heading}" for i, s in enumerate(outline.sections))
+        points = "\n".join(f"- {p}" for p in section.points) or "- (use your judgement)"
+        prompt = (
+            f"You are writing one section of the blog post \"{outline.title}\" about {topic}.\n"
+            f"Full outline (for context only):\n{headings}\n\n"
+            f"Write ONLY section {index + 1}: \"{section.heading}\", approximately {section.words} words, "
+            "in markdown. Do not repeat the section heading and do not write other sections.\n"
+            f"Cover these points:\n{points}\n"
+        )
+        if research:
+            prompt += f"\nShared research notes:\n{research[:6000]}\n"
+        return (await self._complete(prompt)).strip()
+
+    async def coherence_pass(self, outline: Outline, bodies: List[str]) -> List[str]:
+        """
+        Ask for one short bridging sentence per section boundary instead of
+        rewriting the whole post, keeping the output small.
+        """
+        if len(bodies) < 2:
+            return []
+        boundaries = []
+        for i in range(len(bodies) - 1):
+            boundaries.append(
+                f"{i + 1}. End of \"{outline.sections[i].heading}\": {_last_sentence(bodies[i])}\n"
+                f"   Start of \"{outline.sections[i + 1].heading}\": {_first_sentence(bodies[i + 1])}"
+            )
+        prompt = (
+            "You are editing a blog post for flow. For each section boundary below, write ONE short "
+            "transition sentence that leads from the end of one section into the next.\n"
+            f"Return ONLY a JSON list of exactly {len(boundaries)} strings.\n\n" + "\n".join(boundaries)
+        )
+        try:
+            raw = await self._complete(prompt)
+            transitions = json.loads(_strip_code_fence(raw))
+            if isinstance(transitions, list) and len(transitions) == len(boundaries):
+                return [str(t).strip() for t in transitions]
+        except Exception as e:
+            print(f"Coherence pass skipped: {e}")
+        return []
+
+    def stitch(self, outline: Outline, bodies: List[str], transitions: List[str]) -> str:
+        parts = [f"# {outline.title}"]
+        for i, (section, body) in enumerate(zip(outline.sections, bodies)):
+            parts.append(f"## {section.heading}\n\n{body}")
+            if i < len(transitions) and transitions[i]:
+                parts.append(transitions[i])
+        return "\n\n".join(parts)
+
+    async def _complete(self, prompt: str) -> str:
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+        )
+        return response.choices[0].message.content or ""
+
+
+def _strip_code_fence(text: str) -> str:
+    text = text.strip()
+    match = re.match(r"^```(?:json)?\s*(.*?)\s*```$", text, re.DOTALL)
+    return match.group(1) if match else text
+
+
+def _parse_outline(raw: str, topic: str) -> Outline:
+    try:
+        data = json.loads(_strip_code_fence(raw))
+        sections = [
+            OutlineSection(
+                heading=str(s.get("heading", "")).strip() or f"Part {i + 1}",
+                points=[str(p) for p in s.get("points", [])],
+            )
+            for i, s in enumerate(data.get("sections", []))
+        ]
+        return Outline(title=str(data.get("title") or topic).strip(), sections=sections)
+    except (ValueError, AttributeError, TypeError):
+        # Fall back to markdown headings / numbered lines
+        headings = [
+            re.sub(r"^(#+|\d+[.)])\s*", "", line).strip()
+            for line in raw.splitlines()
+            if re.match(r"^(#+|\d+[.)])\s*\S", line.strip())
+        ]
+        return Outline(title=topic, sections=[OutlineSection(heading=h) for h in headings if h])
+
+
+def _first_sentence(text: str) -> str:
+    return re.split(r"(?<=[.!?])\s", text.strip(), maxsplit=1)[0][:300]
+
+
+def _last_sentence(text: str) -> str:
+    sentences = re.split(r"(?<=[.!?])\s", text.strip())
+    return sentences[-1][:300] if sentences else ""
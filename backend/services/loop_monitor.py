@@ -0,0 +1,82 @@
+"""
+Event-loop lag monitor
+A heartbeat coroutine wakes every LOOP_HEARTBEAT_MS and records how late it
+was woken (event_loop.lag_ms). A watchdog thread checks the last heartbeat;
+when the loop hasn't ticked for LOOP_BLOCK_THRESHOLD_MS it logs the loop
+thread's current stack, which is the sync call blocking it, once per stall.
+Both are cheap enough to stay on in production.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from backend.services.metrics import metrics
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR", "1") == "1"
+LOOP_HEARTBEAT_MS = float(os.getenv("LOOP_HEARTBEAT_MS", "50"))
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "250"))
+
+
+class EventLoopMonitor:
+    def __init__(
+        self,
+        heartbeat_ms: float = LOOP_HEARTBEAT_MS,
+        threshold_ms: float = LOOP_BLOCK_THRESHOLD_MS,
+    ):
+        self.heartbeat = heartbeat_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._stall_reported = False
+
+    def start(self):
+        """Call from inside the running loop (the app lifespan)"""
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._heartbeat_task = asyncio.create_task(self._beat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        print(f"Event-loop monitor on (heartbeat {self.heartbeat * 1000:.0f} ms, threshold {self.threshold * 1000:.0f} ms)")
+
+    async def stop(self):
+        self._stop.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join)
+
+    async def _beat(self):
+        while True:
+            expected = time.monotonic() + self.heartbeat
+            await asyncio.sleep(self.heartbeat)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            metrics.observe("event_loop.lag_ms", lag * 1000)
+            if self._stall_reported:
+                print(f"Event loop unblocked after {(now - self._last_beat) * 1000:.0f} ms")
+                self._stall_reported = False
+            self._last_beat = now
+
+    def _watch(self):
+        check_every = min(self.heartbeat, self.threshold / 2)
+        while not self._stop.wait(check_every):
+            stalled_for = time.monotonic() - self._last_beat - self.heartbeat
+            if stalled_for < self.threshold or self._stall_reported:
+                continue
+            self._stall_reported = True
+            metrics.incr("event_loop.blocked")
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "  (no frame)\n"
+            del frame
+            print(f"Event loop blocked for {stalled_for * 1000:.0f}+ ms, loop thread stack:\n{stack}", end="")
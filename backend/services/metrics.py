@@ -0,0 +1,80 @@
+"""
+In-process metrics
+Simple counters and latency summaries exposed through /api/metrics.
+"""
+import threading
+from collections import deque
+from typing import Callable, Dict, Any
+
+
+class Metrics:
+    """Thread-safe counters, value summaries and pull-based gauges"""
+
+    def __init__(self, window: int = 1024):
+        self._lock = threading.Lock()
+        self._window = window
+        self._counters: Dict[str, float] = {}
+        self._samples: Dict[str, deque] = {}
+        self._totals: Dict[str, list] = {}
+        self._gauges: Dict[str, Callable[[], Any]] = {}
+
+    def incr(self, name: str, value: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def counter(self, name: str) -> float:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def observe(self, name: str, value: float):
+        """Record one sample (e.g. a latency in ms or a byte count)"""
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self._window)
+                self._totals[name] = [0, 0.0]
+            samples.append(value)
+            self._totals[name][0] += 1
+            self._totals[name][1] += value
+
+    def register_gauge(self, name: str, fn: Callable[[], Any]):
+        """Register a callable that is evaluated every time a snapshot is taken"""
+        with self._lock:
+            self._gauges[name] = fn
+
+    def percentile(self, name: str, pct: float) -> float:
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return 0.0
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            summaries = {}
+            for name, samples in self._samples.items():
+                ordered = sorted(samples)
+                count, total = self._totals[name]
+                summaries[name] = {
+                    "count": count,
+                    "mean": total / count if count else 0.0,
+                    "p50": ordered[len(ordered) // 2] if ordered else 0.0,
+                    "p95": ordered[int(0.95 * (len(ordered) - 1))] if ordered else 0.0,
+                    "max": ordered[-1] if ordered else 0.0,
+                }
+            gauges = dict(self._gauges)
+
+        gauge_values = {}
+        for name, fn in gauges.items():
+            try:
+                gauge_values[name] = fn()
+            except Exception as e:
+                gauge_values[name] = f"error: {e}"
+
+        return {"counters": counters, "summaries": summaries, "gauges": gauge_values}
+
+
+# Global metrics registry
+metrics = Metrics()
@@ -0,0 +1,426 @@
+"""
+Model / API key pool
+Every chat completion is routed to the fastest healthy key/model pair. Keys
+and models come from configuration:
+
+    GEMINI_API_KEYS   comma separated keys (falls back to GEMINI_API_KEY)
+    GEMINI_MODELS     comma separated models, interchangeable for blog work;
+                      the first one is the primary (default gemini-2.5-flash)
+    GEMINI_BASE_URL   any OpenAI-compatible endpoint (a local fake server works)
+    GEMINI_KEY_RPM    optional per-key requests-per-minute budget
+
+With a shared store (multi-worker deployments) the per-key RPM buckets and
+429 cooldowns are shared by every worker, so N workers don't spend N times
+a key's budget.
+
+A 429 puts the key on cooldown (Retry-After when the server sends it), a 5xx
+or connection error cools the model down, and the call moves straight on to
+the next pair instead of sleeping. Per-model latency is tracked as an EWMA;
+models are health-probed through the same /models listing endpoint.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+import openai
+import httpx
+from openai import AsyncOpenAI
+
+from backend.services.metrics import metrics
+
+if TYPE_CHECKING:
+    from backend.services.shared_store import SharedStore
+
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/openai/"
+DEFAULT_MODEL = "gemini-2.5-flash"
+
+EWMA_ALPHA = float(os.getenv("MODEL_POOL_EWMA_ALPHA", "0.3"))
+KEY_COOLDOWN_SECONDS = float(os.getenv("MODEL_POOL_KEY_COOLDOWN_SECONDS", "20"))
+MODEL_COOLDOWN_SECONDS = float(os.getenv("MODEL_POOL_MODEL_COOLDOWN_SECONDS", "10"))
+# How long a call may wait for a cooled-down pair before giving up
+MAX_WAIT_SECONDS = float(os.getenv("MODEL_POOL_MAX_WAIT_SECONDS", "30"))
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("MODEL_POOL_REQUEST_TIMEOUT_SECONDS", "120"))
+
+
+class NoAvailableModelError(Exception):
+    """Every key/model pair is disabled or still cooling down"""
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+def _mask(key: str) -> str:
+    return f"{key[:6]}…{key[-4:]}" if len(key) > 12 else "…"
+
+
+@dataclass
+class KeyState:
+    key: str
+    client: AsyncOpenAI
+    rpm: int = 0
+    disabled: bool = False
+    cooldown_until: float = 0.0
+    consecutive_429s: int = 0
+    in_flight: int = 0
+    requests: int = 0
+    rate_limited: int = 0
+    recent: deque = field(default_factory=deque)
+
+    @property
+    def key_id(self) -> str:
+        """Stable, non-secret name for the key in the shared store"""
+        return hashlib.sha256(self.key.encode()).hexdigest()[:16]
+
+    def trim(self, now: float):
+        """Forget calls older than the one-minute window (also without an RPM limit)"""
+        while self.recent and now - self.recent[0] > 60:
+            self.recent.popleft()
+
+    def available(self, now: float) -> bool:
+        self.trim(now)
+        if self.disabled or now < self.cooldown_until:
+            return False
+        if self.rpm:
+            return len(self.recent) < self.rpm
+        return True
+
+    def next_available(self, now: float) -> float:
+        if self.disabled:
+            return float("inf")
+        ready = self.cooldown_until
+        if self.rpm and len(self.recent) >= self.rpm:
+            ready = max(ready, self.recent[0] + 60)
+        return max(ready, now)
+
+
+@dataclass
+class ModelState:
+    name: str
+    ewma_ms: Optional[float] = None
+    listed: bool = True
+    cooldown_until: float = 0.0
+    successes: int = 0
+    failures: int = 0
+
+    def available(self, now: float) -> bool:
+        return self.listed and now >= self.cooldown_until
+
+
+class ModelPool:
+    def __init__(
+        self,
+        api_keys: List[str],
+        models: List[str],
+        base_url: str = DEFAULT_BASE_URL,
+        key_rpm: int = 0,
+        request_timeout: float = REQUEST_TIMEOUT_SECONDS,
+        http_client: Optional[httpx.AsyncClient] = None,
+        store: Optional["SharedStore"] = None,
+    ):
+        if not models:
+            raise ValueError("ModelPool needs at least one model")
+        self.base_url = base_url
+        # Shared keep-alive connection pool; owned (and closed) by the caller
+        self.http_client = http_client
+        self.store = store
+        self.models: Dict[str, ModelState] = {name: ModelState(name) for name in models}
+        self.primary_model = models[0]
+        # Models requested by name that aren't interchangeable pool members
+        self._extra_models: Dict[str, ModelState] = {}
+        # max_retries=0: the pool does its own failover instead of the SDK's backoff
+        self.keys: List[KeyState] = [
+            KeyState(
+                key=key,
+                client=AsyncOpenAI(
+                    api_key=key,
+                    base_url=base_url,
+                    max_retries=0,
+                    timeout=request_timeout,
+                    http_client=http_client,
+                ),
+                rpm=key_rpm,
+            )
+            for key in (api_keys or [""])
+        ]
+        self._lock = threading.Lock()
+        metrics.register_gauge("model_pool", self.snapshot)
+
+    @classmethod
+    def from_env(cls, http_client: Optional[httpx.AsyncClient] = None, store: Optional["SharedStore"] = None) -> "ModelPool":
+        keys = _split(os.getenv("GEMINI_API_KEYS")) or _split(os.getenv("GEMINI_API_KEY"))
+        models = _split(os.getenv("GEMINI_MODELS")) or [DEFAULT_MODEL]
+        return cls(
+            api_keys=keys,
+            models=models,
+            base_url=os.getenv("GEMINI_BASE_URL", DEFAULT_BASE_URL),
+            key_rpm=int(os.getenv("GEMINI_KEY_RPM", "0")),
+            http_client=http_client,
+            store=store,
+        )
+
+    # Routing
+
+    def _candidates(self, requested: Optional[str]) -> Tuple[List[Tuple[KeyState, ModelState]], float]:
+        """
+        Available pairs, fastest model first and least loaded key first.
+        A request for a pool model may be served by any pool model; a model
+        outside the pool (e.g. the small-talk model) is only routed across keys.
+        Also returns when the next unavailable pair frees up.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if requested and requested not in self.models:
+                model_states = [self._extra_models.setdefault(requested, ModelState(requested))]
+            else:
+                model_states = list(self.models.values())
+
+            def speed(state: ModelState) -> float:
+                # Unmeasured models go first so each one gets a latency sample
+                return -1.0 if state.ewma_ms is None else state.ewma_ms
+
+            model_states.sort(key=lambda m: (speed(m), m.name != requested))
+            keys = sorted(self.keys, key=lambda k: (k.in_flight, len(k.recent), k.requests))
+
+            pairs = []
+            next_ready = float("inf")
+            for model in model_states:
+                for key in keys:
+                    if model.available(now) and key.available(now):
+                        pairs.append((key, model))
+                    elif model.listed:
+                        next_ready = min(next_ready, max(model.cooldown_until, key.next_available(now)))
+        return pairs, next_ready - now
+
+    def has_spare_capacity(self, headroom: float = 0.5) -> bool:
+        """
+        True when some key is idle here and, if it has an RPM limit, has used
+        less than `headroom` of this minute's budget across all workers.
+        Background work checks this so it only spends what nobody is using.
+        Blocking when there is a shared store.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if not any(model.available(now) for model in self.models.values()):
+                return False
+            keys = [key for key in self.keys if key.available(now) and not key.in_flight]
+        for key in keys:
+            if not key.rpm:
+                return True
+            used = self.store.used(f"model_key:{key.key_id}", 60) if self.store is not None else len(key.recent)
+            if used < key.rpm * headroom:
+                return True
+        return False
+
+    async def create(self, **kwargs) -> Any:
+        """chat.completions.create routed through the pool with failover"""
+        requested = kwargs.get("model")
+        deadline = time.monotonic() + MAX_WAIT_SECONDS
+        last_error: Optional[BaseException] = None
+        if self.store is not None:
+            await asyncio.to_thread(self._apply_shared_cooldowns)
+
+        while True:
+            pairs, wait = self._candidates(requested)
+            for key, model in pairs:
+                now = time.monotonic()
+                if not (key.available(now) and model.available(now)):
+                    continue  # cooled down by an earlier failure in this round
+                if self.store is not None and key.rpm and not await asyncio.to_thread(self._take_shared_slot, key):
+                    continue
+                try:
+                    return await self._call(key, model, kwargs)
+                except openai.APIStatusError as e:
+                    last_error = e
+                    if not self._handle_status_error(key, model, e):
+                        raise
+                    if e.status_code == 429 and self.store is not None:
+                        await asyncio.to_thread(self._publish_cooldown, key)
+                except (openai.APIConnectionError, asyncio.TimeoutError) as e:
+                    last_error = e
+                    self._cool_model(model, f"connection error: {e}")
+                metrics.incr("model_pool.failovers")
+
+            remaining = deadline - time.monotonic()
+            if wait == float("inf") or wait > remaining:
+                if last_error is not None:
+                    raise last_error
+                raise NoAvailableModelError("No healthy key/model pair available")
+            metrics.incr("model_pool.waits")
+            await asyncio.sleep(max(wait, 0.05))
+
+    async def _call(self, key: KeyState, model: ModelState, kwargs: Dict[str, Any]) -> Any:
+        with self._lock:
+            key.in_flight += 1
+            key.requests += 1
+            now = time.monotonic()
+            key.trim(now)
+            key.recent.append(now)
+        start = time.perf_counter()
+        try:
+            response = await key.client.chat.completions.create(**{**kwargs, "model": model.name})
+        finally:
+            with self._lock:
+                key.in_flight -= 1
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            model.ewma_ms = elapsed_ms if model.ewma_ms is None else (
+                EWMA_ALPHA * elapsed_ms + (1 - EWMA_ALPHA) * model.ewma_ms
+            )
+            model.successes += 1
+            key.consecutive_429s = 0
+        metrics.observe(f"model_pool.{model.name}.latency_ms", elapsed_ms)
+        return response
+
+    def _handle_status_error(self, key: KeyState, model: ModelState, error: "openai.APIStatusError") -> bool:
+        """Update health for a failed call; False means the error is the caller's to see"""
+        status = error.status_code
+        if status == 429:
+            with self._lock:
+                key.rate_limited += 1
+                key.consecutive_429s += 1
+                retry_after = _retry_after(error)
+                cooldown = retry_after or KEY_COOLDOWN_SECONDS * (2 ** min(key.consecutive_429s - 1, 4))
+                key.cooldown_until = time.monotonic() + cooldown
+            metrics.incr("model_pool.rate_limited")
+            print(f"Model pool: key {_mask(key.key)} rate limited, cooling down for {cooldown:.0f}s")
+            return True
+        if status in (401, 403):
+            with self._lock:
+                key.disabled = True
+            print(f"Model pool: key {_mask(key.key)} rejected ({status}), disabled")
+            return True
+        if status == 404 and model.name in self.models:
+            with self._lock:
+                model.listed = False
+            print(f"Model pool: model {model.name} not found, disabled until the next probe")
+            return True
+        if status >= 500:
+            self._cool_model(model, f"HTTP {status}")
+            return True
+        return False
+
+    def _publish_cooldown(self, key: KeyState):
+        """Blocking: share a key's 429 cooldown with the other workers"""
+        cooldown = key.cooldown_until - time.monotonic()
+        if cooldown > 0:
+            self.store.set(f"model_key_cooldown:{key.key_id}", str(time.time() + cooldown).encode(), ttl=cooldown)
+
+    def _take_shared_slot(self, key: KeyState) -> bool:
+        """Blocking: count the call against the key's RPM bucket shared by all workers"""
+        if self.store is None or not key.rpm:
+            return True
+        if self.store.allow(f"model_key:{key.key_id}", key.rpm, 60):
+            return True
+        with self._lock:
+            # Other workers spent this minute's budget: wait for the next window
+            key.cooldown_until = time.monotonic() + (60 - time.time() % 60)
+        metrics.incr("model_pool.shared_rpm_exhausted")
+        return False
+
+    def _apply_shared_cooldowns(self):
+        """Blocking: pick up 429 cooldowns other workers recorded for our keys"""
+        if self.store is None:
+            return
+        cooldowns = self.store.scan("model_key_cooldown:")
+        if not cooldowns:
+            return
+        now, wall = time.monotonic(), time.time()
+        with self._lock:
+            for key in self.keys:
+                until = cooldowns.get(f"model_key_cooldown:{key.key_id}")
+                if until is not None:
+                    key.cooldown_until = max(key.cooldown_until, now + float(until) - wall)
+
+    def _cool_model(self, model: ModelState, reason: str):
+        with self._lock:
+            model.failures += 1
+            model.cooldown_until = time.monotonic() + MODEL_COOLDOWN_SECONDS
+        metrics.incr("model_pool.model_errors")
+        print(f"Model pool: model {model.name} cooling down after {reason}")
+
+    # Health
+
+    async def probe(self) -> Dict[str, Any]:
+        """
+        List models with every key. Keys that are rejected are disabled,
+        configured models missing from every listing are taken out of rotation.
+        Returns the listing per (masked) key.
+        """
+        listings: Dict[str, Any] = {}
+        seen = set()
+
+        async def probe_key(state: KeyState):
+            try:
+                page = await state.client.models.list()
+                names = sorted(m.id.split("/", 1)[-1] for m in page.data)
+                with self._lock:
+                    state.disabled = False
+                seen.update(names)
+                listings[_mask(state.key)] = names
+            except openai.APIStatusError as e:
+                if e.status_code in (401, 403):
+                    with self._lock:
+                        state.disabled = True
+                listings[_mask(state.key)] = f"error: HTTP {e.status_code}"
+            except Exception as e:
+                listings[_mask(state.key)] = f"error: {e}"
+
+        await asyncio.gather(*(probe_key(state) for state in self.keys))
+        if seen:
+            with self._lock:
+                for model in self.models.values():
+                    model.listed = model.name in seen
+                    if not model.listed:
+                        print(f"Model pool: configured model {model.name} is not listed by the API")
+        metrics.incr("model_pool.probes")
+        return listings
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "keys": [
+                    {
+                        "key": _mask(k.key),
+                        "available": k.available(now),
+                        "disabled": k.disabled,
+                        "cooldown_seconds": round(max(0.0, k.cooldown_until - now), 1),
+                        "in_flight": k.in_flight,
+                        "requests": k.requests,
+                        "rate_limited": k.rate_limited,
+                    }
+                    for k in self.keys
+                ],
+                "models": [
+                    {
+                        "model": m.name,
+                        "available": m.available(now),
+                        "listed": m.listed,
+                        "ewma_ms": round(m.ewma_ms, 1) if m.ewma_ms is not None else None,
+                        "successes": m.successes,
+                        "failures": m.failures,
+                    }
+                    for m in [*self.models.values(), *self._extra_models.values()]
+                ],
+            }
+
+    async def aclose(self):
+        if self.http_client is not None:
+            return  # closing a client would close the shared connection pool
+        for state in self.keys:
+            await state.client.close()
+
+
+def _retry_after(error: "openai.APIStatusError") -> Optional[float]:
+    try:
+        value = error.response.headers.get("retry-after")
+        return float(value) if value else None
+    except (AttributeError, ValueError):
+        return None
+
@@ -0,0 +1,369 @@
+"""
+Bounded concurrent page fetcher for deep research
+Search results only carry a short snippet. With DEEP_RESEARCH=1 the agent
+also fetches the top result pages and hands it their main text. Fetches share
+one pooled aiohttp session and are bounded everywhere:
+
+    PAGE_FETCH_CONCURRENCY     pages fetched at once (default 8)
+    PAGE_FETCH_PER_HOST        connections per host (default 2)
+    PAGE_FETCH_TIMEOUT         total seconds per page (default 6)
+    PAGE_FETCH_MAX_BYTES       bytes read per page before giving up on the rest (default 512 KiB)
+    PAGE_EXTRACT_MAX_CHARS     characters of text kept per page (default 4000)
+    PAGE_CACHE_SIZE / PAGE_CACHE_TTL_SECONDS   extract cache by URL (default 512 / 6 h)
+
+The body is decoded and fed to an HTMLParser chunk by chunk as it arrives,
+so a page is never buffered whole and reading stops as soon as enough text
+has been extracted.
+
+Result URLs come from the web, so only http(s) is fetched and every hop
+(redirects are followed by hand) must go to a public address: IP literals
+are checked before connecting and host names through a resolver that
+refuses private, loopback, link-local and reserved addresses. Set
+PAGE_FETCH_ALLOW_PRIVATE=1 to lift that (local fixtures only).
+"""
+import asyncio
+import codecs
+import ipaddress
+import os
+import socket
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import DefaultResolver
+from yarl import URL
+
+from backend.services.metrics import metrics
+from backend.services.singleflight import SingleFlight
+
+DEEP_RESEARCH_ENABLED = os.getenv("DEEP_RESEARCH", "0") == "1"
+DEEP_RESEARCH_PAGES = int(os.getenv("DEEP_RESEARCH_PAGES", "3"))
+PAGE_FETCH_CONCURRENCY = int(os.getenv("PAGE_FETCH_CONCURRENCY", "8"))
+PAGE_FETCH_PER_HOST = int(os.getenv("PAGE_FETCH_PER_HOST", "2"))
+PAGE_FETCH_TIMEOUT = float(os.getenv("PAGE_FETCH_TIMEOUT", "6"))
+PAGE_FETCH_MAX_BYTES = int(os.getenv("PAGE_FETCH_MAX_BYTES", str(512 * 1024)))
+PAGE_EXTRACT_MAX_CHARS = int(os.getenv("PAGE_EXTRACT_MAX_CHARS", "4000"))
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", "512"))
+PAGE_CACHE_TTL_SECONDS = float(os.getenv("PAGE_CACHE_TTL_SECONDS", str(6 * 3600)))
+# Failed URLs are not retried for this long
+PAGE_FAILURE_TTL_SECONDS = 300
+PAGE_FETCH_ALLOW_PRIVATE = os.getenv("PAGE_FETCH_ALLOW_PRIVATE", "0") == "1"
+MAX_REDIRECTS = 3
+_REDIRECT_STATUSES = frozenset({301, 302, 303, 307, 308})
+READ_CHUNK_BYTES = 16 * 1024
+USER_AGENT = "Mozilla/5.0 (compatible; AIBlogAgent/1.0; research fetcher)"
+
+_SKIPPED_TAGS = frozenset({"script", "style", "noscript", "svg", "nav", "header", "footer", "aside", "form", "iframe", "button", "select", "template"})
+_BLOCK_TAGS = frozenset({"p", "h1", "h2", "h3", "h4", "li", "blockquote", "pre", "td", "article", "section", "div", "br"})
+_VOID_TAGS = frozenset({"br", "img", "hr", "input", "meta", "link", "source", "wbr", "area", "base", "col", "embed", "track"})
+# Shorter blocks are mostly menus, buttons and bylines
+MIN_BLOCK_CHARS = 40
+
+
+class BlockedAddressError(ValueError):
+    """The URL is not http(s) or points at a non-public address"""
+
+
+def _is_public(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not (ip.is_multicast or ip.is_reserved)
+
+
+def check_url(url: URL):
+    """Reject non-http(s) URLs and IP literals that aren't public (names are checked on resolve)"""
+    if url.scheme not in ("http", "https") or not url.host:
+        raise BlockedAddressError(f"unsupported URL {url}")
+    try:
+        ipaddress.ip_address(url.host.split("%", 1)[0])
+    except ValueError:
+        return
+    if not _is_public(url.host):
+        raise BlockedAddressError(f"{url.host} is not a public address")
+
+
+class PublicResolver(AbstractResolver):
+    """DNS resolver that refuses names with any non-public address, checked at connect time"""
+
+    def __init__(self, resolver: Optional[AbstractResolver] = None):
+        self._resolver = resolver or DefaultResolver()
+
+    async def resolve(self, host: str, port: int = 0, family: socket.AddressFamily = socket.AF_INET):
+        hosts = await self._resolver.resolve(host, port, family)
+        if not hosts or not all(_is_public(h["host"]) for h in hosts):
+            metrics.incr("page_fetch.blocked")
+            raise BlockedAddressError(f"{host} resolves to a non-public address")
+        return hosts
+
+    async def close(self):
+        await self._resolver.close()
+
+
+class MainTextExtractor(HTMLParser):
+    """
+    Incremental main-text extraction: text outside boilerplate elements is
+    collected per block, and blocks that look like prose (or headings) are
+    kept until the character budget is reached.
+    """
+
+    def __init__(self, max_chars: int = PAGE_EXTRACT_MAX_CHARS):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.title = ""
+        self.blocks: List[str] = []
+        self.chars = 0
+        self._skip_depth = 0
+        self._in_title = False
+        self._heading = False
+        self._current: List[str] = []
+
+    @property
+    def full(self) -> bool:
+        return self.chars >= self.max_chars
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIPPED_TAGS:
+            if tag not in _VOID_TAGS:
+                self._skip_depth += 1
+            return
+        if tag == "title":
+            self._in_title = True
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+            self._heading = tag in ("h1", "h2", "h3", "h4")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == "title":
+            self._in_title = False
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title = (self.title + data).strip()[:300]
+        elif not self._skip_depth and not self.full:
+            self._current.append(data)
+
+    def _flush(self):
+        text = " ".join("".join(self._current).split())
+        self._current = []
+        heading, self._heading = self._heading, False
+        if not text or self.full:
+            return
+        if len(text) >= MIN_BLOCK_CHARS or (heading and len(text) >= 3):
+            text = f"## {text}" if heading else text
+            self.blocks.append(text[: self.max_chars - self.chars])
+            self.chars += len(self.blocks[-1])
+
+    def text(self) -> str:
+        self._flush()
+        return "\n".join(self.blocks)
+
+
+@dataclass
+class PageExtract:
+    url: str
+    title: str
+    text: str
+    bytes_read: int
+    truncated: bool
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class _ExtractCache:
+    """Small TTL + LRU cache of extracts by URL (failures cached as None)"""
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self._items: "OrderedDict[str, Tuple[float, Optional[PageExtract]]]" = OrderedDict()
+
+    def get(self, url: str) -> Tuple[bool, Optional[PageExtract]]:
+        item = self._items.get(url)
+        if item is None:
+            return False, None
+        expires, extract = item
+        if expires < time.monotonic():
+            del self._items[url]
+            return False, None
+        self._items.move_to_end(url)
+        return True, extract
+
+    def put(self, url: str, extract: Optional[PageExtract]):
+        ttl = self.ttl if extract is not None else min(self.ttl, PAGE_FAILURE_TTL_SECONDS)
+        self._items[url] = (time.monotonic() + ttl, extract)
+        self._items.move_to_end(url)
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class PageFetcher:
+    def __init__(
+        self,
+        concurrency: int = PAGE_FETCH_CONCURRENCY,
+        per_host: int = PAGE_FETCH_PER_HOST,
+        timeout: float = PAGE_FETCH_TIMEOUT,
+        max_bytes: int = PAGE_FETCH_MAX_BYTES,
+        max_chars: int = PAGE_EXTRACT_MAX_CHARS,
+        cache_size: int = PAGE_CACHE_SIZE,
+        cache_ttl: float = PAGE_CACHE_TTL_SECONDS,
+        allow_private: bool = PAGE_FETCH_ALLOW_PRIVATE,
+    ):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        self.allow_private = allow_private
+        self.cache = _ExtractCache(cache_size, cache_ttl)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # Concurrent research runs asking for the same page share one download
+        self._inflight = SingleFlight("page_fetch")
+        metrics.register_gauge("page_fetch.cache_size", lambda: len(self.cache))
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Created lazily so it binds to the running loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.concurrency,
+                limit_per_host=self.per_host,
+                ttl_dns_cache=300,
+                resolver=None if self.allow_private else PublicResolver(),
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout, sock_connect=min(3.0, self.timeout)),
+                headers={"User-Agent": USER_AGENT, "Accept": "text/html,application/xhtml+xml,text/plain;q=0.8"},
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    async def fetch(self, url: str) -> Optional[PageExtract]:
+        """Main text of one page, or None if it can't be fetched or isn't HTML/text"""
+        if urlsplit(url).scheme not in ("http", "https"):
+            return None
+        hit, extract = self.cache.get(url)
+        if hit:
+            metrics.incr("page_fetch.cache_hits")
+            return extract
+        return await self._inflight.do(url, lambda: self._fetch_and_cache(url))
+
+    async def fetch_many(self, urls: List[str]) -> Dict[str, PageExtract]:
+        """Fetch pages concurrently; extracts by requested URL, failed or empty pages left out"""
+        unique = list(dict.fromkeys(u for u in urls if u))
+        extracts = await asyncio.gather(*(self.fetch(url) for url in unique))
+        return {url: e for url, e in zip(unique, extracts) if e is not None and e.text}
+
+    async def _fetch_and_cache(self, url: str) -> Optional[PageExtract]:
+        session = self._get_session()
+        start = time.perf_counter()
+        try:
+            async with self._semaphore:
+                extract = await self._download(session, url)
+            metrics.incr("page_fetch.pages")
+            metrics.observe("page_fetch.ms", (time.perf_counter() - start) * 1000)
+            metrics.observe("page_fetch.bytes", extract.bytes_read)
+        except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeError, ValueError) as e:
+            metrics.incr("page_fetch.errors")
+            print(f"Page fetch failed for {url}: {e!r}")
+            extract = None
+        self.cache.put(url, extract)
+        return extract
+
+    async def _download(self, session: aiohttp.ClientSession, url: str) -> PageExtract:
+        target = URL(url)
+        for _ in range(MAX_REDIRECTS + 1):
+            if not self.allow_private:
+                try:
+                    check_url(target)
+                except BlockedAddressError:
+                    metrics.incr("page_fetch.blocked")
+                    raise
+            async with session.get(target, allow_redirects=False) as resp:
+                if resp.status in _REDIRECT_STATUSES:
+                    location = resp.headers.get("Location")
+                    if not location:
+                        raise ValueError(f"HTTP {resp.status} without a Location")
+                    target = resp.url.join(URL(location))
+                    continue
+                return await self._extract(resp)
+        raise ValueError(f"more than {MAX_REDIRECTS} redirects")
+
+    async def _extract(self, resp: aiohttp.ClientResponse) -> PageExtract:
+        if resp.status != 200:
+            raise ValueError(f"HTTP {resp.status}")
+        content_type = resp.headers.get("Content-Type", "text/html").lower()
+        if "html" not in content_type and "text/plain" not in content_type:
+            raise ValueError(f"unsupported content type {content_type}")
+        if resp.content_length and resp.content_length > self.max_bytes * 20:
+            raise ValueError(f"page too large ({resp.content_length} bytes)")
+
+        decoder = codecs.getincrementaldecoder(_charset(resp) or "utf-8")(errors="replace")
+        extractor = MainTextExtractor(self.max_chars)
+        plain = "html" not in content_type
+        read = 0
+        truncated = False
+        async for chunk in resp.content.iter_chunked(READ_CHUNK_BYTES):
+            read += len(chunk)
+            text = decoder.decode(chunk)
+            if plain:
+                extractor.blocks.append(text)
+                extractor.chars += len(text)
+            else:
+                extractor.feed(text)
+            if extractor.full or read >= self.max_bytes:
+                # Enough text, or the cap: stop reading and drop the connection
+                truncated = True
+                metrics.incr("page_fetch.truncated")
+                break
+        if not truncated:
+            extractor.feed(decoder.decode(b"", final=True))
+        extractor.close()
+        text = extractor.text()[: self.max_chars]
+        return PageExtract(url=str(resp.url), title=extractor.title, text=text, bytes_read=read, truncated=truncated)
+
+    async def aclose(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+def _charset(resp: aiohttp.ClientResponse) -> Optional[str]:
+    charset = resp.charset
+    if not charset:
+        return None
+    try:
+        codecs.lookup(charset)
+        return charset
+    except LookupError:
+        return None
+
+
+def format_research(results: List[Dict], extracts: Dict[str, PageExtract]) -> str:
+    """Research text for the model: page extracts where fetched, snippets elsewhere"""
+    sections = []
+    for result in results:
+        extract = extracts.get(result.get("link", ""))
+        if extract is not None:
+            sections.append(f"Source: {result['title']} ({result['link']})\n{extract.text}")
+        else:
+            sections.append(f"Source: {result['title']}\n{result['snippet']}")
+    return "\n\n".join(sections)
@@ -0,0 +1,262 @@
+"""
+Idle-time prefetch of trending topics
+Topics asked for in the last day are counted from chat titles and blog
+topics (one vote per chat). When the host has been quiet for
+PREFETCH_IDLE_SECONDS, the scheduler warms the shared search cache for the
+top topics and, with PREFETCH_GENERATE=1, pre-generates drafts (text and
+featured image) that a new chat on the same topic picks up instead of
+running the pipeline.
+
+    PREFETCH_INTERVAL_SECONDS           how often a pass is attempted (0 disables)
+    PREFETCH_IDLE_SECONDS               quiet time required before a pass
+    PREFETCH_TOP_N                      topics warmed per pass
+    PREFETCH_SEARCH_BUDGET_PER_HOUR     searches the prefetcher may spend
+    PREFETCH_GENERATE                   also pre-generate drafts (off by default)
+    PREFETCH_GENERATE_TOP_N             topics pre-generated per pass
+    PREFETCH_GENERATION_BUDGET_PER_DAY  drafts the prefetcher may generate
+
+Every interactive generation request is recorded in the shared store; a
+pass checks it between and during every step and stops as soon as one
+arrives: a draft in flight is cancelled, a search is left to finish. Drafts are only generated while the model
+pool has spare rate-limit capacity. Prefetched items are marked in the
+store, and the first request to use one counts as a hit (prefetch_stats()).
+The store-side helpers the request path uses live in prefetch_state, so
+the search service and agent don't depend on this module.
+"""
+import asyncio
+import os
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+import orjson
+
+from backend.database.database import SessionLocal
+from backend.models.models import Blog, Chat
+from backend.services.image_gc import IMAGE_GC_MIN_AGE_SECONDS
+from backend.services.intent_router import Intent, IntentRouter
+from backend.services.metrics import metrics
+from backend.services.prefetch_state import draft_key, last_interactive, mark_prefetched, prefetch_stats
+from backend.services.shared_store import SharedStore
+from backend.services.singleflight import normalize_topic
+
+if TYPE_CHECKING:
+    from backend.services.ai_agent import GeminiAgent
+    from backend.services.search_service import WebSearchService
+
+PREFETCH_INTERVAL_SECONDS = int(os.getenv("PREFETCH_INTERVAL_SECONDS", "600"))
+PREFETCH_IDLE_SECONDS = float(os.getenv("PREFETCH_IDLE_SECONDS", "120"))
+PREFETCH_LOOKBACK_HOURS = float(os.getenv("PREFETCH_LOOKBACK_HOURS", "24"))
+PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", "10"))
+# Topics asked for only once are not worth prefetching
+PREFETCH_MIN_COUNT = int(os.getenv("PREFETCH_MIN_COUNT", "2"))
+PREFETCH_SEARCH_BUDGET_PER_HOUR = int(os.getenv("PREFETCH_SEARCH_BUDGET_PER_HOUR", "30"))
+PREFETCH_GENERATE = os.getenv("PREFETCH_GENERATE", "0") == "1"
+PREFETCH_GENERATE_TOP_N = int(os.getenv("PREFETCH_GENERATE_TOP_N", "3"))
+PREFETCH_GENERATION_BUDGET_PER_DAY = int(os.getenv("PREFETCH_GENERATION_BUDGET_PER_DAY", "10"))
+# Unclaimed drafts expire well before the image GC may delete their images
+PREFETCH_DRAFT_TTL_SECONDS = min(float(os.getenv("PREFETCH_DRAFT_TTL_SECONDS", "1800")), IMAGE_GC_MIN_AGE_SECONDS / 2)
+PREFETCH_YIELD_POLL_SECONDS = 0.25
+# Rows read per source when mining topics
+PREFETCH_MAX_ROWS = 20000
+
+
+class PrefetchYielded(Exception):
+    """Interactive traffic arrived during a pass"""
+
+
+class PrefetchBudgetExhausted(Exception):
+    """The prefetcher spent its budget for the current window"""
+
+
+# Topic mining
+
+def trending_topics(
+    lookback_hours: float = PREFETCH_LOOKBACK_HOURS,
+    limit: int = PREFETCH_TOP_N,
+    min_count: int = PREFETCH_MIN_COUNT,
+) -> List[Tuple[str, int]]:
+    """
+    Most requested topics of the lookback window as (topic, chats). A chat
+    and the blog generated in it count once; the most recent wording wins.
+    """
+    since = datetime.utcnow() - timedelta(hours=lookback_hours)
+    with SessionLocal() as db:
+        chats = (
+            db.query(Chat.id, Chat.title)
+            .filter(Chat.created_at >= since)
+            .order_by(Chat.id.desc())
+            .limit(PREFETCH_MAX_ROWS)
+            .all()
+        )
+        blogs = (
+            db.query(Blog.chat_id, Blog.topic)
+            .filter(Blog.timestamp >= since)
+            .order_by(Blog.id.desc())
+            .limit(PREFETCH_MAX_ROWS)
+            .all()
+        )
+
+    seen = set()
+    counts: Counter = Counter()
+    wording: Dict[str, str] = {}
+    for chat_id, text in list(chats) + list(blogs):
+        normalized = normalize_topic(text or "")
+        if not normalized or (chat_id, normalized) in seen:
+            continue
+        seen.add((chat_id, normalized))
+        counts[normalized] += 1
+        wording.setdefault(normalized, text.strip())
+    return [(wording[topic], n) for topic, n in counts.most_common() if n >= min_count][:limit]
+
+
+class PrefetchScheduler:
+    def __init__(
+        self,
+        store: SharedStore,
+        search_service: "WebSearchService",
+        agent_factory: Optional[Callable[[], "GeminiAgent"]] = None,
+        generate: bool = PREFETCH_GENERATE,
+        idle_seconds: float = PREFETCH_IDLE_SECONDS,
+        top_n: int = PREFETCH_TOP_N,
+        generate_top_n: int = PREFETCH_GENERATE_TOP_N,
+        search_budget_per_hour: int = PREFETCH_SEARCH_BUDGET_PER_HOUR,
+        generation_budget_per_day: int = PREFETCH_GENERATION_BUDGET_PER_DAY,
+    ):
+        self.store = store
+        self.search_service = search_service
+        # The agent is only built if drafts are generated
+        self.agent_factory = agent_factory
+        self.generate = generate and agent_factory is not None
+        self.idle_seconds = idle_seconds
+        self.top_n = top_n
+        self.generate_top_n = generate_top_n
+        self.search_budget_per_hour = search_budget_per_hour
+        self.generation_budget_per_day = generation_budget_per_day
+        self.intent_router = IntentRouter()
+        # Steps left running after a yield (kept referenced until they finish)
+        self._detached: set = set()
+        metrics.register_gauge("prefetch", lambda: prefetch_stats(store))
+
+    async def _last_interactive(self) -> float:
+        return await asyncio.to_thread(last_interactive, self.store)
+
+    async def is_off_peak(self) -> bool:
+        return time.time() - await self._last_interactive() >= self.idle_seconds
+
+    async def run_once(self, force: bool = False) -> Dict[str, Any]:
+        """
+        One pass over the trending topics. force skips the quiet-time check
+        (admin endpoint); the pass still yields to interactive traffic.
+        """
+        stats: Dict[str, Any] = {"topics": [], "searches": 0, "drafts": 0, "stopped": None}
+        if not force and not await self.is_off_peak():
+            stats["stopped"] = "busy"
+            return stats
+
+        started = time.time()
+        topics = await asyncio.to_thread(trending_topics, limit=self.top_n)
+        # Small talk and image requests never reach the search or the pipeline
+        topics = [(topic, n) for topic, n in topics if self.intent_router.classify(topic).intent == Intent.BLOG]
+        stats["topics"] = [{"topic": topic, "chats": n} for topic, n in topics]
+        try:
+            for topic, _ in topics:
+                stats["searches"] += await self._warm_search(topic, started)
+            if self.generate:
+                for topic, _ in topics[:self.generate_top_n]:
+                    stats["drafts"] += await self._pregenerate(topic, started)
+        except PrefetchYielded:
+            stats["stopped"] = "yielded"
+            await asyncio.to_thread(self.store.incr, "prefetch:stats:yielded")
+            metrics.incr("prefetch.yielded")
+        except PrefetchBudgetExhausted as e:
+            stats["stopped"] = str(e)
+            metrics.incr("prefetch.budget_exhausted")
+        metrics.observe("prefetch.pass_ms", (time.time() - started) * 1000)
+        return stats
+
+    async def _step(self, coro, started: float, cancel: bool = True):
+        """
+        Run one unit of work and stop waiting for it as soon as interactive
+        traffic shows up. With cancel=False the work is left to finish in
+        the background and its result is dropped.
+        """
+        task = asyncio.ensure_future(coro)
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=PREFETCH_YIELD_POLL_SECONDS)
+                if done:
+                    return task.result()
+                if await self._last_interactive() > started:
+                    raise PrefetchYielded()
+        finally:
+            if not task.done():
+                if cancel:
+                    task.cancel()
+                else:
+                    self._detached.add(task)
+                    task.add_done_callback(self._forget)
+
+    def _forget(self, task: asyncio.Task):
+        self._detached.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Prefetch: background step failed: {task.exception()!r}")
+
+    async def _check_yield(self, started: float):
+        if await self._last_interactive() > started:
+            raise PrefetchYielded()
+
+    async def _warm_search(self, topic: str, started: float) -> int:
+        """Search the research queries of a topic that aren't cached yet"""
+        searches = 0
+        for query in self.search_service.research_queries(topic):
+            if await asyncio.to_thread(self.search_service.is_cached, query):
+                continue
+            await self._check_yield(started)
+            if not await asyncio.to_thread(self.store.allow, "prefetch:searches", self.search_budget_per_hour, 3600):
+                raise PrefetchBudgetExhausted("search budget")
+            # A search is short and runs under the search breaker: let it
+            # finish rather than cancel it mid-call
+            await self._step(
+                self.search_service.search_topic(query, self.search_service.RESULTS_PER_QUERY), started, cancel=False
+            )
+            searches += 1
+            if await asyncio.to_thread(self.search_service.is_cached, query):
+                await asyncio.to_thread(
+                    mark_prefetched, self.store, "search", self.search_service.cache_key(query),
+                    self.search_service.cache_ttl,
+                )
+        return searches
+
+    async def _pregenerate(self, topic: str, started: float) -> int:
+        if await asyncio.to_thread(self.store.get, draft_key(topic)) is not None:
+            return 0
+        await self._check_yield(started)
+        agent = await asyncio.to_thread(self.agent_factory)
+        if not await asyncio.to_thread(agent.model_pool.has_spare_capacity):
+            raise PrefetchBudgetExhausted("no spare model capacity")
+        if not await asyncio.to_thread(self.store.allow, "prefetch:drafts", self.generation_budget_per_day, 86400):
+            raise PrefetchBudgetExhausted("generation budget")
+
+        # A draft is long and spends model capacity, so it is cancelled on yield
+        result = await self._step(agent.pregenerate(topic), started)
+        content = result.get("blog_content") or ""
+        if len(content) < 500 or "System Error" in content:
+            print(f"Prefetch: no usable draft for '{topic}'")
+            return 0
+        await asyncio.to_thread(self.store.set, draft_key(topic), orjson.dumps(result), PREFETCH_DRAFT_TTL_SECONDS)
+        await asyncio.to_thread(self.store.incr, "prefetch:stats:draft")
+        metrics.incr("prefetch.draft_prefetched")
+        return 1
+
+
+async def run_prefetch_periodically(scheduler: PrefetchScheduler, interval: int = PREFETCH_INTERVAL_SECONDS):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            stats = await scheduler.run_once()
+            if stats["searches"] or stats["drafts"]:
+                print(f"Prefetch: {stats['searches']} search(es), {stats['drafts']} draft(s) for {len(stats['topics'])} topic(s)")
+        except Exception as e:
+            print(f"Prefetch error: {e}")
@@ -0,0 +1,81 @@
+"""
+Prefetch state in the shared store
+What the request path needs from the idle-time prefetcher (prefetch.py):
+recording interactive activity, claiming prefetched search results and
+drafts, and the hit counters. Only the shared store is used here, so the
+search service and the agent can import it without the scheduler's
+database and topic-mining dependencies.
+"""
+import time
+from typing import Any, Dict, Optional
+
+import orjson
+
+from backend.services.metrics import metrics
+from backend.services.shared_store import SharedStore
+from backend.services.singleflight import normalize_topic
+
+_LAST_INTERACTIVE_KEY = "activity:last_interactive"
+_KINDS = ("search", "draft")
+
+
+# Activity
+
+def record_interactive(store: SharedStore):
+    """Called for every interactive generation request, on any worker"""
+    store.set(_LAST_INTERACTIVE_KEY, repr(time.time()).encode())
+
+
+def last_interactive(store: SharedStore) -> float:
+    value = store.get(_LAST_INTERACTIVE_KEY)
+    return float(value) if value is not None else 0.0
+
+
+# Prefetched items and hit accounting
+
+def mark_prefetched(store: SharedStore, kind: str, key: str, ttl: float):
+    store.set(f"prefetched:{kind}:{key}", b"1", ttl=ttl)
+    store.incr(f"prefetch:stats:{kind}")
+    metrics.incr(f"prefetch.{kind}_prefetched")
+
+
+def claim_prefetched(store: SharedStore, kind: str, key: str) -> bool:
+    """True (once) when key was prefetched and this is its first use"""
+    if store.pop(f"prefetched:{kind}:{key}") is None:
+        return False
+    store.incr(f"prefetch:stats:{kind}_hits")
+    metrics.incr(f"prefetch.{kind}_hits")
+    return True
+
+
+def draft_key(topic: str) -> str:
+    return f"prefetch:draft:{normalize_topic(topic)}"
+
+
+def claim_draft(store: SharedStore, topic: str) -> Optional[Dict[str, Any]]:
+    """A pre-generated draft for the topic, handed to exactly one request"""
+    value = store.pop(draft_key(topic))
+    if value is None:
+        return None
+    store.incr("prefetch:stats:draft_hits")
+    metrics.incr("prefetch.draft_hits")
+    return orjson.loads(value)
+
+
+def prefetch_stats(store: SharedStore) -> Dict[str, Any]:
+    """Prefetched items and how many were used, across every worker"""
+    def count(key: str) -> int:
+        value = store.get(key)
+        return int(value) if value is not None else 0
+
+    stats = {}
+    for kind in _KINDS:
+        prefetched = count(f"prefetch:stats:{kind}")
+        hits = count(f"prefetch:stats:{kind}_hits")
+        stats[kind] = {
+            "prefetched": prefetched,
+            "hits": hits,
+            "hit_rate": round(hits / prefetched, 3) if prefetched else 0.0,
+        }
+    stats["passes_yielded"] = count("prefetch:stats:yielded")
+    return stats
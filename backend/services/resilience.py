@@ -0,0 +1,214 @@
+"""
+Resilience helpers for external dependencies
+Per-dependency circuit breakers with half-open probing, latency tracking and
+hedged requests (a duplicate is fired when the first attempt is slower than
+the recent p95).
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from backend.services.metrics import metrics
+
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures.
+    open -> half_open once `reset_timeout` has passed; up to
+    `half_open_max_calls` probes are let through. A successful probe closes
+    the breaker, a failed one opens it again. A cancelled probe gives its
+    slot back; a probe that never reports back frees it after
+    `half_open_timeout`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        half_open_timeout: float = 60.0,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.half_open_timeout = half_open_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_started_at = 0.0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN:
+                now = time.monotonic()
+                if self._probes and now - self._probe_started_at >= self.half_open_timeout:
+                    # The probes in flight never reported back
+                    metrics.incr(f"breaker.{self.name}.probe_timeouts")
+                    self._probes = 0
+                if self._probes < self.half_open_max_calls:
+                    self._probes += 1
+                    self._probe_started_at = now
+                    return True
+        metrics.incr(f"breaker.{self.name}.rejected")
+        return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                print(f"Circuit '{self.name}' closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probes = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            metrics.incr(f"breaker.{self.name}.failures")
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    print(f"Circuit '{self.name}' opened after {self._failures} failures")
+                    metrics.incr(f"breaker.{self.name}.opened")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probes = 0
+
+    def release_probe(self):
+        """A call ended without an outcome (cancelled): free its half-open slot"""
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+        try:
+            result = await fn()
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            # Cancellation says nothing about the dependency's health
+            self.release_probe()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._maybe_half_open()
+            return {"state": self._state, "consecutive_failures": self._failures}
+
+    def _maybe_half_open(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+
+
+class LatencyTracker:
+    """Sliding window of successful call latencies (seconds)"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+async def hedged(
+    fn: Callable[[], Awaitable[Any]],
+    delay: Optional[float],
+    name: str,
+    max_attempts: int = 2,
+) -> Any:
+    """
+    Run fn; if it hasn't finished after `delay` seconds, start another attempt
+    and return whichever succeeds first. A failed attempt also triggers the
+    next one immediately. With no delay (not enough samples yet) this is a
+    plain call.
+    """
+    if delay is None or max_attempts < 2:
+        return await fn()
+
+    tasks = [asyncio.ensure_future(fn())]
+    attempts = 1
+    last_error: Optional[BaseException] = None
+    try:
+        while tasks:
+            timeout = delay if attempts < max_attempts else None
+            done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                metrics.incr(f"hedge.{name}.fired")
+                tasks.append(asyncio.ensure_future(fn()))
+                attempts += 1
+                continue
+            for task in done:
+                tasks.remove(task)
+                if task.exception() is None:
+                    if attempts > 1:
+                        metrics.incr(f"hedge.{name}.completed_with_hedge")
+                    return task.result()
+                last_error = task.exception()
+            if attempts < max_attempts:
+                tasks.append(asyncio.ensure_future(fn()))
+                attempts += 1
+        raise last_error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def get_breaker(name: str, **options) -> CircuitBreaker:
+    """Process-wide breaker per dependency name"""
+    with _registry_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name, **options)
+        return breaker
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    with _registry_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.snapshot() for b in breakers}
+
+
+metrics.register_gauge("breakers", breaker_states)
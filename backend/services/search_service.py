@@ -1,10 +1,76 @@
 from duckduckgo_search import DDGS
-from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, List, Dict, Optional
 import asyncio
+import os
+import time
+
+from backend.services.metrics import metrics
+from backend.services.prefetch_state import claim_prefetched
+from backend.services.resilience import CircuitOpenError, LatencyTracker, get_breaker, hedged
+from backend.services.singleflight import normalize_topic
+
+if TYPE_CHECKING:
+    from backend.services.shared_store import SharedStore
+
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT_SECONDS", "8"))
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "3600"))
+# Threads for the blocking search backend. A timed-out call can't be
+# interrupted, but it keeps holding one of these instead of piling up
+# threads in the default pool; calls still queued when they time out never run.
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "4"))
+
+_search_pool: Optional[ThreadPoolExecutor] = None
+
+
+def _get_search_pool() -> ThreadPoolExecutor:
+    global _search_pool
+    if _search_pool is None:
+        _search_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="search")
+    return _search_pool
+
+
+def shutdown_search_pool():
+    """Stop the search threads (called on app shutdown)"""
+    global _search_pool
+    if _search_pool is not None:
+        _search_pool.shutdown(wait=False, cancel_futures=True)
+        _search_pool = None
+
 
 class WebSearchService:
-    def __init__(self):
-        pass
+    # Results per query for the research searches of a blog
+    RESULTS_PER_QUERY = 3
+
+    def __init__(
+        self,
+        search_backend: Optional[Callable[[str, int], List[Dict]]] = None,
+        cache: Optional["SharedStore"] = None,
+    ):
+        # The backend is a blocking (query, max_results) -> results callable;
+        # it can be swapped for a fault-injecting stub
+        self.search_backend = search_backend or self._sync_search
+        # Results shared by every worker for SEARCH_CACHE_TTL_SECONDS
+        self.cache = cache
+        self.cache_ttl = SEARCH_CACHE_TTL_SECONDS
+        self.breaker = get_breaker("search", failure_threshold=3, reset_timeout=30)
+        self.latency = LatencyTracker()
+
+    @staticmethod
+    def cache_key(query: str, max_results: int = RESULTS_PER_QUERY) -> str:
+        return f"search:{normalize_topic(query)}:{max_results}"
+
+    def is_cached(self, query: str, max_results: int = RESULTS_PER_QUERY) -> bool:
+        return self.cache is not None and self.cache.get(self.cache_key(query, max_results)) is not None
+
+    @staticmethod
+    def research_queries(topic: str, num_searches: int = 3) -> List[str]:
+        """The query variations multi_search runs for a topic"""
+        return [
+            f"{topic}",
+            f"{topic} latest research",
+            f"{topic} current trends",
+        ][:num_searches]
 
     async def _run_search(self, query: str, max_results: int) -> List[Dict]:
         """Runs the search in a thread-safe way"""
@@ -25,40 +91,65 @@ class WebSearchService:
 
     async def search_topic(self, query: str, max_results: int = 5) -> List[Dict]:
         """
-        Perform web search on a given topic using synchronous DDGS wrapped in thread
+        Perform web search on a given topic using synchronous DDGS wrapped in thread.
+        Fails fast with no results while the search breaker is open, so the
+        agent falls back to writing from its own knowledge.
         """
-        return await asyncio.to_thread(self._sync_search, query, max_results)
+        cache_key = self.cache_key(query, max_results)
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get_json, cache_key)
+            if cached is not None:
+                metrics.incr("search.cache_hits")
+                # First use of a result the idle-time prefetcher fetched
+                await asyncio.to_thread(claim_prefetched, self.cache, "search", cache_key)
+                return cached
+            metrics.incr("search.cache_misses")
+
+        async def attempt():
+            loop = asyncio.get_running_loop()
+            return await asyncio.wait_for(
+                loop.run_in_executor(_get_search_pool(), self.search_backend, query, max_results), SEARCH_TIMEOUT
+            )
+
+        async def call():
+            start = time.perf_counter()
+            results = await hedged(attempt, self.latency.percentile(95), "search")
+            self.latency.observe(time.perf_counter() - start)
+            return results
 
-    def _sync_search(self, query: str, max_results: int) -> List[Dict]:
         try:
-            with DDGS() as ddgs:
-                results = list(ddgs.text(query, max_results=max_results))
-                return [
-                    {
-                        "title": r.get("title", ""),
-                        "snippet": r.get("body", ""),
-                        "link": r.get("href", ""),
-                    }
-                    for r in results
-                ]
+            results = await self.breaker.call(call)
+        except CircuitOpenError:
+            metrics.incr("search.fast_fail")
+            return []
         except Exception as e:
-            print(f"Sync Search error: {e}")
+            print(f"Sync Search error: {e!r}")
             return []
+        if results and self.cache is not None:
+            await asyncio.to_thread(self.cache.set_json, cache_key, results, self.cache_ttl)
+        return results
+
+    def _sync_search(self, query: str, max_results: int) -> List[Dict]:
+        """Blocking DuckDuckGo call; errors propagate so the breaker can count them"""
+        with DDGS(timeout=int(SEARCH_TIMEOUT)) as ddgs:
+            results = list(ddgs.text(query, max_results=max_results))
+            return [
+                {
+                    "title": r.get("title", ""),
+                    "snippet": r.get("body", ""),
+                    "link": r.get("href", ""),
+                }
+                for r in results
+            ]
 
     async def multi_search(self, topic: str, num_searches: int = 3) -> List[Dict]:
         """
         Perform multiple searches with different query variations
         """
-        queries = [
-            f"{topic}",
-            f"{topic} latest research",
-            f"{topic} current trends",
-        ]
-
         all_results = []
-        for query in queries[:num_searches]:
+        for query in self.research_queries(topic, num_searches):
             print(f"Searching web for: {query}...")
-            results = await self.search_topic(query, max_results=3)
+            results = await self.search_topic(query, max_results=self.RESULTS_PER_QUERY)
             print(f"Found {len(results)} results for '{query}'")
             all_results.extend(results)
 
@@ -0,0 +1,293 @@
+"""
+Shared store for multi-worker deployments
+A small Redis-style key/value store on a local SQLite file in WAL mode, so
+every worker process on the host sees the same state: TTL'd cache entries,
+counters for rate-limit buckets, and locks/leases for in-flight work.
+
+    SHARED_STORE_PATH   database file (default backend/shared_store.db)
+
+Operations are single short statements, but a write can wait up to
+BUSY_TIMEOUT_MS for another worker's write, so the methods are blocking:
+async code calls them through asyncio.to_thread. Each thread gets its own
+connection. Expired rows are ignored on read and purged periodically.
+
+hold_lease() lets exactly one worker run the host-wide periodic jobs.
+Lock owners are tagged with their pid: a lock whose owner process is gone
+is taken over at once instead of after its TTL, and opening the store
+clears those left by a crashed run.
+"""
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+import orjson
+
+from backend.services.metrics import metrics
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Next to the app like the similarity index, so separate checkouts don't share locks
+SHARED_STORE_PATH = os.getenv("SHARED_STORE_PATH", os.path.join(BACKEND_DIR, "shared_store.db"))
+# How long a writer waits for another process's write to finish
+BUSY_TIMEOUT_MS = 2000
+LEASE_TTL_SECONDS = 30
+SHARED_STORE_PURGE_SECONDS = 300
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    key TEXT PRIMARY KEY,
+    value BLOB,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS kv_expires_at ON kv (expires_at);
+"""
+# Owner tokens start with the owning process id: "<pid>-<random>"
+_OWNER_PID_RE = re.compile(rb"^(\d+)-")
+
+
+def _owner_alive(value: bytes) -> bool:
+    """False only when the token names a process that no longer exists on this host"""
+    match = _OWNER_PID_RE.match(value or b"")
+    if match is None or os.name != "posix":
+        return True
+    try:
+        os.kill(int(match.group(1)), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OverflowError):
+        pass
+    return True
+
+
+class SharedStore:
+    def __init__(self, path: str = SHARED_STORE_PATH):
+        self.path = path
+        # Identifies this process as a lock/lease owner
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        self.clear_stale_locks()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            # Connections must not cross a fork
+            conn = self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return conn
+
+    @staticmethod
+    def _expiry(ttl: Optional[float]) -> Optional[float]:
+        return time.time() + ttl if ttl else None
+
+    # Key/value
+
+    def get(self, key: str) -> Optional[bytes]:
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, value, self._expiry(ttl)),
+        )
+
+    def delete(self, key: str):
+        conn = self._conn()
+        conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def pop(self, key: str) -> Optional[bytes]:
+        """Delete a live entry and return its value; only one caller gets it"""
+        conn = self._conn()
+        row = conn.execute(
+            "DELETE FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?) RETURNING value",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_json(self, key: str) -> Any:
+        value = self.get(key)
+        return orjson.loads(value) if value is not None else None
+
+    def set_json(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.set(key, orjson.dumps(value), ttl)
+
+    def scan(self, prefix: str) -> Dict[str, bytes]:
+        """Live entries whose key starts with prefix"""
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT key, value FROM kv WHERE key >= ? AND key < ? AND (expires_at IS NULL OR expires_at > ?)",
+            (prefix, prefix + "￿", time.time()),
+        ).fetchall()
+        return dict(rows)
+
+    # Counters
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """
+        Atomically add to an integer counter and return the new value. The
+        TTL is set when the counter is created (or had expired), like a
+        Redis INCR + EXPIRE NX, which makes fixed-window rate-limit buckets.
+        """
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET "
+            "  value = CASE WHEN kv.expires_at IS NOT NULL AND kv.expires_at <= ? THEN excluded.value "
+            "               ELSE CAST(kv.value AS INTEGER) + excluded.value END, "
+            "  expires_at = CASE WHEN kv.expires_at IS NOT NULL AND kv.expires_at <= ? THEN excluded.expires_at "
+            "                    ELSE kv.expires_at END "
+            "RETURNING value",
+            (key, amount, self._expiry(ttl), now, now),
+        ).fetchone()
+        return int(row[0])
+
+    def allow(self, bucket: str, limit: int, window_seconds: float) -> bool:
+        """Fixed-window rate limit shared by every worker: True if this call fits"""
+        window = int(time.time() // window_seconds)
+        count = self.incr(f"ratelimit:{bucket}:{window}", ttl=window_seconds * 2)
+        if count > limit:
+            metrics.incr("shared_store.rate_limited")
+            return False
+        return True
+
+    def used(self, bucket: str, window_seconds: float) -> int:
+        """Calls counted against a bucket in the current window, without taking one"""
+        value = self.get(f"ratelimit:{bucket}:{int(time.time() // window_seconds)}")
+        return int(value) if value is not None else 0
+
+    # Locks and leases
+
+    def acquire(self, key: str, ttl: float, token: Optional[str] = None) -> bool:
+        """
+        Take a lock (or renew one this owner already holds). Expired locks
+        and locks whose owner process has died are taken over, so a crashed
+        worker can't hold one for long.
+        """
+        token = token or self.owner
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+            "WHERE kv.value = excluded.value OR kv.expires_at <= ? "
+            "RETURNING value",
+            (key, token.encode(), now + ttl, now),
+        ).fetchone()
+        if row is not None:
+            return True
+        holder = conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        if holder is None or _owner_alive(holder[0]):
+            return False
+        # Fenced on the dead owner's token: only one contender takes it over
+        taken = conn.execute(
+            "UPDATE kv SET value = ?, expires_at = ? WHERE key = ? AND value = ?",
+            (token.encode(), now + ttl, key, holder[0]),
+        ).rowcount
+        if taken:
+            metrics.incr("shared_store.stale_locks_taken")
+        return bool(taken)
+
+    def release(self, key: str, token: Optional[str] = None):
+        token = token or self.owner
+        conn = self._conn()
+        conn.execute("DELETE FROM kv WHERE key = ? AND value = ?", (key, token.encode()))
+
+    def holder(self, key: str) -> Optional[str]:
+        value = self.get(key)
+        return value.decode() if value is not None else None
+
+    # Maintenance
+
+    def purge_expired(self) -> int:
+        conn = self._conn()
+        return conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)).rowcount
+
+    def keys(self, prefix: str = "") -> List[str]:
+        return list(self.scan(prefix))
+
+    def clear_stale_locks(self) -> int:
+        """Drop locks and leases whose owner process has exited"""
+        conn = self._conn()
+        rows = conn.execute("SELECT key, value FROM kv WHERE key LIKE 'lock:%' OR key LIKE 'lease:%'").fetchall()
+        cleared = 0
+        for key, value in rows:
+            if not _owner_alive(value):
+                cleared += conn.execute("DELETE FROM kv WHERE key = ? AND value = ?", (key, value)).rowcount
+        if cleared:
+            print(f"Shared store: cleared {cleared} lock(s) left by exited workers")
+        return cleared
+
+    def reset_locks(self) -> int:
+        """Drop every lock and lease, e.g. left behind by workers of a previous run"""
+        conn = self._conn()
+        return conn.execute("DELETE FROM kv WHERE key LIKE 'lock:%' OR key LIKE 'lease:%'").rowcount
+
+
+async def hold_lease(store: SharedStore, name: str, start_jobs: Callable[[], List[asyncio.Task]], ttl: float = LEASE_TTL_SECONDS):
+    """
+    Keep competing for a named lease. The worker holding it runs the tasks
+    returned by start_jobs() and renews the lease; if it stops renewing
+    (crash, stalled loop) another worker takes over once the TTL runs out.
+    """
+    key = f"lease:{name}"
+    tasks: Optional[List[asyncio.Task]] = None
+    renewed_at = 0.0
+    try:
+        while True:
+            try:
+                held = await asyncio.to_thread(store.acquire, key, ttl)
+                if held:
+                    renewed_at = time.monotonic()
+            except sqlite3.Error as e:
+                # e.g. "database is locked": not held, unless our last renewal
+                # is still within the TTL; retried on the next tick either way
+                print(f"Lease {name}: store error, retrying: {e}")
+                metrics.incr("shared_store.lease_errors")
+                held = tasks is not None and time.monotonic() - renewed_at < ttl
+            if held and tasks is None:
+                print(f"Worker {os.getpid()} holds the {name} lease")
+                tasks = start_jobs()
+            elif not held and tasks is not None:
+                print(f"Worker {os.getpid()} lost the {name} lease, stopping its jobs")
+                for task in tasks:
+                    task.cancel()
+                tasks = None
+            await asyncio.sleep(ttl / 3)
+    finally:
+        for task in tasks or []:
+            task.cancel()
+        if tasks is not None:
+            try:
+                await asyncio.to_thread(store.release, key)
+            except sqlite3.Error as e:
+                print(f"Lease {name}: release failed, it expires in {ttl:.0f}s: {e}")
+
+
+async def run_store_purge_periodically(store: SharedStore, interval: int = SHARED_STORE_PURGE_SECONDS):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            purged = await asyncio.to_thread(store.purge_expired)
+            if purged:
+                print(f"Shared store: purged {purged} expired entries")
+        except sqlite3.Error as e:
+            print(f"Shared store purge error: {e}")
@@ -0,0 +1,412 @@
+"""
+Related-blogs similarity index
+Every blog is turned into a hashed word n-gram vector (unigrams + bigrams,
+sublinear tf, signed feature hashing), L2-normalized so cosine similarity is
+a plain dot product. Top-k queries are batched matrix products over the
+stored matrix, chunk by chunk, so memory stays bounded.
+
+Vectors live in flat float32 files under SIMILARITY_INDEX_DIR that readers
+memory-map: every worker shares the same pages and startup costs nothing.
+New blogs are appended in place; a background rebuild regenerates the files
+from the database (dropping deleted blogs) and swaps them in atomically.
+
+A second, smaller matrix holds topic-only vectors for the near-duplicate
+topic check that runs before a generation starts.
+"""
+import asyncio
+import json
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import or_
+
+try:
+    import fcntl
+except ImportError:  # Windows: the in-process lock still serializes writers
+    fcntl = None
+
+from backend.database.bodies import hydrate
+from backend.database.database import SessionLocal, get_engine
+from backend.models.models import Blog
+from backend.services.metrics import metrics
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Relative to the backend, not the working directory the server was started from
+SIMILARITY_INDEX_DIR = os.getenv("SIMILARITY_INDEX_DIR", os.path.join(BACKEND_DIR, "similarity_index"))
+SIMILARITY_DIM = int(os.getenv("SIMILARITY_DIM", "2048"))
+SIMILARITY_TOPIC_DIM = int(os.getenv("SIMILARITY_TOPIC_DIM", "512"))
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.85"))
+# Rows scored per matrix product
+QUERY_CHUNK_ROWS = 32768
+# Only the start of very long posts is vectorized
+MAX_TEXT_CHARS = 20000
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_MARKDOWN_RE = re.compile(r"[#*_>`\[\]()!|-]+")
+_STOP_WORDS = frozenset(
+    "a an and are as at be been but by can do for from has have how in into is it its more most not of on or "
+    "our so than that the their them then there these they this to was we were what when which while who why "
+    "will with you your".split()
+)
+
+
+def _tokens(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(_MARKDOWN_RE.sub(" ", text.lower())) if t not in _STOP_WORDS]
+
+
+def vectorize(text: str, dim: int, topic: str = "", topic_weight: int = 3) -> np.ndarray:
+    """Hashed unigram+bigram vector, L2-normalized (all zeros for empty text)"""
+    words = _tokens(text[:MAX_TEXT_CHARS])
+    features = Counter(words)
+    features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    if topic:
+        topic_words = _tokens(topic)
+        for feature in topic_words + [f"{a} {b}" for a, b in zip(topic_words, topic_words[1:])]:
+            features[feature] += topic_weight
+
+    vector = np.zeros(dim, dtype=np.float32)
+    if not features:
+        return vector
+    hashes = np.fromiter((zlib.crc32(f.encode()) for f in features), dtype=np.uint32, count=len(features))
+    weights = np.fromiter((1.0 + math.log(c) for c in features.values()), dtype=np.float32, count=len(features))
+    # The top hash bit picks the sign, so collisions cancel out instead of piling up
+    signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+    np.add.at(vector, hashes % dim, weights * signs)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _iter_blog_batches(
+    after_id: int = 0, batch_size: int = 500, updated_since: Optional[datetime] = None
+) -> Iterator[List[Dict]]:
+    """
+    All users' blogs in ascending id order, archived bodies hydrated. With
+    updated_since, blogs edited since then are included whatever their id.
+    """
+    get_engine()
+    with SessionLocal() as db:
+        condition = Blog.id > after_id
+        if updated_since is not None:
+            condition = or_(condition, Blog.updated_at >= updated_since)
+        rows = (
+            db.query(Blog.id, Blog.user_id, Blog.topic, Blog.content.label("content"), Blog.body_hash)
+            .filter(condition)
+            .order_by(Blog.id)
+            .yield_per(batch_size)
+        )
+        batch: List[Dict] = []
+        for row in rows:
+            batch.append(row._asdict())
+            if len(batch) >= batch_size:
+                yield hydrate(db, batch)
+                batch = []
+        if batch:
+            yield hydrate(db, batch)
+
+
+@dataclass
+class RelatedBlog:
+    blog_id: int
+    score: float
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class _Files:
+    """Paths of one generation of index files"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.vectors = os.path.join(directory, "blogs.f32")
+        self.topics = os.path.join(directory, "topics.f32")
+        self.ids = os.path.join(directory, "ids.i64")
+        self.owners = os.path.join(directory, "owners.i64")
+        self.meta = os.path.join(directory, "meta.json")
+        self.lock = os.path.join(directory, "index.lock")
+
+    def data_files(self):
+        return [self.vectors, self.topics, self.ids, self.owners]
+
+
+class SimilarityIndex:
+    def __init__(self, directory: str = SIMILARITY_INDEX_DIR, dim: int = SIMILARITY_DIM, topic_dim: int = SIMILARITY_TOPIC_DIM):
+        self.dim = dim
+        self.topic_dim = topic_dim
+        self.files = _Files(directory)
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._mapped_stamp = None
+        self._count = 0
+        self._vectors = self._topics = self._ids = self._owners = None
+        self._rebuilding = threading.Lock()
+        meta = self._read_meta()
+        if meta and (meta.get("dim"), meta.get("topic_dim")) != (dim, topic_dim):
+            print("Similarity index dimensions changed, starting empty until the next rebuild")
+            self._write_meta({"dim": dim, "topic_dim": topic_dim, "count": 0, "capacity": 0, "max_id": 0})
+        metrics.register_gauge("similarity_index.size", lambda: self._read_meta().get("count", 0))
+
+    # Metadata and locking
+
+    def _read_meta(self) -> Dict:
+        try:
+            with open(self.files.meta) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_meta(self, meta: Dict):
+        tmp = self.files.meta + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self.files.meta)
+
+    class _WriteLock:
+        """Thread lock plus an advisory file lock shared with other workers"""
+
+        def __init__(self, index: "SimilarityIndex"):
+            self.index = index
+            self.handle = None
+
+        def __enter__(self):
+            self.index._lock.acquire()
+            if fcntl is not None:
+                self.handle = open(self.index.files.lock, "a+")
+                fcntl.flock(self.handle, fcntl.LOCK_EX)
+            return self
+
+        def __exit__(self, *exc):
+            if self.handle is not None:
+                fcntl.flock(self.handle, fcntl.LOCK_UN)
+                self.handle.close()
+            self.index._lock.release()
+
+    # Reading
+
+    def _mapped(self):
+        """(count, vectors, topics, ids, owners), remapped when another writer changed the files"""
+        try:
+            stat = os.stat(self.files.meta)
+            stamp = (stat.st_ino, stat.st_mtime_ns)
+        except FileNotFoundError:
+            return 0, None, None, None, None
+        if stamp != self._mapped_stamp:
+            meta = self._read_meta()
+            count = meta.get("count", 0)
+            if count:
+                self._vectors = np.memmap(self.files.vectors, dtype=np.float32, mode="r", shape=(count, self.dim))
+                self._topics = np.memmap(self.files.topics, dtype=np.float32, mode="r", shape=(count, self.topic_dim))
+                self._ids = np.memmap(self.files.ids, dtype=np.int64, mode="r", shape=(count,))
+                self._owners = np.memmap(self.files.owners, dtype=np.int64, mode="r", shape=(count,))
+            else:
+                self._vectors = self._topics = self._ids = self._owners = None
+            self._count = count
+            self._mapped_stamp = stamp
+        return self._count, self._vectors, self._topics, self._ids, self._owners
+
+    def __len__(self) -> int:
+        return self._mapped()[0]
+
+    def _row_of(self, ids: np.ndarray, blog_id: int) -> Optional[int]:
+        # Rows are appended in id order, so a binary search almost always hits
+        row = int(np.searchsorted(ids, blog_id))
+        if row < len(ids) and ids[row] == blog_id:
+            return row
+        matches = np.flatnonzero(ids == blog_id)
+        return int(matches[-1]) if len(matches) else None
+
+    def _top_k(
+        self,
+        matrix: np.ndarray,
+        ids: np.ndarray,
+        owners: np.ndarray,
+        queries: np.ndarray,
+        k: int,
+        owner: Optional[int],
+        exclude: Iterable[int] = (),
+    ) -> List[List[RelatedBlog]]:
+        """Cosine top-k for a batch of queries, one matrix product per chunk of rows"""
+        exclude = np.fromiter(exclude, dtype=np.int64)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_ids = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, len(ids), QUERY_CHUNK_ROWS):
+            end = min(start + QUERY_CHUNK_ROWS, len(ids))
+            scores = queries @ np.asarray(matrix[start:end]).T
+            chunk_ids = np.asarray(ids[start:end])
+            mask = np.isin(chunk_ids, exclude)
+            if owner is not None:
+                mask |= np.asarray(owners[start:end]) != owner
+            scores[:, mask] = -np.inf
+            scores = np.concatenate([best_scores, scores], axis=1)
+            candidates = np.concatenate([np.broadcast_to(best_ids, best_scores.shape), np.broadcast_to(chunk_ids, (len(queries), end - start))], axis=1)
+            keep = min(k, scores.shape[1])
+            top = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_ids = np.take_along_axis(candidates, top, axis=1)
+
+        results = []
+        for scores, row_ids in zip(best_scores, best_ids):
+            order = np.argsort(-scores)
+            results.append([
+                RelatedBlog(int(row_ids[i]), round(float(scores[i]), 4))
+                for i in order if np.isfinite(scores[i]) and scores[i] > 0
+            ])
+        return results
+
+    def related(
+        self,
+        blog_id: int,
+        k: int = 5,
+        owner: Optional[int] = None,
+        fallback_text: Optional[Tuple[str, str]] = None,
+    ) -> List[RelatedBlog]:
+        """
+        Blogs most similar to blog_id. If the blog isn't indexed yet (e.g.
+        before the first rebuild), fallback_text=(topic, content) is
+        vectorized on the fly.
+        """
+        start = time.perf_counter()
+        count, vectors, _, ids, owners = self._mapped()
+        query = None
+        if count:
+            row = self._row_of(ids, blog_id)
+            if row is not None:
+                query = np.asarray(vectors[row])
+        if query is None and fallback_text is not None:
+            topic, content = fallback_text
+            query = vectorize(content, self.dim, topic=topic)
+        if query is None or not count:
+            return []
+        results = self._top_k(vectors, ids, owners, query[None, :], k, owner, exclude=[blog_id])[0]
+        metrics.observe("similarity_index.query_ms", (time.perf_counter() - start) * 1000)
+        return results
+
+    def nearest_topics(self, topic: str, owner: Optional[int] = None, k: int = 1) -> List[RelatedBlog]:
+        """Closest existing blog topics (for the near-duplicate check)"""
+        count, _, topics, ids, owners = self._mapped()
+        query = vectorize(topic, self.topic_dim)
+        if not count or not query.any():
+            return []
+        return self._top_k(topics, ids, owners, query[None, :], k, owner)[0]
+
+    def find_near_duplicate(self, topic: str, owner: Optional[int] = None, threshold: float = NEAR_DUPLICATE_THRESHOLD) -> Optional[RelatedBlog]:
+        matches = self.nearest_topics(topic, owner, k=1)
+        if matches and matches[0].score >= threshold:
+            metrics.incr("similarity_index.near_duplicates")
+            return matches[0]
+        return None
+
+    # Writing
+
+    def add(self, blog_id: int, owner: int, topic: str, content: str):
+        """Index (or re-index) one blog; called after generate_blog saves it"""
+        vector = vectorize(content, self.dim, topic=topic)
+        topic_vector = vectorize(topic, self.topic_dim)
+        with self._WriteLock(self):
+            meta = self._read_meta() or {"dim": self.dim, "topic_dim": self.topic_dim, "count": 0, "capacity": 0, "max_id": 0}
+            count = meta["count"]
+            row = None
+            if count:
+                ids = np.memmap(self.files.ids, dtype=np.int64, mode="r", shape=(count,))
+                row = self._row_of(ids, blog_id)
+                del ids
+            if row is None:
+                row = count
+                if row >= meta["capacity"]:
+                    meta["capacity"] = self._grow(max(1024, meta["capacity"] * 2))
+                meta["count"] = count + 1
+            self._write_row(row, blog_id, owner, vector, topic_vector)
+            meta["max_id"] = max(meta.get("max_id", 0), blog_id)
+            self._write_meta(meta)
+        metrics.incr("similarity_index.added")
+
+    def _grow(self, capacity: int, files: Optional[_Files] = None) -> int:
+        files = files or self.files
+        for path, row_bytes in zip(files.data_files(), (self.dim * 4, self.topic_dim * 4, 8, 8)):
+            with open(path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        return capacity
+
+    def _write_row(self, row: int, blog_id: int, owner: int, vector: np.ndarray, topic_vector: np.ndarray, files: Optional[_Files] = None):
+        files = files or self.files
+        values = (vector, topic_vector, np.array([blog_id], dtype=np.int64), np.array([owner], dtype=np.int64))
+        for path, value in zip(files.data_files(), values):
+            with open(path, "r+b") as f:
+                f.seek(row * value.nbytes)
+                f.write(value.tobytes())
+
+    def rebuild(self, batch_size: int = 500) -> Dict:
+        """
+        Regenerate the index from the database into fresh files, swap them in
+        and catch up on blogs saved or edited while the rebuild ran (their
+        live updates went to the old files). Blocking; run it in a thread.
+        """
+        if not self._rebuilding.acquire(blocking=False):
+            return {"skipped": "rebuild already running"}
+        try:
+            start = time.perf_counter()
+            # Edits from here on may be missing from the staged rows; a second
+            # of slack covers timestamps taken just before this one
+            started_at = datetime.utcnow() - timedelta(seconds=1)
+            staging = _Files(os.path.join(self.files.directory, "rebuild"))
+            os.makedirs(staging.directory, exist_ok=True)
+            for path in staging.data_files():
+                open(path, "wb").close()
+
+            count, capacity, max_id = 0, 0, 0
+            for batch in _iter_blog_batches(batch_size=batch_size):
+                for blog in batch:
+                    if count >= capacity:
+                        capacity = self._grow(max(1024, capacity * 2), staging)
+                    self._write_row(
+                        count, blog["id"], blog["user_id"],
+                        vectorize(blog["content"] or "", self.dim, topic=blog["topic"]),
+                        vectorize(blog["topic"], self.topic_dim),
+                        staging,
+                    )
+                    count += 1
+                    max_id = max(max_id, blog["id"])
+
+            with self._WriteLock(self):
+                for staged, live in zip(staging.data_files(), self.files.data_files()):
+                    os.replace(staged, live)
+                self._write_meta({"dim": self.dim, "topic_dim": self.topic_dim, "count": count, "capacity": capacity, "max_id": max_id})
+
+            # Blogs saved or edited during the rebuild were written to the old files
+            caught_up, refreshed = 0, 0
+            for batch in _iter_blog_batches(after_id=max_id, batch_size=batch_size, updated_since=started_at):
+                for blog in batch:
+                    self.add(blog["id"], blog["user_id"], blog["topic"], blog["content"] or "")
+                    if blog["id"] > max_id:
+                        caught_up += 1
+                    else:
+                        refreshed += 1
+
+            seconds = time.perf_counter() - start
+            metrics.incr("similarity_index.rebuilds")
+            print(f"Similarity index rebuilt: {count + caught_up} blogs in {seconds:.1f}s")
+            return {"blogs": count + caught_up, "refreshed": refreshed, "seconds": round(seconds, 2)}
+        finally:
+            self._rebuilding.release()
+
+
+async def run_similarity_rebuild_periodically(index: SimilarityIndex, interval: int):
+    """Background loop started from the app lifespan; builds a missing index right away"""
+    first = True
+    while True:
+        if not (first and len(index) == 0):
+            await asyncio.sleep(interval)
+        first = False
+        try:
+            await asyncio.to_thread(index.rebuild)
+        except Exception as e:
+            print(f"Similarity index rebuild error: {e}")
@@ -0,0 +1,110 @@
+"""
+Single-flight request coalescing
+Concurrent callers asking for the same key share one in-flight computation,
+within one process (SingleFlight) or across worker processes through the
+shared store (SharedFlight).
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Hashable
+
+from backend.services.metrics import metrics
+
+if TYPE_CHECKING:
+    from backend.services.shared_store import SharedStore
+
+# A worker that dies mid-generation blocks the others at most this long
+SHARED_FLIGHT_LOCK_TTL = float(os.getenv("SHARED_FLIGHT_LOCK_TTL_SECONDS", "300"))
+SHARED_FLIGHT_POLL_SECONDS = 0.25
+# Waiting workers pick the leader's result up from the store within this window
+SHARED_FLIGHT_RESULT_TTL = 60
+
+
+def normalize_topic(topic: str) -> str:
+    """Case- and whitespace-insensitive form of a topic, used as a coalescing key"""
+    return " ".join(topic.lower().split())
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls by key. The first caller (the leader) starts the
+    computation; callers arriving while it runs await the same result. Nothing
+    is cached once the computation finishes.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        metrics.register_gauge(f"{name}.in_flight", lambda: len(self._inflight))
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is not None:
+            metrics.incr(f"{self.name}.coalesced")
+        else:
+            metrics.incr(f"{self.name}.leaders")
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda f: self._forget(key, f))
+
+        # Shielded so one caller disconnecting doesn't cancel the shared work
+        return await asyncio.shield(future)
+
+    def _forget(self, key: Hashable, future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+
+
+class SharedFlight:
+    """
+    SingleFlight across worker processes. Inside a process callers are
+    coalesced as usual; the process leader then takes a store lock for the
+    key. The worker that gets it runs the computation and publishes the
+    (JSON-serializable) result; the others poll for that result instead of
+    running it again, or take over if the lock expires. Each run publishes
+    under its own generation token (carried in the lock value), so waiters
+    only ever read the output of the run they waited for.
+    """
+
+    def __init__(self, name: str, store: "SharedStore", lock_ttl: float = SHARED_FLIGHT_LOCK_TTL):
+        self.name = name
+        self.store = store
+        self.lock_ttl = lock_ttl
+        self._local = SingleFlight(name)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        return await self._local.do(key, lambda: self._run(key, fn))
+
+    async def _run(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        lock_key = f"lock:{self.name}:{digest}"
+        result_prefix = f"{self.name}:result:{digest}"
+        waiting_for = None
+        waited = False
+        while True:
+            if waiting_for is not None:
+                result = await asyncio.to_thread(self.store.get_json, f"{result_prefix}:{waiting_for}")
+                if result is not None:
+                    metrics.incr(f"{self.name}.cross_process_coalesced")
+                    return result
+            # "<owner>:<generation>": the owner part keeps dead-owner fencing working
+            token = f"{self.store.owner}:{uuid.uuid4().hex}"
+            if await asyncio.to_thread(self.store.acquire, lock_key, self.lock_ttl, token):
+                generation = token.rsplit(":", 1)[1]
+                try:
+                    result = await fn()
+                    await asyncio.to_thread(
+                        self.store.set_json, f"{result_prefix}:{generation}", result, SHARED_FLIGHT_RESULT_TTL
+                    )
+                    return result
+                finally:
+                    await asyncio.to_thread(self.store.release, lock_key, token)
+            holder = await asyncio.to_thread(self.store.holder, lock_key)
+            if holder is not None:
+                waiting_for = holder.rsplit(":", 1)[-1]
+            if not waited:
+                waited = True
+                metrics.incr(f"{self.name}.cross_process_waits")
+            await asyncio.sleep(SHARED_FLIGHT_POLL_SECONDS)
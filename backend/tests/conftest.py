@@ -0,0 +1,60 @@
+"""
+Every test run gets a throwaway SQLite database, shared store, similarity
+index and image directory. The database engine is process-wide, so the
+environment is set before any backend module is imported.
+"""
+import os
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="blog_agent_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_workdir}/test.db"
+os.environ["SHARED_STORE_PATH"] = os.path.join(_workdir, "shared.db")
+os.environ["SIMILARITY_INDEX_DIR"] = os.path.join(_workdir, "similarity_index")
+
+import pytest
+
+from backend.database.database import SessionLocal, get_engine, init_db
+from backend.models.models import Base, User
+
+IMAGE_DIR = os.path.join(_workdir, "images")
+
+
+@pytest.fixture(scope="session")
+def database():
+    init_db()
+    return get_engine()
+
+
+@pytest.fixture
+def db(database):
+    """A session on an empty database with user 1 (and 2) in it; emptied again afterwards"""
+    session = SessionLocal()
+    session.add_all([User(id=1, username="one", email="one@example.com"), User(id=2, username="two", email="two@example.com")])
+    session.commit()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        for table in reversed(Base.metadata.sorted_tables):
+            session.execute(table.delete())
+        session.commit()
+        session.close()
+
+
+@pytest.fixture
+def client(db):
+    """The API without its lifespan: services are built lazily, images go to a temp dir"""
+    from fastapi.testclient import TestClient
+
+    from backend.main import app
+    from backend.services.container import ServiceContainer
+    from backend.services.image_gc import ImageGarbageCollector
+    from backend.services.image_service import ImageService
+
+    os.makedirs(IMAGE_DIR, exist_ok=True)
+    services = ServiceContainer()
+    services._image_service = ImageService()
+    services._image_service.output_dir = IMAGE_DIR
+    services._image_gc = ImageGarbageCollector(IMAGE_DIR, max_deletes_per_second=0, min_age_seconds=0)
+    app.state.services = services
+    return TestClient(app)
@@ -0,0 +1,92 @@
+"""
+Chat deletion removes messages and blogs with the chat, only for the owner,
+and the image files of deleted messages once nothing references them.
+"""
+import os
+import uuid
+
+import orjson
+
+from backend.models.models import Blog, Chat, Message
+from backend.services.image_gc import ImageGarbageCollector
+from backend.tests.conftest import IMAGE_DIR
+
+
+def new_image(directory=IMAGE_DIR, variants=("png", "thumb.webp")) -> str:
+    os.makedirs(directory, exist_ok=True)
+    image_id = f"image_{uuid.uuid4().hex}"
+    for suffix in variants:
+        with open(os.path.join(directory, f"{image_id}.{suffix}"), "wb") as f:
+            f.write(b"x")
+    return image_id
+
+
+def exists(image_id, directory=IMAGE_DIR) -> bool:
+    return os.path.exists(os.path.join(directory, f"{image_id}.png"))
+
+
+def seed_chat(db, user_id=1, image_id=None):
+    chat = Chat(user_id=user_id, title="Chat")
+    db.add(chat)
+    db.flush()
+    db.add(Message(chat_id=chat.id, role="user", content="topic"))
+    db.add(Message(
+        chat_id=chat.id, role="assistant", content="post",
+        image_url=f"/api/images/{image_id}" if image_id else None,
+    ))
+    db.add(Blog(user_id=user_id, chat_id=chat.id, topic="topic", content="post"))
+    db.commit()
+    return chat.id
+
+
+def test_bulk_delete_cascades_to_messages_and_blogs(client, db):
+    doomed = [seed_chat(db), seed_chat(db)]
+    kept = seed_chat(db)
+
+    response = client.post("/api/chats/bulk-delete", json={"chat_ids": doomed, "user_id": 1})
+    assert response.json() == {"success": True, "deleted": 2, "chat_ids": doomed}
+
+    db.expire_all()
+    assert [c.id for c in db.query(Chat)] == [kept]
+    assert {m.chat_id for m in db.query(Message)} == {kept}
+    assert {b.chat_id for b in db.query(Blog)} == {kept}
+
+
+def test_bulk_delete_skips_other_users_chats(client, db):
+    theirs = seed_chat(db, user_id=2)
+    response = client.post("/api/chats/bulk-delete", json={"chat_ids": [theirs], "user_id": 1})
+    assert response.json()["deleted"] == 0
+    assert db.query(Message).filter(Message.chat_id == theirs).count() == 2
+
+
+def test_deleting_a_chat_removes_its_unreferenced_images(client, db):
+    only_here, shared = new_image(), new_image()
+    chat_id = seed_chat(db, image_id=only_here)
+    db.add(Message(chat_id=chat_id, role="assistant", content="again", image_url=f"/api/images/{shared}"))
+    seed_chat(db, image_id=shared)
+
+    assert client.delete(f"/api/chats/{chat_id}").status_code == 200
+    assert not exists(only_here)
+    assert not os.path.exists(os.path.join(IMAGE_DIR, f"{only_here}.thumb.webp"))
+    assert exists(shared)
+
+
+def test_gc_pass_deletes_orphans_but_keeps_referenced_and_cached_images(db, tmp_path):
+    directory = str(tmp_path)
+    orphan, referenced, cached = new_image(directory), new_image(directory), new_image(directory)
+    seed_chat(db, image_id=referenced)
+    db.add(Chat(user_id=1, title="Edit later", context_cache=orjson.dumps({"image_url": f"/api/images/{cached}"}).decode()))
+    db.commit()
+
+    stats = ImageGarbageCollector(directory, batch_size=2, max_deletes_per_second=0, min_age_seconds=0).collect()
+    assert stats.images_deleted == 1
+    assert stats.files_deleted == 2
+    assert not exists(orphan, directory)
+    assert exists(referenced, directory) and exists(cached, directory)
+
+
+def test_gc_pass_leaves_young_files_alone(db, tmp_path):
+    image_id = new_image(str(tmp_path))
+    stats = ImageGarbageCollector(str(tmp_path), max_deletes_per_second=0, min_age_seconds=3600).collect()
+    assert stats.images_deleted == 0
+    assert exists(image_id, str(tmp_path))
@@ -0,0 +1,98 @@
+"""
+Cold storage: old bodies move into content_bodies (compressed, deduplicated
+by hash) and read back transparently, through the ORM and through hydrate().
+"""
+from datetime import datetime, timedelta
+
+from backend.database.bodies import compress, content_hash, decompress, hydrate
+from backend.models.models import Blog, Chat, ContentBody, Message
+from backend.services.content_archive import archive_old_content, prune_orphan_bodies
+
+OLD = datetime.utcnow() - timedelta(days=400)
+BODY = "# Heat pumps\n\nHeat pumps move heat instead of making it. " * 30
+
+
+def seed(db, created_at=OLD, body=BODY):
+    chat = Chat(user_id=1, title="Heat pumps", created_at=created_at)
+    db.add(chat)
+    db.flush()
+    message = Message(chat_id=chat.id, role="assistant", content=body, created_at=created_at)
+    blog = Blog(user_id=1, chat_id=chat.id, topic="Heat pumps", content=body, timestamp=created_at)
+    db.add_all([message, blog])
+    db.commit()
+    return chat, message, blog
+
+
+def test_codec_round_trip():
+    codec, data = compress(BODY)
+    assert len(data) < len(BODY)
+    assert decompress(codec, data) == BODY
+
+
+def test_old_rows_are_archived_and_deduplicated(db):
+    seed(db)
+    stats = archive_old_content(older_than_days=30)
+    assert stats.rows_archived == 2
+    assert stats.bodies_written == 1
+    assert stats.dedup_hits == 1
+    assert db.query(ContentBody).count() == 1
+    assert db.query(ContentBody.hash).scalar() == content_hash(BODY)
+
+
+def test_recent_rows_are_left_inline(db):
+    seed(db, created_at=datetime.utcnow())
+    assert archive_old_content(older_than_days=30).rows_archived == 0
+
+
+def test_archived_content_reads_back_through_the_orm_and_hydrate(db):
+    _, message, blog = seed(db)
+    archive_old_content(older_than_days=30)
+    db.expire_all()
+
+    assert blog._content == "" and blog.body_hash
+    assert blog.content == BODY
+    rows = db.query(Message.id, Message.content.label("content"), Message.body_hash).all()
+    items = hydrate(db, [row._asdict() for row in rows])
+    assert items == [{"id": message.id, "content": BODY}]
+
+
+def test_archived_messages_are_served_hydrated_by_the_api(client, db):
+    chat, _, _ = seed(db)
+    archive_old_content(older_than_days=30)
+    response = client.get(f"/api/chats/{chat.id}/messages")
+    assert [m["content"] for m in response.json()] == [BODY]
+
+
+def test_archiving_keeps_updated_at_and_the_etags(client, db):
+    chat, message, blog = seed(db)
+    db.refresh(message)
+    db.refresh(blog)
+    before = (message.updated_at, blog.updated_at)
+    etags = (client.get(f"/api/chats/{chat.id}/messages").headers["etag"], client.get("/api/blogs").headers["etag"])
+
+    archive_old_content(older_than_days=30)
+    db.expire_all()
+    assert (message.updated_at, blog.updated_at) == before
+    assert client.get(f"/api/chats/{chat.id}/messages", headers={"If-None-Match": etags[0]}).status_code == 304
+    assert client.get("/api/blogs", headers={"If-None-Match": etags[1]}).status_code == 304
+
+
+def test_editing_an_archived_row_stores_it_inline_again(db):
+    _, _, blog = seed(db)
+    archive_old_content(older_than_days=30)
+    db.expire_all()
+    blog.content = "Rewritten"
+    db.commit()
+    db.expire_all()
+    assert blog._content == "Rewritten" and blog.body_hash is None
+
+
+def test_orphaned_bodies_are_pruned(db):
+    chat, _, _ = seed(db)
+    archive_old_content(older_than_days=30)
+    db.delete(chat)
+    db.query(Message).delete()
+    db.query(Blog).delete()
+    db.commit()
+    assert prune_orphan_bodies() == 1
+    assert db.query(ContentBody).count() == 0
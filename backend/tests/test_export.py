@@ -0,0 +1,83 @@
+"""
+Streaming export: NDJSON and zip of markdown, in id order, with archived
+bodies hydrated and after_id resuming an interrupted export.
+"""
+import io
+import os
+import uuid
+import zipfile
+from datetime import datetime, timedelta
+
+import orjson
+
+from backend.models.models import Blog, Chat, Message
+from backend.services import export_service
+from backend.services.content_archive import archive_old_content
+from backend.tests.conftest import IMAGE_DIR
+
+
+def seed_blogs(db, count, user_id=1, created_at=None):
+    ids = []
+    for i in range(count):
+        blog = Blog(user_id=user_id, topic=f"Topic {i}", content=f"Body of post {i}. " * 40, timestamp=created_at)
+        db.add(blog)
+        db.flush()
+        ids.append(blog.id)
+    db.commit()
+    return ids
+
+
+def ndjson(client, **params):
+    response = client.get("/api/export", params={"format": "ndjson", **params})
+    assert response.status_code == 200
+    return [orjson.loads(line) for line in response.content.splitlines()]
+
+
+def test_ndjson_exports_the_users_blogs_in_id_order(client, db):
+    ids = seed_blogs(db, 5)
+    seed_blogs(db, 2, user_id=2)
+    rows = ndjson(client, user_id=1)
+    assert [row["id"] for row in rows] == ids
+    assert rows[0]["content"].startswith("Body of post 0.")
+
+
+def test_batches_are_streamed_in_id_order(db):
+    ids = seed_blogs(db, 5)
+    batches = list(export_service._iter_blog_batches(1, batch_size=2))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [blog["id"] for batch in batches for blog in batch] == ids
+
+
+def test_after_id_resumes_an_interrupted_export(client, db):
+    ids = seed_blogs(db, 7)
+    received = ndjson(client, user_id=1)[:3]
+
+    resumed = ndjson(client, user_id=1, after_id=received[-1]["id"])
+    assert [row["id"] for row in received + resumed] == ids
+
+
+def test_archived_bodies_are_exported_hydrated(client, db):
+    seed_blogs(db, 2, created_at=datetime.utcnow() - timedelta(days=400))
+    archive_old_content(older_than_days=30)
+    assert all(row["content"].startswith("Body of post") for row in ndjson(client, user_id=1))
+
+
+def test_zip_contains_markdown_and_images(client, db):
+    image_id = f"image_{uuid.uuid4().hex}"
+    with open(os.path.join(IMAGE_DIR, f"{image_id}.png"), "wb") as f:
+        f.write(b"png bytes")
+    chat = Chat(user_id=1, title="Topic 0")
+    db.add(chat)
+    db.flush()
+    db.add(Message(chat_id=chat.id, role="assistant", content="post", image_url=f"/api/images/{image_id}"))
+    db.add(Blog(user_id=1, chat_id=chat.id, topic="Topic 0", content="Zipped body"))
+    db.commit()
+    seed_blogs(db, 1)
+
+    response = client.get("/api/export", params={"user_id": 1, "format": "zip"})
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    names = archive.namelist()
+    assert len([n for n in names if n.startswith("blogs/")]) == 2
+    assert f"images/{image_id}.png" in names
+    first = archive.read(sorted(n for n in names if n.startswith("blogs/"))[0]).decode()
+    assert first.startswith("---\nid: ") and "Zipped body" in first and f"images/{image_id}.png" in first
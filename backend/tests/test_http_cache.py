@@ -0,0 +1,70 @@
+"""
+Conditional GETs and compression on the JSON API: a matching If-None-Match
+gets a 304 without a body, any change to the rows changes the ETag, and large
+responses are compressed with the ETag marked per encoding.
+"""
+from backend.models.models import Blog, Chat, Message
+
+
+def seed_chat(db, title="Edge AI", messages=2):
+    chat = Chat(user_id=1, title=title)
+    db.add(chat)
+    db.flush()
+    for i in range(messages):
+        db.add(Message(chat_id=chat.id, role="assistant" if i % 2 else "user", content=f"Message {i} about {title}"))
+    db.commit()
+    return chat
+
+
+def test_matching_if_none_match_gets_304(client, db):
+    chat = seed_chat(db)
+    first = client.get(f"/api/chats/{chat.id}/messages")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    second = client.get(f"/api/chats/{chat.id}/messages", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == etag
+
+
+def test_etag_changes_when_a_message_is_added(client, db):
+    chat = seed_chat(db)
+    etag = client.get(f"/api/chats/{chat.id}/messages").headers["etag"]
+    db.add(Message(chat_id=chat.id, role="user", content="One more"))
+    db.commit()
+
+    response = client.get(f"/api/chats/{chat.id}/messages", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert len(response.json()) == 3
+
+
+def test_blogs_etag_changes_when_a_blog_is_edited(client, db):
+    blog = Blog(user_id=1, topic="Edge AI", content="First draft. " * 10)
+    db.add(blog)
+    db.commit()
+    etag = client.get("/api/blogs").headers["etag"]
+
+    blog.content = "Revised draft. " * 10
+    db.commit()
+    assert client.get("/api/blogs", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_large_responses_are_compressed_and_revalidate_with_the_encoded_etag(client, db):
+    chat = seed_chat(db, title="A long conversation " * 5, messages=40)
+    response = client.get(f"/api/chats/{chat.id}/messages", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()) == 40
+
+    etag = response.headers["etag"]
+    revalidated = client.get(
+        f"/api/chats/{chat.id}/messages", headers={"Accept-Encoding": "gzip", "If-None-Match": etag}
+    )
+    assert revalidated.status_code == 304
+
+
+def test_small_responses_are_not_compressed(client, db):
+    chat = seed_chat(db)
+    response = client.get(f"/api/chats/{chat.id}/messages", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
@@ -0,0 +1,85 @@
+"""
+Derived image variants: thumbnail and compressed formats built next to the
+original, and content negotiation that serves the smallest one the client
+accepts (falling back to the original PNG).
+"""
+import asyncio
+import io
+import os
+import uuid
+
+import pytest
+
+pytest.importorskip("PIL")
+from PIL import Image
+
+from backend.services.image_service import ImageService, build_variants, shutdown_variant_pool
+from backend.tests.conftest import IMAGE_DIR
+
+
+def original_png(directory=IMAGE_DIR, size=(800, 600)) -> str:
+    os.makedirs(directory, exist_ok=True)
+    image_id = f"image_{uuid.uuid4().hex}"
+    Image.new("RGB", size, (30, 120, 200)).save(os.path.join(directory, f"{image_id}.png"))
+    return image_id
+
+
+def test_build_variants_writes_a_webp_and_a_small_thumbnail(tmp_path):
+    image_id = original_png(str(tmp_path))
+    written = build_variants(str(tmp_path / f"{image_id}.png"), thumbnail_size=160)
+
+    assert {"webp", "thumb.webp", "thumb.png"} <= set(written)
+    with Image.open(tmp_path / f"{image_id}.thumb.png") as thumb:
+        assert max(thumb.size) == 160
+
+
+def test_generate_image_returns_before_the_variants_are_built(tmp_path):
+    png = io.BytesIO()
+    Image.new("RGB", (400, 300), (200, 80, 30)).save(png, "PNG")
+    service = ImageService()
+    service.output_dir = str(tmp_path)
+
+    async def download(url):
+        return png.getvalue()
+
+    async def run():
+        service._download = download
+        url = await service.generate_image("a red square")
+        pending = len(service._post_processing)
+        await service.wait_post_processing()
+        return url, pending
+
+    try:
+        url, pending = asyncio.run(run())
+    finally:
+        shutdown_variant_pool()
+    image_id = url.rsplit("/", 1)[1]
+    assert pending == 1
+    assert (tmp_path / f"{image_id}.thumb.png").exists()
+    assert not service._post_processing
+
+
+def test_api_serves_the_best_accepted_variant(client):
+    image_id = original_png()
+    build_variants(os.path.join(IMAGE_DIR, f"{image_id}.png"))
+
+    webp = client.get(f"/api/images/{image_id}", headers={"Accept": "image/webp,*/*"})
+    assert webp.headers["content-type"] == "image/webp"
+    assert "Accept" in webp.headers["vary"]
+    assert "immutable" in webp.headers["cache-control"]
+
+    png = client.get(f"/api/images/{image_id}", headers={"Accept": "image/png"})
+    assert png.headers["content-type"] == "image/png"
+
+
+def test_api_falls_back_to_the_original_without_variants(client):
+    image_id = original_png()
+    response = client.get(f"/api/images/{image_id}?size=thumb", headers={"Accept": "image/webp"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert "immutable" not in response.headers["cache-control"]
+
+
+def test_unknown_or_malformed_ids_are_404(client):
+    assert client.get(f"/api/images/image_{uuid.uuid4().hex}").status_code == 404
+    assert client.get("/api/images/..%2F..%2Fetc%2Fpasswd").status_code == 404
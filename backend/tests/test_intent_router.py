@@ -0,0 +1,38 @@
+import pytest
+
+from backend.services.intent_router import Intent, IntentRouter
+
+router = IntentRouter()
+
+
+@pytest.mark.parametrize("text", [
+    "make it shorter", "shorter please", "add a conclusion", "fix the typos",
+    "change the title to Rust rocks", "turn it into a listicle", "translate to urdu",
+    "Can you update this with 2026 numbers?", "remove the intro",
+])
+def test_edits_of_the_draft(text):
+    assert router.classify(text, has_draft=True).intent == Intent.EDIT
+
+
+@pytest.mark.parametrize("text", [
+    "update on the Mars mission", "more on quantum computing", "summarize the french revolution",
+    "turn your garage into a gym", "change management in startups",
+])
+def test_new_topics_starting_with_an_editing_verb(text):
+    assert router.classify(text, has_draft=True).intent != Intent.EDIT
+
+
+@pytest.mark.parametrize("text", [
+    "what is quantum computing", "tell me about the roman empire", "can you help me understand kubernetes",
+    "what do you think about nuclear energy", "a day in the life of a nurse", "sunset over the ocean",
+])
+def test_topics_without_a_rule_go_to_the_blog_pipeline(text):
+    assert router.classify(text).intent == Intent.BLOG
+
+
+@pytest.mark.parametrize("text,intent", [
+    ("hello there", Intent.SMALL_TALK), ("who made you?", Intent.SMALL_TALK), ("can you help me", Intent.SMALL_TALK),
+    ("draw a dragon flying over mountains", Intent.IMAGE), ("picture of a futuristic city skyline", Intent.IMAGE),
+])
+def test_explicit_rules(text, intent):
+    assert router.classify(text).intent == intent
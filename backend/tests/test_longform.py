@@ -0,0 +1,72 @@
+"""
+Long-form engine against a fake OpenAI-shaped client: outline, sections
+written concurrently (bounded) and stitched in order, transitions, and the
+section cap when the outline comes back too long.
+"""
+import asyncio
+import json
+import re
+from types import SimpleNamespace
+
+from backend.services.longform import MAX_SECTIONS, LongFormWriter
+
+
+class FakeClient:
+    def __init__(self, sections_returned=None, latency=0.02):
+        self.sections_returned = sections_returned
+        self.latency = latency
+        self.section_calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, **kwargs):
+        prompt = messages[-1]["content"]
+        if match := re.search(r"exactly (\d+) sections", prompt):
+            count = self.sections_returned or int(match.group(1))
+            text = json.dumps({"title": "Heat pumps", "sections": [{"heading": f"Section {i + 1}"} for i in range(count)]})
+        elif match := re.search(r"exactly (\d+) strings", prompt):
+            text = json.dumps([f"Bridge {i + 1}." for i in range(int(match.group(1)))])
+        else:
+            index = re.search(r"Write ONLY section (\d+)", prompt).group(1)
+            self.section_calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(self.latency)
+            self.in_flight -= 1
+            text = f"Body {index}."
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+def test_sections_are_written_in_parallel_and_stitched_in_order():
+    client = FakeClient()
+    post = asyncio.run(LongFormWriter(client, "fake", max_parallel=2).write("Heat pumps", target_words=2000))
+
+    assert client.section_calls == 5
+    assert client.max_in_flight == 2
+    assert post.startswith("# Heat pumps")
+    bodies = re.findall(r"Body (\d+)\.", post)
+    assert bodies == ["1", "2", "3", "4", "5"]
+    assert "Bridge 1." in post and "Bridge 4." in post
+
+
+def test_an_oversized_outline_is_capped_and_keeps_the_conclusion():
+    client = FakeClient(sections_returned=50)
+    writer = LongFormWriter(client, "fake")
+    outline = asyncio.run(writer.build_outline("Heat pumps", target_words=2000, research=""))
+    assert [s.heading for s in outline.sections] == ["Section 1", "Section 2", "Section 3", "Section 4", "Section 50"]
+
+    asyncio.run(writer.write("Heat pumps", target_words=100000))
+    assert client.section_calls == MAX_SECTIONS
+
+
+def test_unparseable_outline_falls_back_to_headings():
+    class MarkdownOutline(FakeClient):
+        async def create(self, model, messages, **kwargs):
+            if "exactly" in messages[-1]["content"] and "sections" in messages[-1]["content"]:
+                text = "# Why\n# How\n# What next"
+                return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+            return await super().create(model, messages, **kwargs)
+
+    outline = asyncio.run(LongFormWriter(MarkdownOutline(), "fake").build_outline("x", 1200, ""))
+    assert [s.heading for s in outline.sections] == ["Why", "How", "What next"]
@@ -0,0 +1,95 @@
+"""
+Model pool failover against a stubbed OpenAI-compatible API: a 429 cools the
+key, a 5xx cools the model, a 401 disables the key and a 404 takes the model
+out of rotation, and each time the call moves on to the next pair.
+"""
+import asyncio
+import json
+import time
+
+import httpx
+import openai
+import pytest
+
+from backend.services.model_pool import ModelPool
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def completion(model: str) -> dict:
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+
+
+def run_pool(failures, keys=("key-a-0000000000", "key-b-0000000000"), models=("primary", "backup")):
+    """
+    Make one pool call. failures maps (key, model) -> HTTP status for the
+    pairs that fail; returns the response's model, every (key, model)
+    attempt in order and the pool.
+    """
+    attempts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        key = request.headers["Authorization"].removeprefix("Bearer ")
+        model = json.loads(request.content)["model"]
+        attempts.append((key, model))
+        status = failures.get((key, model)) or failures.get((None, model)) or failures.get((key, None))
+        if status:
+            return httpx.Response(status, json={"error": {"message": "stubbed", "code": status}})
+        return httpx.Response(200, json=completion(model))
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            pool = ModelPool(api_keys=list(keys), models=list(models), base_url="http://pool.test/v1/", http_client=client)
+            response = await pool.create(model=models[0], messages=MESSAGES)
+            return response.model, pool
+
+    model, pool = asyncio.run(main())
+    return model, attempts, pool
+
+
+def test_429_cools_the_key_and_fails_over_to_the_next_key():
+    model, attempts, pool = run_pool({("key-a-0000000000", None): 429})
+    assert attempts == [("key-a-0000000000", "primary"), ("key-b-0000000000", "primary")]
+    assert model == "primary"
+    assert pool.keys[0].cooldown_until > time.monotonic()
+
+
+def test_5xx_cools_the_model_and_fails_over_to_the_next_model():
+    model, attempts, pool = run_pool({(None, "primary"): 503})
+    assert attempts[0][1] == "primary"
+    assert attempts[-1][1] == "backup"
+    assert model == "backup"
+    assert pool.models["primary"].cooldown_until > time.monotonic()
+
+
+def test_401_disables_the_key():
+    model, attempts, pool = run_pool({("key-a-0000000000", None): 401})
+    assert model == "primary"
+    assert pool.keys[0].disabled
+    assert attempts[-1][0] == "key-b-0000000000"
+
+
+def test_404_takes_the_model_out_of_rotation():
+    model, attempts, pool = run_pool({(None, "primary"): 404})
+    assert model == "backup"
+    assert not pool.models["primary"].listed
+
+
+def test_client_errors_are_not_retried():
+    with pytest.raises(openai.BadRequestError):
+        run_pool({(None, "primary"): 400})
+
+
+def test_recent_calls_are_trimmed_without_an_rpm_limit():
+    _, _, pool = run_pool({})
+    key = next(k for k in pool.keys if k.recent)
+    key.recent.appendleft(time.monotonic() - 120)
+    assert key.available(time.monotonic())
+    assert len(key.recent) == 1
@@ -0,0 +1,108 @@
+"""
+Page fetcher: main-text extraction, and the SSRF guard that keeps result
+URLs (and every redirect hop) away from private and loopback addresses.
+"""
+import asyncio
+
+import pytest
+from aiohttp import web
+from yarl import URL
+
+from backend.services import page_fetcher
+from backend.services.page_fetcher import BlockedAddressError, MainTextExtractor, PageFetcher, PublicResolver, check_url
+
+ARTICLE = (
+    "<html><head><title>Heat pumps</title><script>var x = 1;</script></head><body>"
+    "<nav>Home About Contact</nav><article><h1>Heat pumps</h1>"
+    "<p>Heat pumps move heat from outside air into the house, even in freezing weather.</p>"
+    "</article></body></html>"
+)
+
+
+async def serve(handler):
+    app = web.Application()
+    app.router.add_get("/{name}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_extractor_keeps_prose_and_drops_boilerplate():
+    extractor = MainTextExtractor()
+    extractor.feed(ARTICLE)
+    assert extractor.title == "Heat pumps"
+    assert extractor.text() == "## Heat pumps\nHeat pumps move heat from outside air into the house, even in freezing weather."
+
+
+@pytest.mark.parametrize("url", [
+    "http://127.0.0.1/", "http://10.0.0.5/", "http://169.254.169.254/latest/meta-data",
+    "http://[::1]/", "http://[::ffff:192.168.1.1]/", "http://0.0.0.0/", "ftp://example.com/", "file:///etc/passwd",
+])
+def test_non_public_urls_are_rejected(url):
+    with pytest.raises(BlockedAddressError):
+        check_url(URL(url))
+
+
+def test_public_urls_pass():
+    check_url(URL("https://93.184.216.34/page"))
+    check_url(URL("https://example.com/page"))
+
+
+def test_resolver_refuses_names_with_private_addresses():
+    class FakeResolver:
+        async def resolve(self, host, port, family):
+            return [{"host": "8.8.8.8"}, {"host": "192.168.0.10"}] if host == "mixed.test" else [{"host": "8.8.8.8"}]
+
+    resolver = PublicResolver(FakeResolver())
+    assert asyncio.run(resolver.resolve("public.test", 80))
+    with pytest.raises(BlockedAddressError):
+        asyncio.run(resolver.resolve("mixed.test", 80))
+
+
+def test_loopback_pages_are_not_fetched():
+    hits = []
+
+    async def handler(request):
+        hits.append(request.path)
+        return web.Response(text=ARTICLE, content_type="text/html")
+
+    async def run():
+        runner, base = await serve(handler)
+        fetcher = PageFetcher()
+        try:
+            by_name = base.replace("127.0.0.1", "localhost")
+            return await fetcher.fetch(f"{base}/article"), await fetcher.fetch(f"{by_name}/article")
+        finally:
+            await fetcher.aclose()
+            await runner.cleanup()
+
+    assert asyncio.run(run()) == (None, None)
+    assert hits == []
+
+
+def test_every_redirect_hop_is_checked(monkeypatch):
+    # Loopback stands in for a public host; the redirect target is the metadata address
+    monkeypatch.setattr(page_fetcher, "_is_public", lambda address: address == "127.0.0.1")
+
+    async def handler(request):
+        if request.match_info["name"] == "moved":
+            raise web.HTTPFound("/article")
+        if request.match_info["name"] == "metadata":
+            raise web.HTTPFound("http://169.254.169.254/latest/meta-data")
+        return web.Response(text=ARTICLE, content_type="text/html")
+
+    async def run():
+        runner, base = await serve(handler)
+        fetcher = PageFetcher()
+        try:
+            return await fetcher.fetch(f"{base}/moved"), await fetcher.fetch(f"{base}/metadata")
+        finally:
+            await fetcher.aclose()
+            await runner.cleanup()
+
+    followed, blocked = asyncio.run(run())
+    assert followed.title == "Heat pumps" and followed.url.endswith("/article")
+    assert blocked is None
@@ -0,0 +1,95 @@
+"""
+Circuit breaker state machine: opening on failures, half-open probing and
+giving the probe slot back when a call is cancelled.
+"""
+import asyncio
+import time
+
+import pytest
+
+from backend.services.resilience import CircuitBreaker, CircuitOpenError
+
+
+async def fail():
+    raise ConnectionError("down")
+
+
+async def ok():
+    return "ok"
+
+
+def open_breaker(**options) -> CircuitBreaker:
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0.05, **options)
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                await breaker.call(fail)
+
+    asyncio.run(main())
+    return breaker
+
+
+def test_opens_after_consecutive_failures_and_rejects_calls():
+    breaker = open_breaker()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(breaker.call(ok))
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker("test", failure_threshold=2)
+
+    async def main():
+        with pytest.raises(ConnectionError):
+            await breaker.call(fail)
+        await breaker.call(ok)
+        with pytest.raises(ConnectionError):
+            await breaker.call(fail)
+
+    asyncio.run(main())
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_opens_again():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    with pytest.raises(ConnectionError):
+        asyncio.run(breaker.call(fail))
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_cancelled_probe_gives_its_slot_back():
+    breaker = open_breaker()
+    time.sleep(0.06)
+
+    async def main():
+        probe = asyncio.ensure_future(breaker.call(lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        # The next caller gets the probe instead of a stuck half-open breaker
+        return await breaker.call(ok)
+
+    assert asyncio.run(main()) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_probe_that_never_reports_back_times_out():
+    breaker = open_breaker(half_open_timeout=0.05)
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()
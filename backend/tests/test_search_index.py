@@ -0,0 +1,116 @@
+"""
+Full-text search (SQLite FTS5 here): trigger-maintained index, per-user
+results, highlighted snippets and archived rows that stay searchable.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from backend.database import search_index
+from backend.models.models import Blog, Chat, Message
+from backend.services.content_archive import archive_old_content
+
+LONG_BODY = "Solid state batteries promise faster charging and fewer fires. " * 20
+
+
+def seed(db, user_id=1, created_at=None):
+    chat = Chat(user_id=user_id, title="Batteries", created_at=created_at)
+    db.add(chat)
+    db.flush()
+    db.add(Message(chat_id=chat.id, role="user", content="Tell me about solid state batteries", created_at=created_at))
+    db.add(Message(chat_id=chat.id, role="assistant", content=LONG_BODY, created_at=created_at))
+    db.add(Blog(user_id=user_id, chat_id=chat.id, topic="Solid state batteries", content=LONG_BODY, timestamp=created_at))
+    db.commit()
+    return chat
+
+
+def kinds(result):
+    return sorted(r["type"] for r in result["results"])
+
+
+def assert_index_intact(db):
+    for table in ("messages_fts", "blogs_fts"):
+        db.execute(text(f"INSERT INTO {table}({table}) VALUES ('integrity-check')"))
+
+
+def test_new_rows_are_searchable_with_highlighted_snippets(db):
+    seed(db)
+    result = search_index.search(db, "batteries", user_id=1)
+    assert kinds(result) == ["blog", "message", "message"]
+    assert all("**" in r["snippet"] for r in result["results"])
+
+
+def test_results_are_scoped_to_the_user(db):
+    seed(db, user_id=2)
+    assert search_index.search(db, "batteries", user_id=1)["results"] == []
+
+
+def test_prefix_match_on_the_last_term(db):
+    seed(db)
+    assert search_index.search(db, "solid sta", user_id=1, kind="blog")["results"]
+
+
+def test_pagination_reports_more_results(db):
+    for _ in range(3):
+        seed(db)
+    first = search_index.search(db, "batteries", user_id=1, kind="blog", limit=2)
+    second = search_index.search(db, "batteries", user_id=1, kind="blog", limit=2, offset=2)
+    assert len(first["results"]) == 2 and first["has_more"]
+    assert len(second["results"]) == 1 and not second["has_more"]
+
+
+def test_scores_are_normalised_per_source(db):
+    seed(db)
+    results = search_index.search(db, "batteries", user_id=1)["results"]
+    best = {r["type"]: max(x["score"] for x in results if x["type"] == r["type"]) for r in results}
+    assert best == {"blog": 1.0, "message": 1.0}
+    assert all(0 < r["score"] <= 1.0 for r in results)
+
+
+def test_offset_is_capped(client, db):
+    seed(db)
+    deep = search_index.search(db, "batteries", user_id=1, offset=10**9)
+    assert deep == {"results": [], "has_more": False}
+    assert client.get("/api/search", params={"q": "batteries", "page": 10**6}).status_code == 400
+
+
+def test_make_snippet_highlights_around_the_first_match():
+    body = " ".join(f"word{i}" for i in range(100)) + " Batteries matter. " + "tail " * 50
+    snippet = search_index.make_snippet(body, "battery batteries")
+    assert "**Batteries**" in snippet
+    assert snippet.startswith("…") and snippet.endswith("…")
+    assert len(snippet.split()) == search_index.SNIPPET_WORDS
+
+
+def test_edits_and_deletes_update_the_index(db):
+    chat = seed(db)
+    message = db.query(Message).filter(Message.chat_id == chat.id, Message.role == "user").one()
+    message.content = "What about sodium ion cells?"
+    db.commit()
+    assert kinds(search_index.search(db, "sodium", user_id=1)) == ["message"]
+
+    db.delete(message)
+    db.commit()
+    assert search_index.search(db, "sodium", user_id=1)["results"] == []
+    assert_index_intact(db)
+
+
+def test_archived_rows_stay_searchable(db):
+    chat = seed(db, created_at=datetime.utcnow() - timedelta(days=400))
+    assert archive_old_content(older_than_days=30).rows_archived == 2
+    db.expire_all()
+    assert db.query(Blog).one()._content == ""
+
+    result = search_index.search(db, "fires", user_id=1)
+    assert kinds(result) == ["blog", "message"]
+    assert all("**fires.**" in r["snippet"] for r in result["results"])
+
+    # Editing and deleting archived rows removes their archived text from the index
+    blog = db.query(Blog).one()
+    blog.content = "Now about flow batteries"
+    db.commit()
+    assert kinds(search_index.search(db, "fires", user_id=1)) == ["message"]
+    db.query(Message).filter(Message.chat_id == chat.id).delete()
+    db.commit()
+    assert search_index.search(db, "fires", user_id=1)["results"] == []
+    assert_index_intact(db)
@@ -0,0 +1,45 @@
+"""
+Web search: timed-out backend calls stay within the bounded search pool
+instead of leaking threads.
+"""
+import asyncio
+import threading
+import time
+
+from backend.services import search_service
+from backend.services.resilience import CircuitBreaker
+from backend.services.search_service import WebSearchService
+
+
+def test_timed_out_searches_are_bounded_by_the_pool(monkeypatch):
+    monkeypatch.setattr(search_service, "SEARCH_TIMEOUT", 0.05)
+    monkeypatch.setattr(search_service, "SEARCH_WORKERS", 2)
+    search_service.shutdown_search_pool()
+    lock = threading.Lock()
+    running, peak, started = 0, 0, 0
+
+    def slow_backend(query, max_results):
+        nonlocal running, peak, started
+        with lock:
+            running += 1
+            started += 1
+            peak = max(peak, running)
+        time.sleep(0.2)
+        with lock:
+            running -= 1
+        return [{"title": query, "snippet": "", "link": ""}]
+
+    service = WebSearchService(search_backend=slow_backend)
+    service.breaker = CircuitBreaker("test-search", failure_threshold=100, reset_timeout=1)
+
+    async def main():
+        return await asyncio.gather(*(service.search_topic(f"query {i}") for i in range(10)))
+
+    try:
+        results = asyncio.run(main())
+    finally:
+        search_service.shutdown_search_pool()
+    assert results == [[]] * 10
+    assert peak == 2
+    # Calls still queued when they timed out were dropped, not run later
+    assert started < 10
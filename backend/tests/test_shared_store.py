@@ -0,0 +1,72 @@
+"""
+Shared store: TTL'd entries, counters and rate limits, and locks that
+expire or are taken over when their owner process has exited.
+"""
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from backend.services.shared_store import SharedStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SharedStore(str(tmp_path / "shared.db"))
+
+
+def dead_token() -> str:
+    """An owner token for a process that has already exited"""
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return f"{process.pid}-deadbeef"
+
+
+def test_entries_expire(store):
+    store.set_json("a", {"x": 1}, ttl=0.05)
+    assert store.get_json("a") == {"x": 1}
+    time.sleep(0.1)
+    assert store.get_json("a") is None
+    assert store.purge_expired() == 1
+
+
+def test_pop_hands_the_value_to_one_caller(store):
+    store.set("k", b"v")
+    assert store.pop("k") == b"v"
+    assert store.pop("k") is None
+
+
+def test_rate_limit_window(store):
+    assert [store.allow("bucket", limit=2, window_seconds=60) for _ in range(3)] == [True, True, False]
+    assert store.used("bucket", 60) == 3
+
+
+def test_lock_is_exclusive_until_released(store, tmp_path):
+    other = SharedStore(str(tmp_path / "shared.db"))
+    assert store.acquire("lock:x", 60)
+    assert store.acquire("lock:x", 60), "the owner renews its own lock"
+    assert not other.acquire("lock:x", 60)
+    store.release("lock:x")
+    assert other.acquire("lock:x", 60)
+
+
+def test_expired_locks_are_taken_over(store):
+    assert store.acquire("lock:x", 0.05, token=f"{os.getpid()}-other")
+    time.sleep(0.1)
+    assert store.acquire("lock:x", 60)
+
+
+def test_locks_of_exited_owners_are_taken_over(store):
+    assert store.acquire("lock:init-db", 120, token=dead_token())
+    assert store.acquire("lock:init-db", 120)
+    assert store.holder("lock:init-db") == store.owner
+
+
+def test_opening_the_store_clears_locks_of_exited_owners(store, tmp_path):
+    store.acquire("lock:generate", 300, token=dead_token())
+    store.acquire("lease:host-jobs", 30)
+    reopened = SharedStore(str(tmp_path / "shared.db"))
+    assert reopened.holder("lock:generate") is None
+    assert reopened.holder("lease:host-jobs") == store.owner
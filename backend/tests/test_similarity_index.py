@@ -0,0 +1,99 @@
+"""
+Related-blogs index: hashed vectors in memory-mapped files, incremental adds,
+owner filtering, near-duplicate topics and rebuilds from the database.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from backend.models.models import Blog
+from backend.services import similarity_index
+from backend.services.similarity_index import SimilarityIndex, vectorize
+
+POSTS = {
+    1: ("Heat pumps for cold climates", "Heat pumps move heat from outside air even in freezing weather. " * 10),
+    2: ("Choosing a heat pump", "Sizing a heat pump for a cold climate home and comparing air source models. " * 10),
+    3: ("Sourdough basics", "Feed the starter, autolyse the flour and bake the loaf in a dutch oven. " * 10),
+}
+
+
+def build(tmp_path, owner=1) -> SimilarityIndex:
+    index = SimilarityIndex(str(tmp_path), dim=1024, topic_dim=256)
+    for blog_id, (topic, content) in POSTS.items():
+        index.add(blog_id, owner, topic, content)
+    return index
+
+
+def test_vectors_are_normalized_and_empty_text_is_zero():
+    assert abs(float((vectorize("heat pumps", 256) ** 2).sum()) - 1.0) < 1e-5
+    assert not vectorize("", 256).any()
+
+
+def test_related_ranks_the_similar_post_first(tmp_path):
+    index = build(tmp_path)
+    related = index.related(1, k=2)
+    assert related[0].blog_id == 2
+    assert all(r.score < related[0].score for r in related[1:])
+
+
+def test_related_is_filtered_by_owner(tmp_path):
+    index = build(tmp_path)
+    index.add(4, 2, "Heat pump maintenance", POSTS[1][1])
+    assert 4 not in [r.blog_id for r in index.related(1, k=5, owner=1)]
+
+
+def test_re_adding_a_blog_replaces_its_vector(tmp_path):
+    index = build(tmp_path)
+    index.add(3, 1, "Heat pump noise", POSTS[1][1])
+    assert len(index) == 3
+    assert index.related(1, k=1)[0].blog_id == 3
+
+
+def test_near_duplicate_topics(tmp_path):
+    index = build(tmp_path)
+    assert index.find_near_duplicate("heat pumps for cold climates", owner=1).blog_id == 1
+    assert index.find_near_duplicate("sourdough basics", owner=2) is None
+    assert index.find_near_duplicate("electric bikes") is None
+
+
+def test_reopened_index_sees_the_same_rows(tmp_path):
+    build(tmp_path)
+    reopened = SimilarityIndex(str(tmp_path), dim=1024, topic_dim=256)
+    assert len(reopened) == 3
+    assert reopened.related(1, k=1)[0].blog_id == 2
+
+
+def test_rebuild_indexes_the_database(db, tmp_path):
+    for topic, content in POSTS.values():
+        db.add(Blog(user_id=1, topic=topic, content=content))
+    db.commit()
+    ids = [b.id for b in db.query(Blog).order_by(Blog.id)]
+
+    index = SimilarityIndex(str(tmp_path), dim=1024, topic_dim=256)
+    assert index.rebuild()["blogs"] == 3
+    assert index.related(ids[0], k=1)[0].blog_id == ids[1]
+
+
+def test_rebuild_catches_up_on_blogs_edited_while_it_ran(db, tmp_path, monkeypatch):
+    for topic, content in POSTS.values():
+        db.add(Blog(user_id=1, topic=topic, content=content, updated_at=datetime.utcnow() - timedelta(hours=1)))
+    db.commit()
+    ids = [b.id for b in db.query(Blog).order_by(Blog.id)]
+    index = SimilarityIndex(str(tmp_path), dim=1024, topic_dim=256)
+    scan = similarity_index._iter_blog_batches
+
+    def scan_then_edit(**kwargs):
+        yield from scan(**kwargs)
+        if "updated_since" not in kwargs:
+            # The live update lands in the files the rebuild is about to replace
+            blog = db.get(Blog, ids[2])
+            blog.topic, blog.content = POSTS[1]
+            db.commit()
+            index.add(blog.id, 1, blog.topic, blog.content)
+
+    monkeypatch.setattr(similarity_index, "_iter_blog_batches", scan_then_edit)
+    stats = index.rebuild()
+    assert stats["blogs"] == 3 and stats["refreshed"] == 1
+    assert index.related(ids[0], k=1)[0].blog_id == ids[2]
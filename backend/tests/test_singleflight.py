@@ -0,0 +1,106 @@
+"""
+Coalescing of identical concurrent generations: N callers for the same
+(normalized) topic must cause exactly one pipeline run, within one process
+and across worker processes sharing a store.
+"""
+import asyncio
+import time
+
+from backend.services.ai_agent import GeminiAgent
+from backend.services.intent_router import IntentRouter
+from backend.services.shared_store import SharedStore
+from backend.services.singleflight import SharedFlight, SingleFlight
+
+TOPICS = ["Edge AI in 2026", "edge ai IN 2026 ", "  Edge   AI in 2026"]
+
+
+class StubAgent(GeminiAgent):
+    """GeminiAgent whose LLM pipeline is a counted sleep"""
+
+    def __init__(self, generations, runs: list, latency: float = 0.2):
+        self._generations = generations
+        self.shared_store = None
+        self.intent_router = IntentRouter()
+        self.runs = runs
+        self.latency = latency
+
+    async def _run_pipeline(self, topic: str, **options):
+        self.runs.append(topic)
+        await asyncio.sleep(self.latency)
+        return {"blog_content": f"# {topic}\n\n" + "Generated content. " * 60, "image_url": None}
+
+
+def test_identical_requests_run_the_pipeline_once():
+    runs = []
+    agent = StubAgent(SingleFlight("test-generation"), runs)
+
+    async def main():
+        return await asyncio.gather(*(agent.process_topic(TOPICS[i % len(TOPICS)]) for i in range(20)))
+
+    results = asyncio.run(main())
+
+    assert len(runs) == 1
+    assert len(results) == 20
+    assert all(r["blog_content"] == results[0]["blog_content"] for r in results)
+    # Every caller gets its own copy to mutate
+    assert len({id(r) for r in results}) == 20
+
+
+def test_distinct_topics_are_not_coalesced():
+    runs = []
+    agent = StubAgent(SingleFlight("test-generation"), runs, latency=0.05)
+
+    async def main():
+        await asyncio.gather(*(agent.process_topic(f"Topic number {i}") for i in range(5)))
+
+    asyncio.run(main())
+    assert len(runs) == 5
+
+
+def test_shared_flight_coalesces_across_store_handles(tmp_path):
+    # Two handles on one file stand in for two worker processes (distinct lock owners)
+    path = str(tmp_path / "shared.db")
+    runs = []
+    agents = [
+        StubAgent(SharedFlight("test-generation", SharedStore(path)), runs),
+        StubAgent(SharedFlight("test-generation", SharedStore(path)), runs),
+    ]
+
+    async def main():
+        return await asyncio.gather(*(
+            agents[i % 2].process_topic(TOPICS[i % len(TOPICS)]) for i in range(12)
+        ))
+
+    results = asyncio.run(main())
+
+    assert len(runs) == 1
+    assert all(r["blog_content"] == results[0]["blog_content"] for r in results)
+
+
+def test_waiters_never_get_a_previous_runs_result(tmp_path):
+    path = str(tmp_path / "shared.db")
+    leader = SharedFlight("test-versions", SharedStore(path))
+    waiter = SharedFlight("test-versions", SharedStore(path))
+
+    async def produce(value, delay=0.0):
+        await asyncio.sleep(delay)
+        return value
+
+    # Widen the gap between a leader taking the lock and anything it does next
+    acquire = leader.store.acquire
+
+    def slow_acquire(*args):
+        held = acquire(*args)
+        time.sleep(0.6)
+        return held
+
+    async def main():
+        await leader.do("topic", lambda: produce("old"))
+        leader.store.acquire = slow_acquire
+        # The previous run's result is still in the store while the next one runs
+        running = asyncio.ensure_future(leader.do("topic", lambda: produce("new", delay=0.5)))
+        await asyncio.sleep(0.1)
+        waited = await waiter.do("topic", lambda: produce("waiter ran"))
+        return await running, waited
+
+    assert asyncio.run(main()) == ("new", "new")
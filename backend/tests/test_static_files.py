@@ -0,0 +1,84 @@
+"""
+Static file cache: ETags and 304s from memory, precompressed siblings,
+cache lifetimes by file kind, byte ranges and picking up edits.
+"""
+import gzip
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.routes.static_files import IMMUTABLE_CACHE_CONTROL, CachedStaticFiles
+
+CSS = "body { color: black; }\n" * 200
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    (tmp_path / "index.html").write_text("<html><body>Hello</body></html>")
+    (tmp_path / "app.3f9a1c2e.css").write_text(CSS)
+    (tmp_path / "data.txt").write_text("0123456789")
+    return tmp_path
+
+
+def make_client(directory, **options) -> TestClient:
+    app = FastAPI()
+    app.mount("/static", CachedStaticFiles(str(directory), **options))
+    return TestClient(app)
+
+
+def test_revalidation_is_answered_with_304(static_dir):
+    client = make_client(static_dir)
+    first = client.get("/static/index.html", headers={"Accept-Encoding": "identity"})
+    assert first.headers["cache-control"] == "no-cache"
+    again = client.get("/static/index.html", headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+
+
+def test_compressible_files_are_compressed_once_and_cached_immutably(static_dir):
+    response = make_client(static_dir).get("/static/app.3f9a1c2e.css", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert response.headers["etag"].endswith('-gzip"')
+    assert response.text == CSS
+
+
+def test_a_fresh_precompressed_sibling_is_served(static_dir):
+    marker = "/* built by the bundler */\n" + CSS
+    (static_dir / "app.3f9a1c2e.css.gz").write_bytes(gzip.compress(marker.encode()))
+    response = make_client(static_dir).get("/static/app.3f9a1c2e.css", headers={"Accept-Encoding": "gzip"})
+    assert response.text == marker
+
+
+def test_a_stale_precompressed_sibling_is_ignored(static_dir):
+    sibling = static_dir / "app.3f9a1c2e.css.gz"
+    sibling.write_bytes(gzip.compress(b"stale"))
+    mtime = os.stat(static_dir / "app.3f9a1c2e.css").st_mtime
+    os.utime(sibling, (mtime - 60, mtime - 60))
+    response = make_client(static_dir).get("/static/app.3f9a1c2e.css", headers={"Accept-Encoding": "gzip"})
+    assert response.text == CSS
+
+
+def test_byte_ranges(static_dir):
+    client = make_client(static_dir)
+    partial = client.get("/static/data.txt", headers={"Range": "bytes=2-4"})
+    assert partial.status_code == 206 and partial.content == b"234"
+    assert partial.headers["content-range"] == "bytes 2-4/10"
+    assert client.get("/static/data.txt", headers={"Range": "bytes=-3"}).content == b"789"
+    assert client.get("/static/data.txt", headers={"Range": "bytes=20-"}).status_code == 416
+
+
+def test_edits_show_up_and_change_the_etag(static_dir):
+    client = make_client(static_dir, recheck_seconds=0)
+    before = client.get("/static/data.txt").headers["etag"]
+    (static_dir / "data.txt").write_text("changed content")
+    response = client.get("/static/data.txt", headers={"If-None-Match": before})
+    assert response.status_code == 200 and response.text == "changed content"
+
+
+def test_missing_files_and_traversal_are_404(static_dir):
+    client = make_client(static_dir)
+    assert client.get("/static/missing.js").status_code == 404
+    assert client.get("/static/..%2F..%2Fetc%2Fpasswd").status_code == 404
+    assert client.post("/static/index.html").status_code == 405